@@ -7,14 +7,27 @@
 
 import sys
 import os
+import time
+
+# بداية تحميل البرنامج (لقياس زمن الإقلاع، انظر --startup-time)
+MODULE_START = time.perf_counter()
+
 from pathlib import Path
 import customtkinter as ctk
-from PIL import Image, ImageTk
-import arabic_reshaper
-from bidi.algorithm import get_display
 import sqlite3
-from datetime import datetime, date
+import struct
+from datetime import datetime, date, timedelta
+import csv
+import gzip
+import hashlib
 import json
+import queue
+from collections import OrderedDict
+from functools import lru_cache
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from typing import Dict, List, Optional, Tuple
 import shutil
 
@@ -24,39 +37,1661 @@ DATA_DIR = BASE_DIR / "data"
 GUESTS_IMG_DIR = DATA_DIR / "guests"
 EXPORTS_DIR = DATA_DIR / "exports"
 BACKUP_DIR = DATA_DIR / "backup"
+CHARTS_DIR = DATA_DIR / "charts"
 
 # إنشاء المجلدات المطلوبة
-for directory in [DATA_DIR, GUESTS_IMG_DIR, EXPORTS_DIR, BACKUP_DIR]:
+for directory in [DATA_DIR, GUESTS_IMG_DIR, EXPORTS_DIR, BACKUP_DIR, CHARTS_DIR]:
     directory.mkdir(exist_ok=True)
 
 class ArabicText:
     """فئة لمعالجة النصوص العربية وعرضها بشكل صحيح"""
     
+    # جدول توحيد الحروف للبحث: حذف التشكيل والتطويل وتوحيد الهمزات والتاء المربوطة
+    _NORMALIZE_TABLE = str.maketrans({
+        **{chr(c): None for c in range(0x064B, 0x0660)},  # التشكيل
+        '\u0670': None,  # الألف الخنجرية
+        '\u0640': None,  # التطويل
+        'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+        'ؤ': 'و', 'ئ': 'ي', 'ى': 'ي',
+        'ة': 'ه',
+    })
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        """توحيد النص العربي لأغراض الفهرسة والبحث"""
+        if not text:
+            return ''
+        return str(text).translate(ArabicText._NORMALIZE_TABLE).lower()
+    
+    # النصوص الثابتة المعاد تشكيلها مسبقاً (انظر preload)
+    _static_captions: Dict[str, str] = {}
+    _static_hits = 0
+    
     @staticmethod
     def reshape(text: str) -> str:
-        """إعادة تشكيل النص العربي للعرض الصحيح"""
-        if not text or not any('\u0600' <= c <= '\u06FF' for c in text):
+        """إعادة تشكيل النص العربي للعرض الصحيح
+        
+        النصوص الثابتة تُقرأ من الجدول المحسوب مسبقاً، وباقي النصوص
+        (أسماء النزلاء، الأعداد...) تمر عبر ذاكرة تخزين LRU محدودة.
+        """
+        if not text:
+            return text
+        shaped = ArabicText._static_captions.get(text)
+        if shaped is not None:
+            ArabicText._static_hits += 1
+            return shaped
+        return ArabicText._shape(text)
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _shape(text: str) -> str:
+        """التشكيل الفعلي (مكلف): reshape ثم خوارزمية الاتجاه الثنائي"""
+        if not any('\u0600' <= c <= '\u06FF' for c in text):
             return text
+        # استيراد مؤجل: لا تُحمَّل مكتبات التشكيل قبل أول نص عربي
+        import arabic_reshaper
+        from bidi.algorithm import get_display
+        
         reshaped = arabic_reshaper.reshape(text)
         return get_display(reshaped)
     
+    @staticmethod
+    def preload(captions):
+        """حساب تشكيل النصوص الثابتة مرة واحدة عند بدء التشغيل"""
+        for caption in captions:
+            ArabicText._static_captions[caption] = ArabicText._shape.__wrapped__(caption)
+    
+    @staticmethod
+    def cache_info() -> Dict[str, int]:
+        """إحصائيات ذاكرة التشكيل (إصابات، إخفاقات، الحجم)"""
+        info = ArabicText._shape.cache_info()
+        return {
+            'static_hits': ArabicText._static_hits,
+            'static_size': len(ArabicText._static_captions),
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'max_size': info.maxsize,
+        }
+    
     @staticmethod
     def create_label(master, text: str, **kwargs):
         """إنشاء تسمية بالنص العربي المعدل"""
         return ctk.CTkLabel(master, text=ArabicText.reshape(text), **kwargs)
 
+# نصوص الواجهة الثابتة التي يُحسب تشكيلها مسبقاً عند بدء التشغيل
+UI_CAPTIONS = (
+    "🏠 بيت الشباب كريم جلول - قلعة الشيخ بوعمامة",
+    "نظام إدارة النزلاء والإحصائيات المتكامل",
+    "جاهز - نظام إدارة بيت الشباب كريم جلول", "جاري التحميل...",
+    # تسجيل النزلاء
+    "تسجيل نزيل جديد - بيت الشباب كريم جلول",
+    "الاسم", "اللقب", "تاريخ الميلاد", "مكان الميلاد",
+    "رقم بطاقة التعريف الوطني", "اسم الأب", "اسم الأم", "العنوان", "الجنس",
+    "أرقام الهواتف:", "صورة بطاقة التعريف:", "لم يتم اختيار صورة",
+    # البحث
+    "بحث وتعديل بيانات النزلاء", "كلمة البحث:",
+    # الحجوزات
+    "حجز الأسرة وإشغال الغرف", "رقم بطاقة النزيل:", "تاريخ الدخول:",
+    "تاريخ الخروج:", "السرير:", "الإشغال ابتداءً من:", "الغرفة / السرير",
+    # الإحصائيات
+    "الإحصائيات والتقارير - بيت الشباب",
+    "إجمالي النزلاء", "الحجوزات النشطة", "إيرادات اليوم", "ذكور", "إناث",
+    "تحديث مباشر",
+    # الإعدادات
+    "إعدادات بيت الشباب", "عدد الغرف:", "عدد الأسرة:", "السعر للفرد (د.ج):",
+    "أيام المجانية:", "إدارة النسخ الاحتياطية",
+    "فترة النسخ التلقائي (دقيقة):", "عدد السلاسل المحفوظة:",
+    "كل نسخة تلقائية تقرأ القاعدة كاملة وتحفظ الصفحات المتغيرة فقط؛ مع قاعدة كبيرة اختر فترة أطول",
+)
+
+class GuestImportFile:
+    """قراءة ملف نزلاء (CSV أو Excel) صفاً صفاً دون تحميله كاملاً في الذاكرة"""
+    
+    # عناوين الأعمدة المقبولة: أسماء الحقول أو تسمياتها في نموذج التسجيل
+    COLUMN_ALIASES = {
+        'first_name': 'first_name', 'الاسم': 'first_name',
+        'last_name': 'last_name', 'اللقب': 'last_name',
+        'birth_date': 'birth_date', 'تاريخ الميلاد': 'birth_date',
+        'birth_place': 'birth_place', 'مكان الميلاد': 'birth_place',
+        'national_id': 'national_id', 'رقم بطاقة التعريف الوطني': 'national_id',
+        'رقم البطاقة': 'national_id',
+        'father_name': 'father_name', 'اسم الأب': 'father_name',
+        'mother_name': 'mother_name', 'اسم الأم': 'mother_name',
+        'address': 'address', 'العنوان': 'address',
+        'gender': 'gender', 'الجنس': 'gender',
+        'phone_numbers': 'phone_numbers', 'الهاتف': 'phone_numbers',
+        'أرقام الهواتف': 'phone_numbers',
+        'notes': 'notes', 'ملاحظات': 'notes',
+    }
+    
+    def __init__(self, path):
+        self.path = Path(path)
+        self.is_excel = self.path.suffix.lower() in ('.xlsx', '.xlsm')
+    
+    def count_rows(self) -> int:
+        """عدد الصفوف التقريبي (لحساب نسبة التقدم)"""
+        if self.is_excel:
+            from openpyxl import load_workbook
+            workbook = load_workbook(self.path, read_only=True)
+            try:
+                return max((workbook.active.max_row or 1) - 1, 0)
+            finally:
+                workbook.close()
+        with open(self.path, 'rb') as f:
+            return max(sum(1 for _ in f) - 1, 0)
+    
+    def _raw_rows(self):
+        """الصفوف الخام كقوائم، أولها صف العناوين"""
+        if self.is_excel:
+            from openpyxl import load_workbook
+            workbook = load_workbook(self.path, read_only=True, data_only=True)
+            try:
+                yield from workbook.active.iter_rows(values_only=True)
+            finally:
+                workbook.close()
+        else:
+            with open(self.path, newline='', encoding='utf-8-sig') as f:
+                yield from csv.reader(f)
+    
+    def __iter__(self):
+        """أزواج (رقم السطر في الملف، بيانات النزيل)؛ الصفوف الفارغة تُتخطى
+        
+        يُحتسب صف العناوين في الترقيم، فالرقم يطابق ما يراه المستخدم في
+        برنامج الجداول أو محرر النصوص.
+        """
+        rows = self._raw_rows()
+        header = next(rows, None) or []
+        fields = [self.COLUMN_ALIASES.get(str(h).strip()) if h else None for h in header]
+        
+        for row_number, values in enumerate(rows, start=2):
+            guest_data = {}
+            for field, value in zip(fields, values):
+                if field is None or value is None:
+                    continue
+                if isinstance(value, (datetime, date)):
+                    value = value.strftime('%Y-%m-%d')
+                elif field == 'phone_numbers':
+                    value = [p.strip() for p in str(value).replace(';', ',').split(',') if p.strip()]
+                else:
+                    value = str(value)
+                guest_data[field] = value
+            if guest_data:
+                yield row_number, guest_data
+
+class PhotoStore:
+    """مخزن صور بطاقات التعريف: تصغير وإعادة ضغط وتسمية حسب المحتوى
+    
+    كل صورة تُحفظ JPEG بأبعاد محدودة في guests/<أول حرفين>/<sha256>.jpg،
+    فالصورة المكررة (نفس المسح لنزيلين أو إعادة الرفع) تُخزن مرة واحدة.
+    المصغرات في guests/thumbs/ بنفس الاسم وتُنشأ عند الحاجة.
+    """
+    
+    # أطول ضلع للصورة المخزنة (بكسل) وجودة JPEG
+    MAX_SIZE = 1600
+    JPEG_QUALITY = 85
+    THUMB_SIZE = 160
+    
+    def __init__(self, root=None):
+        self.root = Path(root) if root else GUESTS_IMG_DIR
+        self.thumbs_dir = self.root / "thumbs"
+    
+    def is_stored(self, photo_path) -> bool:
+        """هل الملف من المخزن (مسمى ببصمة محتواه)؟"""
+        photo_path = Path(photo_path)
+        return (photo_path.parent.parent == self.root
+                and photo_path.suffix == '.jpg'
+                and len(photo_path.stem) == 64)
+    
+    def store(self, source_path) -> Path:
+        """تصغير الصورة وضغطها وحفظها باسم بصمتها؛ تُرجع مسار الملف المخزن"""
+        import io
+        from PIL import Image, ImageOps
+        
+        with Image.open(source_path) as image:
+            # تدوير صور الهاتف حسب بيانات EXIF قبل حذفها
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail((self.MAX_SIZE, self.MAX_SIZE), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=self.JPEG_QUALITY, optimize=True)
+        
+        data = buffer.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
+        photo_path = self.root / digest[:2] / f"{digest}.jpg"
+        if photo_path.exists():
+            # تجديد وقت التعديل حتى لا يحذفها تنظيف الصور اليتيمة قبل ربطها بالنزيل
+            os.utime(photo_path)
+        else:
+            photo_path.parent.mkdir(exist_ok=True)
+            temp_path = photo_path.with_suffix('.tmp')
+            temp_path.write_bytes(data)
+            os.replace(temp_path, photo_path)
+        
+        self.thumbnail(photo_path)
+        return photo_path
+    
+    def thumbnail_path(self, photo_path) -> Path:
+        """مسار مصغرة الصورة (دون إنشائها)"""
+        photo_path = Path(photo_path)
+        if self.is_stored(photo_path):
+            return self.thumbs_dir / photo_path.name
+        # صور قديمة لم تُرحَّل بعد: المصغرة باسم بصمة المسار
+        key = hashlib.sha256(str(photo_path).encode('utf-8')).hexdigest()
+        return self.thumbs_dir / f"{key}.jpg"
+    
+    def thumbnail(self, photo_path) -> Path:
+        """مسار المصغرة (تُنشأ مرة واحدة)"""
+        from PIL import Image
+        
+        photo_path = Path(photo_path)
+        thumb_path = self.thumbnail_path(photo_path)
+        if not thumb_path.exists():
+            self.thumbs_dir.mkdir(exist_ok=True)
+            with Image.open(photo_path) as image:
+                image.draft('RGB', (self.THUMB_SIZE * 2, self.THUMB_SIZE * 2))
+                image = image.convert('RGB')
+                image.thumbnail((self.THUMB_SIZE, self.THUMB_SIZE))
+                temp_path = thumb_path.with_suffix('.tmp')
+                image.save(temp_path, 'JPEG', quality=80)
+            os.replace(temp_path, thumb_path)
+        return thumb_path
+    
+    def migrate(self, db_manager, progress=None) -> Dict[str, int]:
+        """ترحيل الصور القديمة (منسوخة بحجمها الكامل) إلى المخزن
+        
+        يُحدَّث photo_path لكل نزيل ثم يُحذف الملف القديم. الصور المفقودة
+        أو التالفة تُترك كما هي وتُحسب في 'failed'.
+        """
+        rows = db_manager.execute(
+            "SELECT id, photo_path FROM guests WHERE photo_path IS NOT NULL AND photo_path != ''"
+        ).fetchall()
+        pending = [(row['id'], row['photo_path']) for row in rows if not self.is_stored(row['photo_path'])]
+        result = {'migrated': 0, 'failed': 0, 'bytes_before': 0, 'bytes_after': 0}
+        stored = {}
+        
+        for done, (guest_id, old_path) in enumerate(pending, start=1):
+            try:
+                if old_path not in stored:
+                    result['bytes_before'] += os.path.getsize(old_path)
+                    stored[old_path] = self.store(old_path)
+                new_path = stored[old_path]
+            except (OSError, ValueError) as e:
+                print(f"تعذر ترحيل صورة النزيل {guest_id} ({old_path}): {e}")
+                result['failed'] += 1
+                continue
+            
+            with db_manager.transaction() as conn:
+                conn.execute(
+                    "UPDATE guests SET photo_path = ? WHERE id = ?",
+                    (str(new_path), guest_id)
+                )
+            result['migrated'] += 1
+            if progress is not None:
+                progress(done / len(pending))
+        
+        # حذف الأصول بعد تحديث كل النزلاء الذين يشيرون إليها
+        for old_path, new_path in stored.items():
+            if Path(old_path).resolve() != new_path.resolve():
+                Path(old_path).unlink(missing_ok=True)
+        result['bytes_after'] = sum(path.stat().st_size for path in set(stored.values()))
+        return result
+    
+    def remove_orphans(self, referenced, grace_period: float = 24 * 3600) -> Dict[str, int]:
+        """حذف الصور والمصغرات التي لا يشير إليها أي نزيل
+        
+        referenced: مسارات photo_path الموجودة في قاعدة البيانات. المقارنة
+        باسم الملف (بصمة المحتوى) لا بالمسار الكامل، فنقل مجلد البرنامج أو
+        استعادة نسخة من جهاز آخر لا يجعل الصور يتيمة. وإذا لم يقع أي مسار
+        مسجل داخل المخزن لا يُحذف شيء. الملفات الأحدث من grace_period ثانية
+        تُترك، فقد تكون صورة حُفظت للتو ولم يُسجَّل نزيلها بعد.
+        """
+        result = {'removed': 0, 'bytes': 0}
+        if not self.root.exists():
+            return result
+        
+        referenced = [Path(path) for path in referenced]
+        root = self.root.resolve()
+        if referenced and not any(root in path.resolve().parents for path in referenced):
+            print("تنظيف الصور متوقف: مسارات الصور المسجلة لا تقع داخل مجلد الصور الحالي")
+            return result
+        
+        keep = {path.name for path in referenced}
+        # مصغرة الصورة المخزنة تحمل اسمها نفسه حتى لو تغير مسار المجلد
+        keep_thumbs = {self.thumbnail_path(path).name for path in referenced} | keep
+        cutoff = time.time() - grace_period
+        
+        for path in self.root.rglob('*'):
+            if not path.is_file():
+                continue
+            if path.parent == self.thumbs_dir:
+                orphan = path.name not in keep_thumbs
+            else:
+                orphan = path.name not in keep
+            
+            try:
+                stat = path.stat()
+                if orphan and stat.st_mtime < cutoff:
+                    path.unlink()
+                    result['removed'] += 1
+                    result['bytes'] += stat.st_size
+            except OSError as e:
+                print(f"تعذر حذف الصورة اليتيمة {path}: {e}")
+        return result
+
+# ملفات الخط العربي المجربة بالترتيب لتقارير PDF
+# (الاسم المجرد يُبحث عنه في مسارات الخطوط المعروفة لدى reportlab)
+PDF_FONT_CANDIDATES = [
+    str(BASE_DIR / "fonts" / "arial.ttf"),
+    "arial.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+]
+
+@lru_cache(maxsize=None)
+def register_pdf_font() -> str:
+    """تسجيل الخط العربي في reportlab مرة واحدة لكل عملية
+    
+    تُرجع اسم الخط المسجل، أو Helvetica إن لم يتوفر أي خط.
+    """
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    
+    for font_file in PDF_FONT_CANDIDATES:
+        try:
+            pdfmetrics.registerFont(TTFont('Arabic', font_file))
+            return 'Arabic'
+        except Exception:
+            continue
+    return 'Helvetica'
+
+class _FlowableStream(list):
+    """قائمة flowables تُملأ تدريجياً من مولّد أثناء بناء المستند
+    
+    reportlab يستهلك القائمة من أولها، فلا يبقى في الذاكرة إلا عناصر
+    الصفحة الجارية بدلاً من جداول التقرير كاملة.
+    """
+    
+    def __init__(self, source, lookahead: int = 2):
+        super().__init__()
+        self._source = iter(source)
+        self._lookahead = lookahead
+    
+    def __len__(self):
+        while list.__len__(self) < self._lookahead:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                break
+        return list.__len__(self)
+
+class ReportEngine:
+    """توليد تقارير PDF متعددة الصفحات للنزلاء والحجوزات"""
+    
+    # عدد الصفوف في كل جدول (صفحة واحدة تقريباً)
+    ROWS_PER_TABLE = 35
+    
+    GUEST_COLUMNS = ["رقم", "الاسم الكامل", "رقم البطاقة", "الجنس", "مكان الميلاد", "تاريخ التسجيل"]
+    BOOKING_COLUMNS = ["رقم", "النزيل", "الغرفة", "السرير", "الدخول", "الخروج", "المبلغ", "الحالة"]
+    
+    # عرض المخطط في التقرير (سم)
+    CHART_WIDTH = 8.5
+    
+    def __init__(self, db_manager, charts: Optional[Dict[str, Path]] = None):
+        self.db_manager = db_manager
+        # صور المخططات المرسومة مسبقاً (انظر ChartRenderer)
+        self.charts = charts or {}
+    
+    def generate(self, start: date, end: date, dest_path, progress=None) -> Path:
+        """توليد تقرير الفترة [start, end) في الملف dest_path"""
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import ParagraphStyle
+        from reportlab.lib.units import cm
+        from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+        
+        self.font = register_pdf_font()
+        self.colors = colors
+        self.title_style = ParagraphStyle(
+            'title', fontName=self.font, fontSize=16, leading=22, alignment=2
+        )
+        self.text_style = ParagraphStyle(
+            'text', fontName=self.font, fontSize=11, leading=16, alignment=2
+        )
+        
+        dest_path = Path(dest_path)
+        self._start, self._end = start, end
+        period = self.db_manager._date_range(start, end)
+        guest_total = self.db_manager.execute(
+            "SELECT COUNT(*) FROM guests WHERE registration_date >= ? AND registration_date < ? "
+            "AND deleted_at IS NULL",
+            period
+        ).fetchone()[0]
+        booking_total = self.db_manager.execute(
+            "SELECT COUNT(*) FROM bookings WHERE check_in >= ? AND check_in < ?",
+            period
+        ).fetchone()[0]
+        self._progress = progress
+        self._done = 0
+        self._total = guest_total + booking_total
+        
+        def story():
+            yield Paragraph(ArabicText.reshape("تقرير بيت الشباب كريم جلول"), self.title_style)
+            yield Paragraph(
+                ArabicText.reshape(
+                    f"الفترة: {start.isoformat()} - {(end - timedelta(days=1)).isoformat()}"
+                    f" | تاريخ الإنشاء: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+                ),
+                self.text_style
+            )
+            yield Spacer(1, 0.5 * cm)
+            yield from self._summary()
+            yield from self._charts()
+            
+            yield Paragraph(ArabicText.reshape(f"النزلاء المسجلون ({guest_total})"), self.title_style)
+            yield from self._tables(
+                self.GUEST_COLUMNS,
+                '''SELECT id, last_name || ' ' || first_name, national_id, gender,
+                          birth_place, registration_date
+                   FROM guests
+                   WHERE registration_date >= ? AND registration_date < ?
+                     AND deleted_at IS NULL
+                   ORDER BY registration_date''',
+                period
+            )
+            
+            yield Spacer(1, 0.5 * cm)
+            yield Paragraph(ArabicText.reshape(f"الحجوزات ({booking_total})"), self.title_style)
+            yield from self._tables(
+                self.BOOKING_COLUMNS,
+                '''SELECT b.id, g.last_name || ' ' || g.first_name, b.room_number,
+                          b.bed_number, b.check_in, b.check_out,
+                          printf('%.2f', COALESCE(b.total_price, 0)), b.status
+                   FROM bookings b LEFT JOIN guests g ON g.id = b.guest_id
+                   WHERE b.check_in >= ? AND b.check_in < ?
+                   ORDER BY b.check_in''',
+                period
+            )
+        
+        doc = SimpleDocTemplate(
+            str(dest_path), pagesize=A4,
+            leftMargin=1.5 * cm, rightMargin=1.5 * cm,
+            topMargin=1.5 * cm, bottomMargin=1.5 * cm
+        )
+        doc.build(_FlowableStream(story()))
+        
+        if progress is not None:
+            progress(1.0)
+        return dest_path
+    
+    def _summary(self):
+        """جدول ملخص الإحصائيات"""
+        stats = self.db_manager.get_statistics()
+        revenue = self.db_manager.get_revenue(self._start, self._end)
+        rows = [
+            ("إجمالي النزلاء", stats.get('total_guests', 0)),
+            ("الحجوزات النشطة", stats.get('active_bookings', 0)),
+            ("إيرادات الفترة", f"{revenue:,.2f} د.ج"),
+            ("عدد الذكور", stats.get('gender_distribution', {}).get('ذكر', 0)),
+            ("عدد الإناث", stats.get('gender_distribution', {}).get('أنثى', 0)),
+        ]
+        # القيمة يساراً والتسمية يميناً (اتجاه عربي)
+        yield self._table([
+            (ArabicText.reshape(str(value)), ArabicText.reshape(label))
+            for label, value in rows
+        ], header=False)
+    
+    def _charts(self):
+        """صور المخططات، اثنتان في كل سطر"""
+        from reportlab.lib.units import cm
+        from reportlab.platypus import Image, Table
+        
+        width = self.CHART_WIDTH * cm
+        height = width * ChartRenderer.CHART_SIZE[1] / ChartRenderer.CHART_SIZE[0]
+        images = [
+            Image(str(path), width=width, height=height)
+            for path in self.charts.values() if Path(path).exists()
+        ]
+        for i in range(0, len(images), 2):
+            yield Table([images[i:i + 2]], hAlign='CENTER')
+    
+    def _tables(self, columns, query, params):
+        """جداول متتالية بحجم صفحة تقريباً من نتائج استعلام يُقرأ على دفعات"""
+        from reportlab.platypus import Paragraph
+        
+        header = [ArabicText.reshape(c) for c in reversed(columns)]
+        chunks = self.db_manager.iter_query(query, params, chunk_size=self.ROWS_PER_TABLE)
+        next(chunks)
+        
+        empty = True
+        for rows in chunks:
+            empty = False
+            data = [header] + [
+                [ArabicText.reshape('' if value is None else str(value)) for value in reversed(row)]
+                for row in rows
+            ]
+            yield self._table(data)
+            
+            self._done += len(rows)
+            if self._progress is not None and self._total:
+                self._progress(min(self._done / self._total, 0.99))
+        
+        if empty:
+            yield Paragraph(ArabicText.reshape("لا توجد بيانات"), self.text_style)
+    
+    def _table(self, data, header: bool = True):
+        """جدول منسق بالخط العربي"""
+        from reportlab.platypus import Table, TableStyle
+        
+        style = [
+            ('FONTNAME', (0, 0), (-1, -1), self.font),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 0.25, self.colors.grey),
+        ]
+        if header:
+            style.append(('BACKGROUND', (0, 0), (-1, 0), self.colors.HexColor('#2d5b8a')))
+            style.append(('TEXTCOLOR', (0, 0), (-1, 0), self.colors.white))
+        
+        table = Table(data, repeatRows=1 if header else 0, hAlign='RIGHT')
+        table.setStyle(TableStyle(style))
+        return table
+
+# مقاس بطاقة النزيل (مقاس بطاقة التعريف ID-1) بالمليمتر وعددها في ورقة A4
+CARD_SIZE_MM = (85.6, 54.0)
+CARDS_PER_ROW = 2
+CARD_ROWS = 5
+
+_card_pool = None
+_card_pool_lock = threading.Lock()
+
+def card_process_pool() -> ProcessPoolExecutor:
+    """عملية مستقلة لتوليد البطاقات، تبقى حية ليُستفاد من الخط المسجل فيها"""
+    global _card_pool
+    with _card_pool_lock:
+        if _card_pool is None:
+            _card_pool = ProcessPoolExecutor(max_workers=1)
+        return _card_pool
+
+def render_guest_cards(cards: List[Dict], captions: Dict[str, str], dest_path) -> str:
+    """رسم بطاقات النزلاء في ملف PDF (عشر بطاقات في كل صفحة A4)
+    
+    تعمل في عملية منفصلة: النصوص العربية تصل مشكّلة مسبقاً، وإطار
+    البطاقة وعناوينها الثابتة تُرسم مرة واحدة كـ Form XObject ثم يُعاد
+    استعماله لكل بطاقة.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen import canvas
+    
+    font = register_pdf_font()
+    card_width, card_height = CARD_SIZE_MM[0] * mm, CARD_SIZE_MM[1] * mm
+    page_width, page_height = A4
+    margin_x = (page_width - CARDS_PER_ROW * card_width) / 2
+    margin_y = (page_height - CARD_ROWS * card_height) / 2
+    photo_width, photo_height = 22 * mm, 28 * mm
+    text_right = card_width - 4 * mm
+    photo_store = PhotoStore()
+    
+    pdf = canvas.Canvas(str(dest_path), pagesize=A4)
+    
+    # قالب البطاقة الثابت
+    pdf.beginForm('guest_card')
+    pdf.setStrokeColorRGB(0.18, 0.36, 0.54)
+    pdf.roundRect(0, 0, card_width, card_height, 3 * mm)
+    pdf.setFillColorRGB(0.18, 0.36, 0.54)
+    pdf.rect(0, card_height - 9 * mm, card_width, 9 * mm, stroke=0, fill=1)
+    pdf.setFillColorRGB(1, 1, 1)
+    pdf.setFont(font, 9)
+    pdf.drawCentredString(card_width / 2, card_height - 6 * mm, captions['title'])
+    pdf.setFillColorRGB(0.4, 0.4, 0.4)
+    pdf.setFont(font, 7)
+    for i, key in enumerate(['name', 'national_id', 'stay']):
+        pdf.drawRightString(text_right, card_height - (14 + i * 10) * mm, captions[key])
+    pdf.rect(4 * mm, 5 * mm, photo_width, photo_height)
+    pdf.endForm()
+    
+    for index, card in enumerate(cards):
+        position = index % (CARDS_PER_ROW * CARD_ROWS)
+        if index and position == 0:
+            pdf.showPage()
+        column, row = position % CARDS_PER_ROW, position // CARDS_PER_ROW
+        
+        pdf.saveState()
+        pdf.translate(margin_x + column * card_width,
+                      page_height - margin_y - (row + 1) * card_height)
+        pdf.doForm('guest_card')
+        
+        pdf.setFillColorRGB(0, 0, 0)
+        pdf.setFont(font, 10)
+        for i, key in enumerate(['name', 'national_id', 'stay']):
+            pdf.drawRightString(text_right, card_height - (18 + i * 10) * mm, card[key])
+        
+        if card.get('photo_path'):
+            try:
+                # المصغرة تكفي لمقاس الصورة على البطاقة وتُبقي الملف صغيراً
+                pdf.drawImage(
+                    str(photo_store.thumbnail(card['photo_path'])),
+                    4 * mm, 5 * mm, photo_width, photo_height,
+                    preserveAspectRatio=True, anchor='c'
+                )
+            except OSError:
+                pass
+        pdf.restoreState()
+    
+    pdf.save()
+    return str(dest_path)
+
+class BackgroundTasks:
+    """تشغيل الأعمال الثقيلة خارج خيط الواجهة وإعادة نتائجها عبر after()"""
+    
+    # فترة فحص اكتمال المهام بالميلي ثانية (إطار واحد تقريباً)
+    POLL_INTERVAL = 16
+    
+    def __init__(self, widget, max_workers: int = 1):
+        self.widget = widget
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+    
+    def submit(self, func, *args, on_done=None, on_error=None, on_progress=None, **kwargs):
+        """تنفيذ func في خيط عامل
+        
+        تُستدعى on_done/on_error/on_progress دائماً في خيط الواجهة.
+        إذا مُررت on_progress تتلقى func معاملاً إضافياً progress لإرسال التقدم.
+        """
+        progress_queue = None
+        if on_progress is not None:
+            progress_queue = queue.SimpleQueue()
+            kwargs['progress'] = progress_queue.put
+        
+        future = self.executor.submit(func, *args, **kwargs)
+        self.widget.after(
+            self.POLL_INTERVAL, self._poll,
+            future, on_done, on_error, on_progress, progress_queue
+        )
+        return future
+    
+    def _poll(self, future, on_done, on_error, on_progress, progress_queue):
+        """فحص حالة المهمة دون حجب حلقة الأحداث"""
+        if progress_queue is not None and not progress_queue.empty():
+            # نعرض آخر قيمة فقط لتجنب إغراق الواجهة بالتحديثات
+            value = None
+            while not progress_queue.empty():
+                value = progress_queue.get()
+            if not future.cancelled():
+                on_progress(value)
+        
+        if not future.done():
+            self.widget.after(
+                self.POLL_INTERVAL, self._poll,
+                future, on_done, on_error, on_progress, progress_queue
+            )
+            return
+        
+        if future.cancelled():
+            return
+        
+        error = future.exception()
+        if error is not None:
+            if on_error is not None:
+                on_error(error)
+            else:
+                print(f"خطأ في مهمة خلفية: {error}")
+        elif on_done is not None:
+            on_done(future.result())
+    
+    def shutdown(self):
+        """إيقاف الخيوط العاملة وإلغاء المهام المعلقة"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class JobScheduler:
+    """جدولة مهام دورية في خيط خلفي دون التزامن مع الكتابة الكثيفة
+    
+    المؤقت يعمل عبر after() في خيط الواجهة، والمهمة نفسها في خيط عامل.
+    تؤجل المهمة إذا كانت هناك كتابة جارية أو حديثة في قاعدة البيانات.
+    """
+    
+    # فترة فحص المهام المستحقة (ميلي ثانية)
+    CHECK_INTERVAL = 30 * 1000
+    # مدة الهدوء المطلوبة (بالثواني) بعد آخر كتابة قبل بدء مهمة
+    QUIET_PERIOD = 10
+    
+    def __init__(self, widget, db_manager):
+        self.widget = widget
+        self.db_manager = db_manager
+        self.tasks = BackgroundTasks(widget)
+        self.jobs = {}
+        self._after_id = None
+    
+    def add_job(self, name: str, func, interval: float, enabled: bool = True,
+                on_done=None, on_error=None):
+        """تسجيل مهمة تتكرر كل interval ثانية"""
+        self.jobs[name] = {
+            'func': func,
+            'interval': interval,
+            'enabled': enabled,
+            'next_run': time.monotonic() + interval,
+            'running': False,
+            'on_done': on_done,
+            'on_error': on_error,
+        }
+    
+    def configure_job(self, name: str, interval: Optional[float] = None,
+                      enabled: Optional[bool] = None):
+        """تغيير فترة المهمة أو تفعيلها/تعطيلها"""
+        job = self.jobs[name]
+        if interval is not None:
+            job['interval'] = interval
+            job['next_run'] = time.monotonic() + interval
+        if enabled is not None:
+            job['enabled'] = enabled
+    
+    def start(self):
+        """بدء المؤقت الدوري"""
+        if self._after_id is None:
+            self._after_id = self.widget.after(self.CHECK_INTERVAL, self._tick)
+    
+    def stop(self):
+        """إيقاف المؤقت والخيوط العاملة"""
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self.tasks.shutdown()
+    
+    def _tick(self):
+        """تشغيل المهام المستحقة"""
+        now = time.monotonic()
+        for name, job in self.jobs.items():
+            if not job['enabled'] or job['running'] or now < job['next_run']:
+                continue
+            # تأجيل المهمة إلى الفحص التالي أثناء الكتابة الكثيفة
+            if self.db_manager.is_busy(self.QUIET_PERIOD):
+                continue
+            self._run(name, job)
+        
+        self._after_id = self.widget.after(self.CHECK_INTERVAL, self._tick)
+    
+    def _run(self, name, job):
+        """تنفيذ مهمة واحدة في الخيط العامل"""
+        job['running'] = True
+        
+        def finished(callback, value):
+            job['running'] = False
+            job['next_run'] = time.monotonic() + job['interval']
+            if callback is not None:
+                callback(value)
+            elif isinstance(value, BaseException):
+                print(f"خطأ في المهمة المجدولة {name}: {value}")
+        
+        self.tasks.submit(
+            job['func'],
+            on_done=lambda result: finished(job['on_done'], result),
+            on_error=lambda error: finished(job['on_error'], error)
+        )
+
+class ThumbnailCache:
+    """ذاكرة LRU محدودة لصور CTkImage المصغرة، تُفك في خيط عامل عند الطلب
+    
+    الطلب الجديد يلغي طلبات نفس الطالب القديمة التي لم تبدأ بعد، فلا تتراكم
+    أعمال فك الصور أثناء التمرير السريع، ولا يلغي طلبات طالب آخر (معاينة
+    الجدول ونافذة التفاصيل مثلاً). الصورة التي تعذر فتحها تُعاد محاولتها
+    إذا تغير الملف، ويُحتفظ بآخر max_items صورة فاشلة فقط.
+    """
+    
+    def __init__(self, widget, photo_store, max_items: int = 200):
+        self.photo_store = photo_store
+        self.max_items = max_items
+        self.tasks = BackgroundTasks(widget, max_workers=2)
+        self._images = OrderedDict()
+        # المفتاح -> {'future', 'callbacks': {الطالب: الدالة}}
+        self._pending = {}
+        # المفتاح -> حالة الملف عند الفشل (الأقدم يُخرج أولاً)
+        self._failed = OrderedDict()
+    
+    def get(self, photo_path, size: Optional[int] = None):
+        """الصورة من الذاكرة (أو None إن لم تُفك بعد)"""
+        key = (photo_path, size)
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+        return image
+    
+    def request(self, photo_paths, on_ready=None, size: Optional[int] = None, requester=None):
+        """طلب فك مجموعة صور بالترتيب؛ on_ready(path, image) لكل صورة تجهز
+        
+        requester يميز مصدر الطلب: الطلبات السابقة لنفس الطالب التي لم تعد
+        مطلوبة تُلغى، وطلبات غيره تبقى.
+        """
+        wanted = {(path, size) for path in photo_paths if path}
+        
+        # إلغاء طلبات هذا الطالب السابقة التي لم تعد مطلوبة ولم تبدأ
+        for key, pending in list(self._pending.items()):
+            if key in wanted:
+                continue
+            pending['callbacks'].pop(requester, None)
+            if not pending['callbacks'] and pending['future'].cancel():
+                del self._pending[key]
+        
+        for path in photo_paths:
+            key = (path, size)
+            if not path:
+                continue
+            if key in self._failed:
+                if self._failed[key] == self._file_state(path):
+                    continue
+                # الملف تغير منذ الفشل: إعادة المحاولة
+                del self._failed[key]
+            if key in self._images:
+                if on_ready is not None:
+                    on_ready(path, self.get(path, size))
+                continue
+            if key in self._pending:
+                # طلب متكرر من نفس الطالب يستبدل دالته السابقة ولا يضيف أخرى
+                self._pending[key]['callbacks'][requester] = on_ready
+                continue
+            self._pending[key] = {
+                'callbacks': {requester: on_ready},
+                'future': self.tasks.submit(
+                    self._decode, path, size,
+                    on_done=lambda image, key=key: self._on_decoded(key, image),
+                    on_error=lambda error, key=key: self._on_failed(key, error)
+                ),
+            }
+    
+    @staticmethod
+    def _file_state(photo_path):
+        """وقت التعديل والحجم (أو None إن لم يوجد الملف)"""
+        try:
+            stat = os.stat(photo_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _decode(self, photo_path, size):
+        """(خيط عامل) فتح المصغرة أو تصغير الصورة الأصلية إلى size"""
+        from PIL import Image
+        
+        if size is None:
+            with Image.open(self.photo_store.thumbnail(photo_path)) as image:
+                return image.convert('RGB')
+        with Image.open(photo_path) as image:
+            image.draft('RGB', (size, size))
+            image = image.convert('RGB')
+            image.thumbnail((size, size))
+            return image
+    
+    def _on_decoded(self, key, image):
+        """إنشاء CTkImage في خيط الواجهة وإضافتها مع إخراج الأقدم"""
+        pending = self._pending.pop(key, None)
+        ctk_image = ctk.CTkImage(light_image=image, size=image.size)
+        self._images[key] = ctk_image
+        while len(self._images) > self.max_items:
+            self._images.popitem(last=False)
+        for callback in pending['callbacks'].values() if pending else ():
+            if callback is not None:
+                callback(key[0], ctk_image)
+    
+    def _on_failed(self, key, error):
+        self._pending.pop(key, None)
+        self._failed[key] = self._file_state(key[0])
+        while len(self._failed) > self.max_items:
+            self._failed.popitem(last=False)
+        print(f"تعذر فتح الصورة {key[0]}: {error}")
+
+class ChangeBus:
+    """ناقل إشعارات التغيير داخل العملية (نزلاء، حجوزات، إعدادات...)
+    
+    يُنشر الحدث بعد تثبيت المعاملة. الإشعارات الصادرة من خيط الواجهة
+    تُسلَّم فوراً، أما الصادرة من الخيوط العاملة فتُجمع في طابور يفرغه
+    خيط الواجهة (حدث واحد لكل موضوع في كل دفعة).
+    
+    الحدث المجمّع يحمل اتحاد المعرفات في guest_ids/booking_ids، وإذا كان
+    أحد الأحداث المجمعة بلا معرفات (استيراد، استعادة...) يحمل
+    full_reload=True ليعيد المشترك تحميل كل شيء.
+    """
+    
+    # فترة تفريغ طابور الخيوط العاملة (ميلي ثانية)
+    DRAIN_INTERVAL = 100
+    # حقول المعرفات المدمجة عند التجميع: المفرد -> الجمع
+    ID_FIELDS = {'guest_id': 'guest_ids', 'booking_id': 'booking_ids'}
+    
+    def __init__(self):
+        self._subscribers: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._pending = queue.SimpleQueue()
+        self._widget = None
+        self._ui_thread = None
+    
+    def bind(self, widget):
+        """ربط الناقل بحلقة أحداث الواجهة (يُستدعى من خيط الواجهة)"""
+        self._widget = widget
+        self._ui_thread = threading.get_ident()
+        self._widget.after(self.DRAIN_INTERVAL, self._drain)
+    
+    def subscribe(self, topic: str, callback):
+        """الاشتراك في موضوع؛ تُرجع دالة لإلغاء الاشتراك"""
+        with self._lock:
+            self._subscribers.setdefault(topic, []).append(callback)
+        
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers.get(topic, []):
+                    self._subscribers[topic].remove(callback)
+        return unsubscribe
+    
+    def publish(self, topic: str, **details):
+        """نشر حدث تغيير: callback(event) حيث event يحوي 'topic' والتفاصيل"""
+        event = dict(details, topic=topic)
+        if self._ui_thread is None or threading.get_ident() == self._ui_thread:
+            self._deliver(event)
+        else:
+            self._pending.put(event)
+    
+    def _deliver(self, event):
+        with self._lock:
+            callbacks = list(self._subscribers.get(event['topic'], []))
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"خطأ في مشترك {event['topic']}: {e}")
+    
+    def _drain(self):
+        """تسليم أحداث الخيوط العاملة في خيط الواجهة"""
+        if not self._pending.empty():
+            batches = {}
+            while not self._pending.empty():
+                event = self._pending.get()
+                batches.setdefault(event['topic'], []).append(event)
+            for events in batches.values():
+                self._deliver(events[0] if len(events) == 1 else self._merge(events))
+        self._widget.after(self.DRAIN_INTERVAL, self._drain)
+    
+    def _merge(self, events):
+        """دمج أحداث موضوع واحد في حدث مع اتحاد المعرفات"""
+        merged = dict(events[-1], coalesced=len(events))
+        ids = {plural: set() for plural in self.ID_FIELDS.values()}
+        for event in events:
+            found = False
+            for single, plural in self.ID_FIELDS.items():
+                if single in event:
+                    ids[plural].add(event[single])
+                    found = True
+                if plural in event:
+                    ids[plural].update(event[plural])
+                    found = True
+            if not found or event.get('full_reload'):
+                merged['full_reload'] = True
+        
+        for single, plural in self.ID_FIELDS.items():
+            merged.pop(single, None)
+            merged.pop(plural, None)
+            if ids[plural]:
+                merged[plural] = sorted(ids[plural])
+        return merged
+
+class ConcurrentModificationError(Exception):
+    """عُدِّل السجل من مكان آخر منذ قراءته (current: القيم الحالية)"""
+    
+    def __init__(self, message, current=None):
+        super().__init__(message)
+        self.current = current
+
+class BookingConflictError(Exception):
+    """السرير محجوز في جزء من الفترة المطلوبة"""
+
+class DuplicateNationalIdError(Exception):
+    """رقم بطاقة التعريف مسجل لنزيل آخر"""
+
+class OperationCancelled(Exception):
+    """أُلغيت العملية الخلفية بطلب من المستخدم"""
+
+class _BackupRestarted(Exception):
+    """إشارة داخلية: أُعيد النسخ الاحتياطي من البداية مرات كثيرة"""
+
 class DatabaseManager:
     """مدير قاعدة البيانات"""
     
-    def __init__(self):
-        self.db_path = DATA_DIR / "database.db"
+    # إعدادات الأداء المطبقة على كل اتصال
+    PRAGMAS = [
+        # يجب أن يسبق إنشاء الجداول ليؤثر في قاعدة جديدة (القديمة تُحوَّل في maintenance)
+        ('auto_vacuum', 'INCREMENTAL'),
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('cache_size', '-16000'),        # حوالي 16 ميغابايت
+        ('mmap_size', '67108864'),       # 64 ميغابايت
+        ('temp_store', 'MEMORY'),
+        ('busy_timeout', '5000'),
+        ('foreign_keys', 'ON'),
+    ]
+    
+    # خطوات ترحيل المخطط بالترتيب؛ رقم الإصدار (PRAGMA user_version)
+    # هو عدد الخطوات المطبقة. لا تُعدّل خطوة منشورة، بل تُضاف خطوة جديدة.
+    MIGRATIONS = [
+        '_create_schema',
+        '_create_search_index',
+        '_create_stats_counters',
+        '_create_indexes',
+        '_create_report_indexes',
+        '_create_booking_index',
+        '_add_guest_row_version',
+        '_add_guest_soft_delete',
+        '_drop_check_in_day_index',
+        '_fix_booking_overlap_triggers',
+    ]
+    
+    # التعبئة المؤجلة للبيانات: الاسم -> الدالة التي تعالج نطاق معرفات واحد
+    BACKFILLS = {
+        'guests_fts': '_backfill_guests_fts',
+    }
+    BACKFILL_CHUNK_SIZE = 2000
+    
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else DATA_DIR / "database.db"
+        
+        # اتصال دائم واحد لكل خيط بدلاً من فتح اتصال جديد في كل عملية
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        
+        # التعبئات التي لم تكتمل بعد (يُستخدم البحث التقليدي حتى اكتمالها)
+        self._pending_backfills = set()
+        
+        # نشاط الكتابة (تستخدمه المهام المجدولة لتجنب أوقات الضغط)
+        self._active_writes = 0
+        self._last_write = 0.0
+        self._writes_lock = threading.Lock()
+        
+        # إشعارات التغيير للواجهة (شريط الحالة، الإحصائيات، نتائج البحث)
+        self.changes = ChangeBus()
+        
         self.init_database()
     
-    def init_database(self):
-        """تهيئة قاعدة البيانات والجداول"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _connect(self) -> sqlite3.Connection:
+        """فتح اتصال جديد وتطبيق إعدادات الأداء عليه"""
+        # isolation_level=None: نتحكم في المعاملات يدوياً عبر transaction()
+        conn = sqlite3.connect(
+            self.db_path,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.PRAGMAS:
+            conn.execute(f"PRAGMA {name} = {value}")
+        # دالة التوحيد العربي تستخدمها مشغلات فهرس البحث
+        conn.create_function(
+            'normalize_ar', 1, ArabicText.normalize, deterministic=True
+        )
+        return conn
+    
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """الاتصال الخاص بالخيط الحالي (يُنشأ عند أول استخدام)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    @contextmanager
+    def transaction(self):
+        """معاملة كتابة: تأكيد عند النجاح وتراجع عند حدوث خطأ
+        
+        المعاملات المتداخلة تنضم إلى المعاملة الخارجية.
+        """
+        conn = self.connection
+        if conn.in_transaction:
+            yield conn
+            return
+        
+        conn.execute('BEGIN IMMEDIATE')
+        self._write_started()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            self._write_finished()
+    
+    def _write_started(self):
+        """تسجيل بدء كتابة (العداد مشترك بين الخيوط العاملة)"""
+        with self._writes_lock:
+            self._active_writes += 1
+    
+    def _write_finished(self):
+        """تسجيل انتهاء كتابة ووقتها"""
+        with self._writes_lock:
+            self._active_writes -= 1
+            self._last_write = time.monotonic()
+    
+    def is_busy(self, quiet_period: float = 0) -> bool:
+        """هل توجد كتابة جارية أو حدثت خلال آخر quiet_period ثانية؟"""
+        with self._writes_lock:
+            return (self._active_writes > 0
+                    or time.monotonic() - self._last_write < quiet_period)
+    
+    def execute(self, query: str, params=()) -> sqlite3.Cursor:
+        """تنفيذ استعلام قراءة على اتصال الخيط الحالي"""
+        return self.connection.execute(query, params)
+    
+    def checkpoint(self):
+        """دمج سجل WAL في ملف قاعدة البيانات الرئيسي"""
+        self.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    
+    # عدد الصفحات المنسوخة في كل خطوة من النسخ الاحتياطي
+    BACKUP_PAGES_PER_STEP = 256
+    # عدد مرات إعادة النسخ المسموح بها قبل اللجوء إلى النسخ في خطوة واحدة
+    BACKUP_MAX_RESTARTS = 3
+    
+    def backup(self, dest_path, compress: bool = False, progress=None,
+               in_place: bool = False) -> Path:
+        """نسخة احتياطية متسقة من قاعدة البيانات أثناء عملها
+        
+        تستخدم واجهة النسخ في SQLite على خطوات محدودة الصفحات، فلا تُلتقط
+        صفحات نصف مكتوبة ولا تُحجب عمليات الكتابة طوال مدة النسخ.
+        progress (اختياري) تتلقى نسبة الإنجاز بين 0 و1. in_place يكتب
+        مباشرة فوق dest_path الموجود بدل ملف مؤقت جديد (لقطة عمل تتجدد).
+        """
+        dest_path = Path(dest_path)
+        temp_path = dest_path if in_place else dest_path.with_name(dest_path.name + '.tmp')
+        
+        restarts = [0, None]
+        
+        def report(status, remaining, total):
+            # الكتابة من اتصال آخر أثناء النسخ تعيده من البداية
+            if restarts[1] is not None and remaining > restarts[1]:
+                restarts[0] += 1
+                if restarts[0] > self.BACKUP_MAX_RESTARTS:
+                    raise _BackupRestarted()
+            restarts[1] = remaining
+            if progress is not None and total:
+                progress((total - remaining) / total)
+        
+        target = sqlite3.connect(temp_path)
+        try:
+            if in_place:
+                # اللقطة تُعاد كتابتها كاملة عند أي فشل، فلا داعي لسجل يضاعف الكتابة
+                target.execute("PRAGMA journal_mode=OFF")
+            try:
+                self.connection.backup(
+                    target,
+                    pages=self.BACKUP_PAGES_PER_STEP,
+                    progress=report,
+                    sleep=0.05
+                )
+            except _BackupRestarted:
+                # تحت كتابة متواصلة ننسخ في خطوة واحدة من لقطة قراءة ثابتة؛
+                # في وضع WAL لا يحجب ذلك عمليات الكتابة
+                self.connection.backup(target, pages=-1)
+                if progress is not None:
+                    progress(1.0)
+        finally:
+            target.close()
+        
+        if compress:
+            dest_path = dest_path.with_name(dest_path.name + '.gz')
+            with open(temp_path, 'rb') as src, gzip.open(dest_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            temp_path.unlink()
+        elif not in_place:
+            temp_path.replace(dest_path)
+        
+        return dest_path
+    
+    @staticmethod
+    def rotate_backups(keep: int, pattern: str = 'backup_*'):
+        """حذف أقدم النسخ الاحتياطية والإبقاء على آخر keep نسخة"""
+        backups = sorted(
+            BACKUP_DIR.glob(pattern),
+            key=lambda path: path.stat().st_mtime,
+            reverse=True
+        )
+        for old_backup in backups[keep:]:
+            old_backup.unlink()
+    
+    def create_backup(self, compress: bool = True, progress=None) -> Path:
+        """إنشاء نسخة احتياطية في BACKUP_DIR مع تطبيق سياسة الاحتفاظ"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup_file = self.backup(
+            BACKUP_DIR / f"backup_{timestamp}.db",
+            compress=compress,
+            progress=progress
+        )
+        
+        retention = self.get_settings(['backup_retention']).get('backup_retention', '10')
+        self.rotate_backups(int(retention))
+        return backup_file
+    
+    @staticmethod
+    def materialize_backup(backup_path) -> Path:
+        """تجهيز ملف نسخة احتياطية كقاعدة بيانات قابلة للفتح
+        
+        يفك الضغط عند الحاجة، ويعيد بناء النسخ التزايدية (.pdiff.gz)
+        بتطبيق فروقات السلسلة على نسختها الكاملة.
+        """
+        backup_path = Path(backup_path)
+        if backup_path.name.endswith('.pdiff.gz'):
+            return DatabaseManager._rebuild_incremental(backup_path)
+        if backup_path.suffix != '.gz':
+            return backup_path
+        
+        restored = BACKUP_DIR / f"restore_{backup_path.stem}"
+        with gzip.open(backup_path, 'rb') as src, open(restored, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        return restored
+
+    def validate_backup(self, backup_file: Path):
+        """التحقق من سلامة نسخة احتياطية وتوافق إصدار مخططها
+        
+        يرفع ValueError إذا كان الملف تالفاً أو ليس قاعدة بيانات البرنامج.
+        """
+        try:
+            conn = sqlite3.connect(f"file:{backup_file}?mode=ro", uri=True)
+        except sqlite3.Error as e:
+            raise ValueError(f"تعذر فتح النسخة الاحتياطية: {e}")
+        try:
+            result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+            if result != 'ok':
+                raise ValueError(f"النسخة الاحتياطية تالفة: {result}")
+            
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version > len(self.MIGRATIONS):
+                raise ValueError("النسخة الاحتياطية من إصدار أحدث من البرنامج")
+            
+            has_guests = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'guests'"
+            ).fetchone()
+            if not has_guests:
+                raise ValueError("الملف ليس نسخة احتياطية لقاعدة بيانات بيت الشباب")
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"النسخة الاحتياطية تالفة: {e}")
+        finally:
+            conn.close()
+    
+    def restore(self, backup_path, progress=None):
+        """استعادة نسخة احتياطية إلى قاعدة البيانات الحية دون إعادة التشغيل
+        
+        يُتحقق من النسخة أولاً، ثم تُنسخ عبر واجهة النسخ في خطوة واحدة
+        (لا يرى أي اتصال آخر حالة نصف مستعادة)، ثم تُطبق خطوات الترحيل
+        إذا كانت النسخة من مخطط أقدم.
+        """
+        backup_path = Path(backup_path)
+        restored = self.materialize_backup(backup_path)
+        try:
+            self.validate_backup(restored)
+            if progress is not None:
+                progress(0.3)
+            
+            source = sqlite3.connect(f"file:{restored}?mode=ro", uri=True)
+            self._write_started()
+            try:
+                source.backup(self.connection, pages=-1)
+            finally:
+                self._write_finished()
+                source.close()
+            if progress is not None:
+                progress(0.8)
+            
+            self.init_database()
+            if progress is not None:
+                progress(1.0)
+        finally:
+            if restored != backup_path:
+                for suffix in ('', '-wal', '-shm'):
+                    Path(f"{restored}{suffix}").unlink(missing_ok=True)
+        
+        # كل البيانات تغيرت: تعيد الواجهة تحميل إطاراتها
+        self.changes.publish('database', action='restored')
+    
+    # ===== التصدير المتدفق =====
+    
+    # الجداول القابلة للتصدير الكامل
+    EXPORT_TABLES = ('guests', 'bookings')
+    # شرط الصفوف المصدرة لكل جدول (النزلاء المحذوفون حذفاً مؤقتاً لا يُصدَّرون)
+    EXPORT_FILTERS = {
+        'guests': 'WHERE deleted_at IS NULL',
+    }
+    EXPORT_CHUNK_SIZE = 1000
+    # الحد الأقصى لصفوف ورقة Excel (مع صف العناوين)
+    XLSX_MAX_ROWS = 1048576
+    
+    def iter_query(self, query: str, params=(), chunk_size: Optional[int] = None):
+        """تنفيذ استعلام قراءة وإرجاع نتائجه على دفعات من لقطة واحدة متسقة
+        
+        يُرجع أولاً أسماء الأعمدة، ثم دفعات الصفوف تباعاً، دون تحميل
+        النتيجة كاملة في الذاكرة.
+        """
+        chunk_size = chunk_size or self.EXPORT_CHUNK_SIZE
+        
+        # اتصال مستقل حتى لا تتداخل معاملة القراءة الطويلة مع كتابات الخيط
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN')
+            cursor = conn.execute(query, params)
+            yield [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+    
+    def iter_table(self, table: str, chunk_size: Optional[int] = None):
+        """قراءة جدول كامل على دفعات (الأعمدة وعدد الصفوف أولاً ثم الصفوف)"""
+        if table not in self.EXPORT_TABLES:
+            raise ValueError(f"جدول غير مسموح بتصديره: {table}")
+        
+        where = self.EXPORT_FILTERS.get(table, '')
+        total = self.execute(f'SELECT COUNT(*) FROM {table} {where}').fetchone()[0]
+        chunks = self.iter_query(f'SELECT * FROM {table} {where} ORDER BY id', chunk_size=chunk_size)
+        yield next(chunks), total
+        yield from chunks
+    
+    def export_table(self, table: str, dest_path, progress=None, cancel=None) -> Path:
+        """تصدير جدول كامل إلى CSV أو XLSX بذاكرة ثابتة مهما كان عدد الصفوف
+        
+        الصيغة تُحدد من امتداد الملف. cancel (threading.Event اختياري)
+        يوقف التصدير بين الدفعات ويحذف الملف الجزئي.
+        """
+        dest_path = Path(dest_path)
+        chunks = self.iter_table(table)
+        columns, total = next(chunks)
+        phone_index = columns.index('phone_numbers') if 'phone_numbers' in columns else None
+        
+        def prepare(row):
+            row = list(row)
+            # أرقام الهواتف مخزنة كـ JSON؛ نصدرها نصاً مقروءاً
+            if phone_index is not None and row[phone_index]:
+                row[phone_index] = ', '.join(json.loads(row[phone_index]))
+            return row
+        
+        if dest_path.suffix.lower() == '.xlsx':
+            import xlsxwriter
+            workbook = xlsxwriter.Workbook(str(dest_path), {'constant_memory': True})
+            
+            def add_sheet():
+                sheet = workbook.add_worksheet(f"{table}_{len(workbook.worksheets()) + 1}")
+                sheet.write_row(0, 0, columns)
+                return sheet
+            
+            worksheet = add_sheet()
+            row_index = 1
+            
+            def write_rows(rows):
+                nonlocal worksheet, row_index
+                for row in rows:
+                    if row_index >= self.XLSX_MAX_ROWS:
+                        worksheet = add_sheet()
+                        row_index = 1
+                    worksheet.write_row(row_index, 0, prepare(row))
+                    row_index += 1
+            
+            close = workbook.close
+        else:
+            output = open(dest_path, 'w', newline='', encoding='utf-8-sig')
+            writer = csv.writer(output)
+            writer.writerow(columns)
+            
+            def write_rows(rows):
+                writer.writerows(prepare(row) for row in rows)
+            
+            close = output.close
+        
+        written = 0
+        try:
+            for rows in chunks:
+                if cancel is not None and cancel.is_set():
+                    raise OperationCancelled()
+                write_rows(rows)
+                written += len(rows)
+                if progress is not None and total:
+                    progress(min(written / total, 1.0))
+        except BaseException:
+            chunks.close()
+            close()
+            dest_path.unlink(missing_ok=True)
+            raise
+        close()
+        
+        return dest_path
+    
+    # ===== النسخ الاحتياطي التلقائي التزايدي =====
+    
+    AUTO_BACKUP_DIR = BACKUP_DIR / "auto"
+    AUTO_BACKUP_DEFAULTS = {
+        'auto_backup_enabled': '0',
+        'auto_backup_interval': '60',     # بالدقائق
+        'auto_backup_retention': '7',     # عدد السلاسل (نسخة كاملة + فروقاتها)
+        'auto_backup_full_every': '24',   # عدد النسخ التزايدية قبل نسخة كاملة جديدة
+    }
+    
+    def get_auto_backup_settings(self) -> Dict[str, int]:
+        """إعدادات النسخ التلقائي مع القيم الافتراضية"""
+        settings = dict(self.AUTO_BACKUP_DEFAULTS)
+        settings.update(self.get_settings(list(self.AUTO_BACKUP_DEFAULTS)))
+        settings = {key: int(value) for key, value in settings.items()}
+        # قيم محفوظة أقل من 1 (من إصدار سابق) تعني نسخة في كل فحص للمجدول
+        for key in ('auto_backup_interval', 'auto_backup_retention', 'auto_backup_full_every'):
+            settings[key] = max(settings[key], 1)
+        return settings
+    
+    @staticmethod
+    def _page_hashes(db_file: Path):
+        """حجم الصفحة وبصمة كل صفحة من ملف قاعدة بيانات"""
+        with open(db_file, 'rb') as f:
+            header = f.read(100)
+            page_size = struct.unpack('>H', header[16:18])[0]
+            if page_size == 1:
+                page_size = 65536
+            f.seek(0)
+            hashes = []
+            while True:
+                page = f.read(page_size)
+                if not page:
+                    break
+                hashes.append(hashlib.blake2b(page, digest_size=8).digest())
+        return page_size, hashes
+    
+    def auto_backup(self) -> Optional[Path]:
+        """نسخة تلقائية: كاملة في بداية كل سلسلة، ثم الصفحات المتغيرة فقط
+        
+        تُحدَّث لقطة العمل snapshot.db (المحتفظ بها بين المرات) عبر واجهة
+        النسخ على خطوات، ثم تُقارن بصمات صفحاتها ببصمات آخر حالة محفوظة في
+        السلسلة (ملف .pages)، ولا يُكتب في مجلد النسخ إلا الصفحات التي تغيرت.
+        تُرجع None إذا لم يتغير شيء.
+        
+        الكلفة: كل تشغيل يقرأ القاعدة كاملة ويعيد كتابة اللقطة (بحجم القاعدة)
+        ثم يقرؤها للبصمات، مهما قل التغيير؛ لذا تُختار الفترة حسب حجم القاعدة.
+        """
+        settings = self.get_auto_backup_settings()
+        auto_dir = self.AUTO_BACKUP_DIR
+        auto_dir.mkdir(exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        # اللقطة تبقى بعد كل تشغيل: تحديثها في مكانها يوفر إنشاء ملف بحجم
+        # القاعدة وحذفه في كل مرة
+        snapshot = self.backup(auto_dir / "snapshot.db", in_place=True)
+        page_size, hashes = self._page_hashes(snapshot)
+        
+        # آخر سلسلة وعدد نسخها التزايدية
+        fulls = sorted(auto_dir.glob("full_*.db.gz"))
+        chain = fulls[-1].name[len("full_"):-len(".db.gz")] if fulls else None
+        manifest = auto_dir / f"full_{chain}.pages" if chain else None
+        increments = list(auto_dir.glob(f"incr_{chain}_*.pdiff.gz")) if chain else []
+        
+        if (manifest is None or not manifest.exists()
+                or len(increments) >= settings['auto_backup_full_every']):
+            # بداية سلسلة جديدة بنسخة كاملة مضغوطة
+            result = auto_dir / f"full_{timestamp}.db.gz"
+            with open(snapshot, 'rb') as src, gzip.open(result, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            manifest = auto_dir / f"full_{timestamp}.pages"
+        else:
+            old_hashes = manifest.read_bytes()
+            old_hashes = [old_hashes[i:i + 8] for i in range(0, len(old_hashes), 8)]
+            changed = [
+                number for number, digest in enumerate(hashes)
+                if number >= len(old_hashes) or old_hashes[number] != digest
+            ]
+            if not changed and len(hashes) == len(old_hashes):
+                return None
+            
+            # ملف الفروقات: ترويسة ثم (رقم الصفحة، محتواها) لكل صفحة متغيرة
+            result = auto_dir / f"incr_{chain}_{timestamp}.pdiff.gz"
+            with open(snapshot, 'rb') as src, gzip.open(result, 'wb') as dst:
+                dst.write(struct.pack('>III', page_size, len(hashes), len(changed)))
+                for number in changed:
+                    src.seek(number * page_size)
+                    dst.write(struct.pack('>I', number))
+                    dst.write(src.read(page_size))
+        
+        manifest.write_bytes(b''.join(hashes))
+        
+        self._rotate_auto_backups(settings['auto_backup_retention'])
+        return result
+    
+    def _rotate_auto_backups(self, keep_chains: int):
+        """حذف أقدم السلاسل كاملة (النسخة الكاملة وفروقاتها وبصماتها)"""
+        fulls = sorted(self.AUTO_BACKUP_DIR.glob("full_*.db.gz"))
+        for full in fulls[:-keep_chains] if keep_chains > 0 else []:
+            chain = full.name[len("full_"):-len(".db.gz")]
+            for path in self.AUTO_BACKUP_DIR.glob(f"incr_{chain}_*.pdiff.gz"):
+                path.unlink()
+            (self.AUTO_BACKUP_DIR / f"full_{chain}.pages").unlink(missing_ok=True)
+            full.unlink()
+    
+    @staticmethod
+    def _rebuild_incremental(diff_path: Path) -> Path:
+        """إعادة بناء قاعدة بيانات من نسخة كاملة وفروقات سلسلتها حتى diff_path"""
+        auto_dir = diff_path.parent
+        # incr_<سلسلة>_<وقت>.pdiff.gz؛ السلسلة والوقت بصيغة YYYYmmdd_HHMMSS
+        parts = diff_path.name[len("incr_"):-len(".pdiff.gz")].split('_')
+        chain, stamp = '_'.join(parts[:2]), '_'.join(parts[2:])
+        
+        restored = BACKUP_DIR / f"restore_{chain}_{stamp}.db"
+        with gzip.open(auto_dir / f"full_{chain}.db.gz", 'rb') as src, \
+                open(restored, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        
+        increments = sorted(auto_dir.glob(f"incr_{chain}_*.pdiff.gz"))
+        with open(restored, 'r+b') as db_file:
+            for increment in increments:
+                if increment.name > diff_path.name:
+                    break
+                with gzip.open(increment, 'rb') as diff:
+                    page_size, page_count, changed = struct.unpack('>III', diff.read(12))
+                    for _ in range(changed):
+                        number = struct.unpack('>I', diff.read(4))[0]
+                        db_file.seek(number * page_size)
+                        db_file.write(diff.read(page_size))
+                db_file.truncate(page_count * page_size)
+        
+        return restored
+    
+    def close_all(self):
+        """إغلاق جميع الاتصالات المفتوحة"""
+        with self._connections_lock:
+            connections = self._connections
+            self._connections = []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+    
+    @property
+    def schema_version(self) -> int:
+        """إصدار المخطط المسجل في قاعدة البيانات"""
+        return self.execute('PRAGMA user_version').fetchone()[0]
+    
+    def init_database(self):
+        """تهيئة قاعدة البيانات وتطبيق خطوات الترحيل الناقصة
+        
+        عند تطابق الإصدار لا يُنفذ أي DDL. كل خطوة تعمل في معاملة مستقلة
+        مع تحديث user_version، فالتوقف في المنتصف لا يترك مخططاً نصف مطبق.
+        """
+        version = self.schema_version
+        
+        for number in range(version + 1, len(self.MIGRATIONS) + 1):
+            step = getattr(self, self.MIGRATIONS[number - 1])
+            with self.transaction() as conn:
+                step(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {number}')
+        
+        self.start_backfills()
+    
+    def _schedule_backfill(self, cursor, name: str, table: str):
+        """تسجيل تعبئة مؤجلة تغطي الصفوف الموجودة حالياً في الجدول
+        
+        الصفوف الأحدث تعالجها المشغلات المنشأة في نفس المعاملة.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_backfills (
+                name TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL DEFAULT 0,
+                max_id INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute(f'SELECT MAX(id) FROM {table}')
+        max_id = cursor.fetchone()[0]
+        if max_id:
+            cursor.execute(
+                'INSERT OR REPLACE INTO schema_backfills (name, last_id, max_id) VALUES (?, 0, ?)',
+                (name, max_id)
+            )
+    
+    def start_backfills(self):
+        """تشغيل التعبئات المعلقة في خيط خلفي إن وجدت"""
+        exists = self.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_backfills'"
+        ).fetchone()
+        if not exists:
+            return
+        
+        pending = {row[0] for row in self.execute('SELECT name FROM schema_backfills')}
+        self._pending_backfills = pending & set(self.BACKFILLS)
+        if self._pending_backfills:
+            threading.Thread(target=self.run_backfills, daemon=True).start()
+    
+    def run_backfills(self):
+        """تنفيذ التعبئات المعلقة على دفعات صغيرة
         
+        كل دفعة معاملة قصيرة مستقلة، فلا تُقفل قاعدة البيانات طويلاً
+        ويمكن استئناف العمل من آخر دفعة بعد إعادة التشغيل.
+        """
+        for name in list(self._pending_backfills):
+            chunk = getattr(self, self.BACKFILLS[name])
+            while True:
+                with self.transaction() as conn:
+                    row = conn.execute(
+                        'SELECT last_id, max_id FROM schema_backfills WHERE name = ?',
+                        (name,)
+                    ).fetchone()
+                    if row is None:
+                        break
+                    last_id, max_id = row
+                    end_id = min(last_id + self.BACKFILL_CHUNK_SIZE, max_id)
+                    chunk(conn, last_id, end_id)
+                    if end_id >= max_id:
+                        conn.execute('DELETE FROM schema_backfills WHERE name = ?', (name,))
+                    else:
+                        conn.execute(
+                            'UPDATE schema_backfills SET last_id = ? WHERE name = ?',
+                            (end_id, name)
+                        )
+                if end_id >= max_id:
+                    break
+                # إفساح المجال لعمليات الكتابة من الواجهة بين الدفعات
+                time.sleep(0.01)
+            self._pending_backfills.discard(name)
+    
+    def _create_schema(self, cursor):
+        """إنشاء الجداول والإعدادات الافتراضية"""
         # جدول النزلاء
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS guests (
@@ -118,120 +1753,1410 @@ class DatabaseManager:
             'INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)',
             default_settings
         )
-        
-        conn.commit()
-        conn.close()
     
-    def add_guest(self, guest_data: Dict) -> int:
-        """إضافة نزيل جديد"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _create_search_index(self, cursor):
+        """إنشاء فهرس البحث النصي FTS5 على الأسماء ورقم البطاقة"""
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'guests_fts'"
+        )
+        exists = cursor.fetchone() is not None
+        
+        # فهرس ثلاثي الحروف يسمح بالبحث عن أي جزء من الاسم دون مسح الجدول
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS guests_fts USING fts5(
+                first_name, last_name, father_name, mother_name, national_id,
+                tokenize = 'trigram'
+            )
+        ''')
+        
+        # مشغلات تحافظ على تزامن الفهرس مع جدول النزلاء
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS guests_fts_ai AFTER INSERT ON guests
+            BEGIN
+                INSERT INTO guests_fts (rowid, first_name, last_name,
+                                        father_name, mother_name, national_id)
+                VALUES (new.id, normalize_ar(new.first_name), normalize_ar(new.last_name),
+                        normalize_ar(new.father_name), normalize_ar(new.mother_name),
+                        normalize_ar(new.national_id));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS guests_fts_ad AFTER DELETE ON guests
+            BEGIN
+                DELETE FROM guests_fts WHERE rowid = old.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS guests_fts_au
+            AFTER UPDATE OF first_name, last_name, father_name, mother_name, national_id
+            ON guests
+            BEGIN
+                DELETE FROM guests_fts WHERE rowid = old.id;
+                INSERT INTO guests_fts (rowid, first_name, last_name,
+                                        father_name, mother_name, national_id)
+                VALUES (new.id, normalize_ar(new.first_name), normalize_ar(new.last_name),
+                        normalize_ar(new.father_name), normalize_ar(new.mother_name),
+                        normalize_ar(new.national_id));
+            END
+        ''')
         
+        # تعبئة الفهرس بالنزلاء الموجودين على دفعات في الخلفية
+        if not exists:
+            self._schedule_backfill(cursor, 'guests_fts', 'guests')
+    
+    def _backfill_guests_fts(self, conn, start_id: int, end_id: int):
+        """فهرسة النزلاء ذوي المعرفات في النطاق (start_id, end_id]"""
+        conn.execute(
+            'DELETE FROM guests_fts WHERE rowid > ? AND rowid <= ?',
+            (start_id, end_id)
+        )
+        conn.execute('''
+            INSERT INTO guests_fts (rowid, first_name, last_name,
+                                    father_name, mother_name, national_id)
+            SELECT id, normalize_ar(first_name), normalize_ar(last_name),
+                   normalize_ar(father_name), normalize_ar(mother_name),
+                   normalize_ar(national_id)
+            FROM guests
+            WHERE id > ? AND id <= ?
+        ''', (start_id, end_id))
+    
+    @staticmethod
+    def _prepare_guest(guest_data: Dict) -> Dict:
+        """تجهيز بيانات النزيل للإدراج: أرقام الهواتف كـ JSON وحذف القيم الفارغة"""
         # تحويل قائمة أرقام الهواتف إلى JSON
         if 'phone_numbers' in guest_data and isinstance(guest_data['phone_numbers'], list):
             guest_data['phone_numbers'] = json.dumps(guest_data['phone_numbers'])
         
+        return {key: value for key, value in guest_data.items() if value is not None}
+    
+    def add_guest(self, guest_data: Dict) -> int:
+        """إضافة نزيل جديد"""
         # إعداد بيانات النزيل
-        columns = []
-        values = []
-        placeholders = []
-        
-        for key, value in guest_data.items():
-            if value is not None:
-                columns.append(key)
-                values.append(value)
-                placeholders.append('?')
+        guest_data = self._prepare_guest(guest_data)
+        columns = list(guest_data)
+        values = list(guest_data.values())
+        placeholders = ['?'] * len(columns)
         
         query = f'''
             INSERT INTO guests ({', '.join(columns)})
             VALUES ({', '.join(placeholders)})
         '''
         
-        cursor.execute(query, values)
-        guest_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            # رقم بطاقة نزيل محذوف يمكن تسجيله من جديد
+            self._purge_guests(conn, "national_id = ?", (guest_data['national_id'],))
+            guest_id = conn.execute(query, values).lastrowid
         
+        self.changes.publish('guests', action='added', guest_id=guest_id)
         return guest_id
     
-    def search_guests(self, search_term: str, search_by: str = 'name') -> List[Dict]:
-        """بحث عن النزلاء"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+    # الحقول الإلزامية في جدول النزلاء (NOT NULL)
+    REQUIRED_GUEST_FIELDS = ['first_name', 'last_name', 'birth_date', 'birth_place', 'national_id']
+    IMPORT_CHUNK_SIZE = 500
+    
+    def import_guests(self, rows, total: Optional[int] = None,
+                      chunk_size: Optional[int] = None, progress=None) -> Dict:
+        """استيراد مجموعة نزلاء في معاملة واحدة على دفعات executemany
         
-        if search_by == 'national_id':
-            cursor.execute(
-                'SELECT * FROM guests WHERE national_id LIKE ?',
-                (f'%{search_term}%',)
+        rows: أي مُكرِّر لأزواج (رقم السطر، قاموس بنفس مفاتيح add_guest) مثل
+        GuestImportFile. الصفوف المرفوضة (حقل ناقص، رقم بطاقة مكرر في الملف
+        أو موجود مسبقاً) لا توقف الاستيراد بل تُسجل في 'errors' مع رقم سطرها
+        في الملف المصدر وسبب الرفض.
+        """
+        chunk_size = chunk_size or self.IMPORT_CHUNK_SIZE
+        result = {'imported': 0, 'errors': []}
+        seen_ids = set()
+        processed = 0
+        
+        with self.transaction() as conn:
+            chunk = []
+            for row_number, guest_data in rows:
+                chunk.append((row_number, guest_data))
+                if len(chunk) >= chunk_size:
+                    self._import_chunk(conn, chunk, seen_ids, result)
+                    processed += len(chunk)
+                    chunk = []
+                    if progress is not None:
+                        progress(processed / total if total else processed)
+            if chunk:
+                self._import_chunk(conn, chunk, seen_ids, result)
+                processed += len(chunk)
+        
+        if progress is not None:
+            progress(1.0 if total else processed)
+        result['errors'].sort(key=lambda error: error[0])
+        if result['imported']:
+            self.changes.publish('guests', action='imported', count=result['imported'])
+        return result
+    
+    def _import_chunk(self, conn, chunk, seen_ids, result):
+        """التحقق من دفعة صفوف ثم إدراج الصالحة منها"""
+        valid = []
+        for row_number, guest_data in chunk:
+            guest_data = {
+                key: (value.strip() if isinstance(value, str) else value) or None
+                for key, value in guest_data.items()
+            }
+            missing = [f for f in self.REQUIRED_GUEST_FIELDS if not guest_data.get(f)]
+            national_id = guest_data.get('national_id')
+            
+            if missing:
+                result['errors'].append((row_number, national_id, f"حقول ناقصة: {', '.join(missing)}"))
+            elif guest_data.get('gender') not in (None, 'ذكر', 'أنثى'):
+                result['errors'].append((row_number, national_id, "قيمة الجنس غير صحيحة"))
+            elif national_id in seen_ids:
+                result['errors'].append((row_number, national_id, "رقم البطاقة مكرر في الملف"))
+            else:
+                seen_ids.add(national_id)
+                valid.append((row_number, self._prepare_guest(guest_data)))
+        
+        if not valid:
+            return
+        
+        # أرقام البطاقات المسجلة مسبقاً في قاعدة البيانات
+        ids = [guest['national_id'] for _, guest in valid]
+        placeholders = ', '.join('?' for _ in ids)
+        existing = {
+            row[0] for row in conn.execute(
+                f"SELECT national_id FROM guests "
+                f"WHERE national_id IN ({placeholders}) AND deleted_at IS NULL", ids
             )
-        else:
-            cursor.execute(
-                '''SELECT * FROM guests 
-                WHERE first_name LIKE ? OR last_name LIKE ? 
-                OR father_name LIKE ? OR mother_name LIKE ?''',
-                (f'%{search_term}%', f'%{search_term}%', 
-                 f'%{search_term}%', f'%{search_term}%')
+        }
+        self._purge_guests(conn, f"national_id IN ({placeholders})", ids)
+        
+        # تجميع الصفوف حسب الأعمدة المتوفرة لاستخدام executemany
+        groups = {}
+        for row_number, guest in valid:
+            if guest['national_id'] in existing:
+                result['errors'].append((row_number, guest['national_id'], "رقم البطاقة مسجل مسبقاً"))
+                continue
+            groups.setdefault(tuple(guest), []).append((row_number, guest))
+        
+        for columns, members in groups.items():
+            query = (
+                f"INSERT INTO guests ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})"
+            )
+            try:
+                conn.execute('SAVEPOINT import_chunk')
+                conn.executemany(query, [tuple(guest.values()) for _, guest in members])
+                conn.execute('RELEASE import_chunk')
+                result['imported'] += len(members)
+            except sqlite3.IntegrityError:
+                # حالة نادرة: نعيد الدفعة صفاً صفاً لمعرفة الصف المخالف
+                conn.execute('ROLLBACK TO import_chunk')
+                conn.execute('RELEASE import_chunk')
+                for row_number, guest in members:
+                    try:
+                        conn.execute(query, tuple(guest.values()))
+                        result['imported'] += 1
+                    except sqlite3.IntegrityError as e:
+                        result['errors'].append((row_number, guest['national_id'], str(e)))
+    
+    # أعمدة الفهرس النصي حسب نوع البحث
+    SEARCH_COLUMNS = {
+        'name': ['first_name', 'last_name', 'father_name', 'mother_name'],
+        'national_id': ['national_id'],
+    }
+    
+    def _build_search_filter(self, search_term: str, search_by: str) -> Tuple[str, list]:
+        """بناء شرط البحث على فهرس FTS5
+        
+        الكلمات من ثلاثة أحرف فأكثر تمر عبر MATCH، والكلمات الأقصر
+        (التي لا يفهرسها التقسيم الثلاثي) تُطابق بـ LIKE على النص الموحد.
+        أثناء تعبئة الفهرس لأول مرة يُبحث مباشرة في جدول النزلاء.
+        """
+        columns = self.SEARCH_COLUMNS.get(search_by, self.SEARCH_COLUMNS['name'])
+        words = ArabicText.normalize(search_term).split()
+        
+        if 'guests_fts' in self._pending_backfills:
+            concatenated = " || ' ' || ".join(
+                f"COALESCE(normalize_ar(g.{c}), '')" for c in columns
             )
+            conditions = [f"({concatenated}) LIKE ?" for _ in words]
+            return ' AND '.join(conditions), [f'%{w}%' for w in words]
+        
+        long_words = [w for w in words if len(w) >= 3]
+        short_words = [w for w in words if len(w) < 3]
         
-        guests = [dict(row) for row in cursor.fetchall()]
+        conditions = []
+        params = []
         
-        # تحويل JSON لأرقام الهواتف
+        if long_words:
+            phrases = ' '.join('"%s"' % w.replace('"', '""') for w in long_words)
+            conditions.append('guests_fts MATCH ?')
+            params.append('{%s} : (%s)' % (' '.join(columns), phrases))
+        
+        concatenated = " || ' ' || ".join(f"COALESCE(guests_fts.{c}, '')" for c in columns)
+        for word in short_words:
+            conditions.append(f"({concatenated}) LIKE ?")
+            params.append(f'%{word}%')
+        
+        return ' AND '.join(conditions), params
+    
+    @staticmethod
+    def _rows_to_guests(rows) -> List[Dict]:
+        """تحويل صفوف النزلاء إلى قواميس مع فك JSON لأرقام الهواتف"""
+        guests = [dict(row) for row in rows]
         for guest in guests:
             if guest.get('phone_numbers'):
                 guest['phone_numbers'] = json.loads(guest['phone_numbers'])
-        
-        conn.close()
         return guests
     
+    def search_guests(self, search_term: str, search_by: str = 'name') -> List[Dict]:
+        """بحث عن النزلاء عبر فهرس البحث النصي مع ترتيب النتائج حسب الصلة"""
+        where, params = self._build_search_filter(search_term, search_by)
+        if not where:
+            return []
+        
+        # rank متاح فقط مع MATCH، لذا نرتب بالمعرف عند البحث بكلمات قصيرة فقط
+        order_by = 'guests_fts.rank, g.id' if 'MATCH' in where else 'g.id'
+        source = 'guests g'
+        if 'guests_fts' in where:
+            source = 'guests_fts JOIN guests g ON g.id = guests_fts.rowid'
+        cursor = self.execute(
+            f'''SELECT g.* FROM {source}
+            WHERE ({where}) AND g.deleted_at IS NULL
+            ORDER BY {order_by}''',
+            params
+        )
+        
+        return self._rows_to_guests(cursor.fetchall())
+    
+    def search_guests_page(self, search_term: str, search_by: str = 'name',
+                           after: Optional[Tuple] = None,
+                           limit: int = 100,
+                           before: Optional[Tuple] = None) -> Tuple[List[Dict], List[Tuple]]:
+        """صفحة واحدة من نتائج البحث باستخدام ترقيم المفتاح (keyset)
+        
+        تُرجع النزلاء ومفتاح الترقيم لكل منهم. after يجلب الصفوف التالية
+        لمفتاح، وbefore يجلب الصفوف السابقة له (للتمرير إلى الأعلى)؛ الصفوف
+        مرتبة تصاعدياً في الحالتين، وعددها أقل من limit عند بلوغ طرف النتائج.
+        نص بحث فارغ يعني تصفح جميع النزلاء بترتيب المعرف.
+        
+        المفتاح هو (id,) حتى في البحث النصي: ترتيب الصلة (bm25) يتغير مع كل
+        إضافة أو تعديل، فمفتاح مبني عليه يكرر الصفوف أو يتخطاها بين الصفحات.
+        """
+        query, params = self._search_page_query(search_term, search_by, after, limit, before)
+        rows = self.execute(query, params).fetchall()
+        if before is not None:
+            rows.reverse()
+        guests = self._rows_to_guests(rows)
+        return guests, [(guest['id'],) for guest in guests]
+    
+    def _search_page_query(self, search_term: str, search_by: str,
+                           after: Optional[Tuple], limit: int,
+                           before: Optional[Tuple] = None) -> Tuple[str, list]:
+        """استعلام صفحة البحث ومعاملاته (يستخدمه أيضاً فحص خطط التنفيذ)"""
+        where, params = self._build_search_filter(search_term, search_by)
+        # النزلاء المحذوفون حذفاً مؤقتاً لا يظهرون في البحث ولا في التصفح
+        where = f'({where}) AND g.deleted_at IS NULL' if where else 'g.deleted_at IS NULL'
+        
+        source, id_column = 'guests g', 'g.id'
+        if 'guests_fts' in where:
+            # rowid الفهرس النصي يساوي معرف النزيل ويُقرأ مرتباً دون فرز إضافي
+            source = 'guests_fts JOIN guests g ON g.id = guests_fts.rowid'
+            id_column = 'guests_fts.rowid'
+        if after is not None:
+            where += f' AND {id_column} > ?'
+            params.append(after[-1])
+        if before is not None:
+            where += f' AND {id_column} < ?'
+            params.append(before[-1])
+        # الصفحة السابقة تُجلب بالترتيب العكسي ثم تُقلب
+        direction = 'DESC' if before is not None else ''
+        
+        query = f'''SELECT g.* FROM {source}
+            WHERE {where}
+            ORDER BY {id_column} {direction}
+            LIMIT ?'''
+        return query, params + [limit]
+    
+    # عبارة تحديث عداد (إنشاء السطر إن لم يكن موجوداً)
+    _BUMP_COUNTER = '''
+        INSERT INTO stats_counters (name, key, value) VALUES ({name}, {key}, {delta})
+        ON CONFLICT (name, key) DO UPDATE SET value = value + excluded.value;
+    '''
+    
+    def _guest_counters(self, row, sign):
+        """تحديث عدادات النزلاء (العدد، الجنس، مكان الميلاد) بصف مشغل"""
+        bump = self._BUMP_COUNTER.format
+        return (
+            bump(name="'total_guests'", key="''", delta=sign)
+            + bump(name="'gender'", key=f"COALESCE({row}.gender, '')", delta=sign)
+            + bump(name="'birth_place'", key=f"{row}.birth_place", delta=sign)
+        )
+    
+    def _create_stats_counters(self, cursor):
+        """إنشاء جدول العدادات الإجمالية والمشغلات التي تحدّثه تدريجياً
+        
+        بدلاً من مسح الجداول كاملة عند كل تحديث للإحصائيات، تحافظ المشغلات
+        على: عدد النزلاء، التوزيع حسب الجنس ومكان الميلاد، الحجوزات النشطة،
+        والإيرادات اليومية للحجوزات النشطة.
+        """
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_counters'"
+        )
+        exists = cursor.fetchone() is not None
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stats_counters (
+                name TEXT NOT NULL,
+                key TEXT NOT NULL DEFAULT '',
+                value REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (name, key)
+            ) WITHOUT ROWID
+        ''')
+        
+        bump = self._BUMP_COUNTER.format
+        guest_counters = self._guest_counters
+        
+        def booking_counters(row, sign):
+            return (
+                bump(name="'active_bookings'", key="''", delta=sign)
+                + bump(
+                    name="'revenue'",
+                    key=f"COALESCE(DATE({row}.check_in), {row}.check_in)",
+                    delta=f"{sign} * COALESCE({row}.total_price, 0)"
+                )
+            )
+        
+        triggers = {
+            'guests_stats_ai': (
+                "AFTER INSERT ON guests",
+                guest_counters('new', '1')
+            ),
+            'guests_stats_ad': (
+                "AFTER DELETE ON guests",
+                guest_counters('old', '-1')
+            ),
+            'guests_stats_au': (
+                "AFTER UPDATE OF gender, birth_place ON guests",
+                bump(name="'gender'", key="COALESCE(old.gender, '')", delta='-1')
+                + bump(name="'birth_place'", key="old.birth_place", delta='-1')
+                + bump(name="'gender'", key="COALESCE(new.gender, '')", delta='1')
+                + bump(name="'birth_place'", key="new.birth_place", delta='1')
+            ),
+            'bookings_stats_ai': (
+                "AFTER INSERT ON bookings WHEN new.status = 'نشط'",
+                booking_counters('new', '1')
+            ),
+            'bookings_stats_ad': (
+                "AFTER DELETE ON bookings WHEN old.status = 'نشط'",
+                booking_counters('old', '-1')
+            ),
+            # التعديل = طرح القيم القديمة ثم إضافة الجديدة
+            'bookings_stats_au_old': (
+                "AFTER UPDATE OF status, total_price, check_in ON bookings "
+                "WHEN old.status = 'نشط'",
+                booking_counters('old', '-1')
+            ),
+            'bookings_stats_au_new': (
+                "AFTER UPDATE OF status, total_price, check_in ON bookings "
+                "WHEN new.status = 'نشط'",
+                booking_counters('new', '1')
+            ),
+        }
+        for name, (event, body) in triggers.items():
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+        
+        # حساب القيم الابتدائية من البيانات الموجودة عند إنشاء الجدول لأول مرة
+        if not exists:
+            self._rebuild_stats_counters(cursor)
+    
+    def _rebuild_stats_counters(self, cursor):
+        """إعادة حساب جميع العدادات من الجداول الأصلية"""
+        # النزلاء المحذوفون حذفاً مؤقتاً لا يُحسبون (العمود يضاف في خطوة ترحيل لاحقة)
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(guests)')}
+        live = 'WHERE deleted_at IS NULL' if 'deleted_at' in columns else ''
+        cursor.execute('DELETE FROM stats_counters')
+        cursor.execute(f'''
+            INSERT INTO stats_counters (name, key, value)
+            SELECT 'total_guests', '', COUNT(*) FROM guests {live}
+            UNION ALL
+            SELECT 'gender', COALESCE(gender, ''), COUNT(*) FROM guests {live} GROUP BY gender
+            UNION ALL
+            SELECT 'birth_place', birth_place, COUNT(*) FROM guests {live} GROUP BY birth_place
+            UNION ALL
+            SELECT 'active_bookings', '', COUNT(*) FROM bookings WHERE status = 'نشط'
+            UNION ALL
+            SELECT 'revenue', COALESCE(DATE(check_in), check_in), SUM(COALESCE(total_price, 0))
+            FROM bookings WHERE status = 'نشط'
+            GROUP BY COALESCE(DATE(check_in), check_in)
+        ''')
+    
+    def rebuild_statistics(self):
+        """إعادة بناء العدادات (بعد الاستعادة أو عند الشك في صحتها)"""
+        with self.transaction() as conn:
+            self._rebuild_stats_counters(conn.cursor())
+    
+    # لقطة الإحصائيات (المعامل: تاريخ اليوم لإيرادات اليوم)
+    STATISTICS_QUERY = '''
+        SELECT name, key, value FROM stats_counters
+        WHERE name IN ('total_guests', 'gender', 'active_bookings')
+           OR (name = 'revenue' AND key = ?)
+        UNION ALL
+        SELECT * FROM (
+            SELECT name, key, value FROM stats_counters
+            WHERE name = 'birth_place' AND value > 0
+            ORDER BY value DESC
+            LIMIT 10
+        )
+    '''
+    
     def get_statistics(self) -> Dict:
-        """الحصول على الإحصائيات"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """الحصول على الإحصائيات من جدول العدادات باستعلام واحد"""
+        today = date.today().isoformat()
+        cursor = self.execute(self.STATISTICS_QUERY, (today,))
+        
+        stats = {
+            'total_guests': 0,
+            'gender_distribution': {},
+            'active_bookings': 0,
+            'today_revenue': 0,
+            'top_birth_places': {},
+        }
+        
+        for name, key, value in cursor.fetchall():
+            if name == 'total_guests':
+                stats['total_guests'] = int(value)
+            elif name == 'gender':
+                if value > 0:
+                    stats['gender_distribution'][key or None] = int(value)
+            elif name == 'active_bookings':
+                stats['active_bookings'] = int(value)
+            elif name == 'revenue':
+                stats['today_revenue'] = value
+            elif name == 'birth_place':
+                stats['top_birth_places'][key] = int(value)
+        
+        return stats
+    
+    def _create_indexes(self, cursor):
+        """فهارس الحجوزات المستخدمة في استعلامات الإيرادات وسجل النزيل"""
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bookings_guest
+            ON bookings (guest_id, check_in)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bookings_status_check_in
+            ON bookings (status, check_in)
+        ''')
+        # فهرس تعبيري لاستعلامات اليوم الواحد التي تقارن DATE(check_in) مباشرة
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bookings_check_in_day
+            ON bookings (DATE(check_in))
+        ''')
+    
+    def _create_report_indexes(self, cursor):
+        """فهارس نطاقات التاريخ المستخدمة في التقارير الشهرية"""
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_guests_registration_date
+            ON guests (registration_date)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bookings_check_in
+            ON bookings (check_in)
+        ''')
+    
+    def _add_guest_row_version(self, cursor):
+        """رقم إصدار لكل نزيل يزداد مع كل تعديل (تحكم تفاؤلي في التزامن)"""
+        cursor.execute(
+            "ALTER TABLE guests ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0"
+        )
+    
+    def _add_guest_soft_delete(self, cursor):
+        """الحذف المؤقت للنزلاء: عمود deleted_at بدلاً من حذف الصف فوراً
+        
+        النزيل المحذوف يختفي من البحث والعدادات ويبقى صفه حتى تحذفه مهمة
+        الصيانة بعد مدة الاحتفاظ. تُفصل كذلك الحجوزات التي تشير إلى نزلاء
+        حُذفوا قبل تفعيل المفاتيح الأجنبية.
+        """
+        cursor.execute("ALTER TABLE guests ADD COLUMN deleted_at TIMESTAMP")
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_guests_deleted_at
+            ON guests(deleted_at) WHERE deleted_at IS NOT NULL
+        ''')
+        
+        bump = self._BUMP_COUNTER.format
+        triggers = {
+            # الحذف النهائي لنزيل محذوف مؤقتاً لا يغير العدادات مرة ثانية
+            'guests_stats_ad': (
+                "AFTER DELETE ON guests WHEN old.deleted_at IS NULL",
+                self._guest_counters('old', '-1')
+            ),
+            'guests_stats_au': (
+                "AFTER UPDATE OF gender, birth_place ON guests "
+                "WHEN old.deleted_at IS NULL AND new.deleted_at IS NULL",
+                bump(name="'gender'", key="COALESCE(old.gender, '')", delta='-1')
+                + bump(name="'birth_place'", key="old.birth_place", delta='-1')
+                + bump(name="'gender'", key="COALESCE(new.gender, '')", delta='1')
+                + bump(name="'birth_place'", key="new.birth_place", delta='1')
+            ),
+            'guests_stats_soft_delete': (
+                "AFTER UPDATE OF deleted_at ON guests "
+                "WHEN old.deleted_at IS NULL AND new.deleted_at IS NOT NULL",
+                self._guest_counters('old', '-1')
+            ),
+            'guests_stats_undelete': (
+                "AFTER UPDATE OF deleted_at ON guests "
+                "WHEN old.deleted_at IS NOT NULL AND new.deleted_at IS NULL",
+                self._guest_counters('new', '1')
+            ),
+        }
+        for name, (event, body) in triggers.items():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"CREATE TRIGGER {name} {event} BEGIN {body} END")
+        
+        cursor.execute('''
+            UPDATE bookings SET guest_id = NULL
+            WHERE guest_id IS NOT NULL AND guest_id NOT IN (SELECT id FROM guests)
+        ''')
+    
+    def _drop_check_in_day_index(self, cursor):
+        """حذف الفهرس التعبيري DATE(check_in): لا يستخدمه أي استعلام
+        (نطاقات التاريخ تقارن check_in مباشرة) ويكلف كتابة مع كل حجز"""
+        cursor.execute('DROP INDEX IF EXISTS idx_bookings_check_in_day')
+    
+    def _fix_booking_overlap_triggers(self, cursor):
+        """إعادة إنشاء مشغلي منع الحجز المزدوج دون الاعتماد على new.id عند الإدراج
+        
+        قيمة new.rowid غير معرفة في BEFORE INSERT، وإن كانت NULL تصبح
+        المقارنة b.id != new.id مجهولة ويتعطل الشرط بصمت. الحجز الجديد ليس
+        في الفهرس بعد فلا حاجة لاستثنائه؛ عند التعديل يُستثنى الحجز نفسه بـ IS NOT.
+        """
+        first_night, last_night = self._span_bounds()
+        
+        def conflict(exclude_self):
+            return f'''
+                SELECT RAISE(ABORT, 'bed_conflict')
+                WHERE new.status != '{self.BOOKING_CANCELLED}' AND EXISTS (
+                    SELECT 1 FROM bookings_span s JOIN bookings b ON b.id = s.id
+                    WHERE s.first_night <= {last_night.format('new')}
+                      AND s.last_night >= {first_night.format('new')}
+                      {'AND b.id IS NOT new.id' if exclude_self else ''}
+                      AND b.room_number = new.room_number
+                      AND b.bed_number = new.bed_number
+                );
+            '''
+        
+        cursor.execute('DROP TRIGGER IF EXISTS bookings_no_overlap_bi')
+        cursor.execute('DROP TRIGGER IF EXISTS bookings_no_overlap_bu')
+        cursor.execute(f'''
+            CREATE TRIGGER bookings_no_overlap_bi BEFORE INSERT ON bookings BEGIN
+                {conflict(exclude_self=False)}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER bookings_no_overlap_bu
+            BEFORE UPDATE OF room_number, bed_number, check_in, check_out, status ON bookings BEGIN
+                {conflict(exclude_self=True)}
+            END
+        ''')
+    
+    # نهاية مفتوحة للإقامات دون تاريخ خروج (أكبر قيمة في rtree_i32)
+    OPEN_END_DAY = 2**31 - 1
+    
+    # رقم اليوم (julianday صحيح) لتاريخ أو طابع زمني
+    _DAY = "CAST(julianday(DATE({})) AS INTEGER)"
+    
+    def _span_bounds(self) -> Tuple[str, str]:
+        """تعبيرا أول ليلة وآخر ليلة لحجز ({0} اسم الصف: new أو old أو الجدول)"""
+        first_night = self._DAY.format('{0}.check_in')
+        last_night = (
+            f"CASE WHEN {{0}}.check_out IS NULL THEN {self.OPEN_END_DAY} "
+            f"ELSE MAX({first_night}, {self._DAY.format('{0}.check_out')} - 1) END"
+        )
+        return first_night, last_night
+    
+    def _create_booking_index(self, cursor):
+        """فهرس مجالات الإقامة (R*Tree) وحماية الأسرة من الحجز المزدوج
+        
+        كل حجز غير ملغى يُمثَّل بالمجال [أول ليلة، آخر ليلة] بأرقام الأيام،
+        فيصبح سؤال "ما الحجوزات المتقاطعة مع الفترة" بحثاً في الفهرس
+        مهما طال سجل الإقامات. يوم الخروج نفسه ليس ليلة محجوزة.
+        """
+        first_night, last_night = self._span_bounds()
+        
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS bookings_span
+            USING rtree_i32(id, first_night, last_night)
+        ''')
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO bookings_span (id, first_night, last_night)
+            SELECT id, {first_night.format('bookings')}, {last_night.format('bookings')}
+            FROM bookings WHERE status != '{self.BOOKING_CANCELLED}'
+        ''')
+        
+        # مزامنة الفهرس مع جدول الحجوزات
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS bookings_span_ai AFTER INSERT ON bookings
+            WHEN new.status != '{self.BOOKING_CANCELLED}' BEGIN
+                INSERT INTO bookings_span (id, first_night, last_night)
+                VALUES (new.id, {first_night.format('new')}, {last_night.format('new')});
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS bookings_span_ad AFTER DELETE ON bookings BEGIN
+                DELETE FROM bookings_span WHERE id = old.id;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS bookings_span_au AFTER UPDATE ON bookings BEGIN
+                DELETE FROM bookings_span WHERE id = old.id;
+                INSERT INTO bookings_span (id, first_night, last_night)
+                SELECT new.id, {first_night.format('new')}, {last_night.format('new')}
+                WHERE new.status != '{self.BOOKING_CANCELLED}';
+            END
+        ''')
+        
+        # رفض أي حجز يتقاطع مع حجز آخر على نفس السرير، مهما كان مصدر الكتابة
+        conflict = f'''
+            SELECT RAISE(ABORT, 'bed_conflict')
+            WHERE new.status != '{self.BOOKING_CANCELLED}' AND EXISTS (
+                SELECT 1 FROM bookings_span s JOIN bookings b ON b.id = s.id
+                WHERE s.first_night <= {last_night.format('new')}
+                  AND s.last_night >= {first_night.format('new')}
+                  AND b.id != new.id
+                  AND b.room_number = new.room_number
+                  AND b.bed_number = new.bed_number
+            );
+        '''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS bookings_no_overlap_bi BEFORE INSERT ON bookings BEGIN
+                {conflict}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS bookings_no_overlap_bu
+            BEFORE UPDATE OF room_number, bed_number, check_in, check_out, status ON bookings BEGIN
+                {conflict}
+            END
+        ''')
+    
+    @staticmethod
+    def _date_range(start: date, end: date) -> Tuple[str, str]:
+        """حدود نطاق تاريخ [start, end) كنصوص قابلة للمقارنة مع check_in
+        
+        المقارنة النصية تعمل مع 'YYYY-MM-DD' و'YYYY-MM-DD HH:MM:SS' معاً،
+        فلا حاجة لتغليف العمود بـ DATE() الذي يمنع استخدام الفهرس.
+        """
+        return start.isoformat(), end.isoformat()
+    
+    REVENUE_QUERY = '''
+        SELECT SUM(total_price) FROM bookings
+        WHERE status = 'نشط' AND check_in >= ? AND check_in < ?
+    '''
+    
+    def get_revenue(self, start: date, end: date) -> float:
+        """إيرادات الحجوزات النشطة التي بدأت في النطاق [start, end)"""
+        row = self.execute(self.REVENUE_QUERY, self._date_range(start, end)).fetchone()
+        return row[0] or 0
+    
+    def get_card_data(self, guest_ids: List[int]) -> List[Dict]:
+        """بيانات بطاقات النزلاء مع آخر إقامة غير ملغاة لكل نزيل (بنفس الترتيب)"""
+        guests = {}
+        for i in range(0, len(guest_ids), 500):
+            chunk = guest_ids[i:i + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            cursor = self.execute(f'''
+                SELECT g.id, g.first_name, g.last_name, g.national_id, g.photo_path,
+                       b.check_in, b.check_out
+                FROM guests g
+                LEFT JOIN bookings b ON b.id = (
+                    SELECT id FROM bookings
+                    WHERE guest_id = g.id AND status != ?
+                    ORDER BY check_in DESC LIMIT 1
+                )
+                WHERE g.id IN ({placeholders})
+            ''', [self.BOOKING_CANCELLED, *chunk])
+            guests.update((row['id'], dict(row)) for row in cursor.fetchall())
+        return [guests[guest_id] for guest_id in guest_ids if guest_id in guests]
+    
+    def hot_queries(self) -> Dict[str, Tuple[str, tuple]]:
+        """الاستعلامات المتكررة التي يجب ألا تمسح جدولاً كاملاً
+        
+        تُبنى بنفس الثوابت والدوال التي تنفذها العمليات الفعلية، فأي تغيير
+        في استعلام يظهر في الفحص.
+        """
+        today = date.today()
+        tomorrow = today + timedelta(days=1)
+        retention = (f'-{self.TOMBSTONE_RETENTION_DAYS} days',)
+        detach, delete = self._purge_queries(self.EXPIRED_TOMBSTONES)
+        queries = {
+            'search_guests': self._search_page_query('محمد', 'name', None, 100),
+            'search_guests_next_page': self._search_page_query('محمد', 'name', (0,), 100),
+            'search_guests_previous_page': self._search_page_query('محمد', 'name', None, 100, (1000,)),
+            'browse_guests_page': self._search_page_query('', 'name', (0,), 100),
+            'browse_guests_previous_page': self._search_page_query('', 'name', None, 100, (1000,)),
+            'get_guest': (self.GUEST_BY_ID_QUERY, (1,)),
+            'national_id_lookup': (self.GUEST_BY_NATIONAL_ID_QUERY, ('0',)),
+            'purge_detach_bookings': (detach, retention),
+            'purge_deleted_guests': (delete, retention),
+            'get_revenue': (self.REVENUE_QUERY, self._date_range(today, tomorrow)),
+            'free_beds': self._overlap_query(today, tomorrow),
+            'statistics_snapshot': (self.STATISTICS_QUERY, (today.isoformat(),)),
+        }
+        return {name: (query, tuple(params)) for name, (query, params) in queries.items()}
+    
+    def check_query_plans(self) -> List[Tuple[str, str]]:
+        """فحص خطط تنفيذ الاستعلامات المتكررة عبر EXPLAIN QUERY PLAN
+        
+        تُرجع قائمة (اسم الاستعلام، تفاصيل الخطوة) لكل خطوة تمسح جدولاً كاملاً.
+        القائمة الفارغة تعني أن جميع الاستعلامات تستخدم الفهارس.
+        """
+        full_scans = []
+        for name, (query, params) in self.hot_queries().items():
+            for row in self.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall():
+                detail = row['detail']
+                # مسح جدول افتراضي أو نتيجة استعلام فرعي محدود ليس مسحاً لجدول
+                if (detail.startswith('SCAN ') and 'VIRTUAL TABLE' not in detail
+                        and not detail.startswith('SCAN (subquery')):
+                    full_scans.append((name, detail))
+        return full_scans
+    
+    GUEST_BY_ID_QUERY = "SELECT * FROM guests WHERE id = ?"
+    
+    def get_guest(self, guest_id: int) -> Optional[Dict]:
+        """الحصول على بيانات نزيل واحد"""
+        row = self.execute(self.GUEST_BY_ID_QUERY, (guest_id,)).fetchone()
+        return dict(row) if row else None
+    
+    # الحقول القابلة للتعديل من نافذة التعديل
+    EDITABLE_GUEST_FIELDS = (
+        'first_name', 'last_name', 'birth_date', 'birth_place', 'national_id',
+        'father_name', 'mother_name', 'address', 'gender', 'phone_numbers',
+        'photo_path', 'notes',
+    )
+    
+    def update_guest(self, guest_id: int, changes: Dict, row_version: int) -> int:
+        """تعديل الأعمدة المتغيرة فقط من بيانات نزيل
+        
+        row_version هو رقم الإصدار الذي قُرئت عنده البيانات؛ إذا عُدِّل النزيل
+        منذ ذلك الحين (من جهاز آخر مثلاً) يُرفع ConcurrentModificationError
+        بدلاً من الكتابة فوق التعديل الآخر، وإذا كان رقم البطاقة الجديد لنزيل
+        آخر يُرفع DuplicateNationalIdError. تُرجع رقم الإصدار الجديد.
+        
+        التحديث يقتصر على الأعمدة التي تغيرت فعلاً، فلا تعمل مشغلات فهرس
+        البحث والعدادات إلا إذا مسّ التعديل أعمدتها.
+        """
+        unknown = set(changes) - set(self.EDITABLE_GUEST_FIELDS)
+        if unknown:
+            raise ValueError(f"حقول غير قابلة للتعديل: {', '.join(sorted(unknown))}")
+        
+        changes = dict(changes)
+        if isinstance(changes.get('phone_numbers'), list):
+            changes['phone_numbers'] = json.dumps(changes['phone_numbers'])
+        
+        with self.transaction() as conn:
+            row = conn.execute(self.GUEST_BY_ID_QUERY, (guest_id,)).fetchone()
+            if row is None or row['deleted_at'] is not None:
+                raise ConcurrentModificationError("النزيل لم يعد موجوداً")
+            if row['row_version'] != row_version:
+                raise ConcurrentModificationError(
+                    "عُدِّلت بيانات هذا النزيل من جهاز آخر، يرجى مراجعة القيم الحالية",
+                    current=self._rows_to_guests([row])[0]
+                )
+            
+            changed = {key: value for key, value in changes.items() if row[key] != value}
+            if not changed:
+                return row_version
+            
+            if 'national_id' in changed:
+                self._purge_guests(conn, "national_id = ?", (changed['national_id'],))
+            assignments = ', '.join(f"{column} = ?" for column in changed)
+            try:
+                conn.execute(
+                    f"UPDATE guests SET {assignments}, row_version = row_version + 1 "
+                    f"WHERE id = ? AND row_version = ?",
+                    [*changed.values(), guest_id, row_version]
+                )
+            except sqlite3.IntegrityError as e:
+                if 'guests.national_id' in str(e):
+                    raise DuplicateNationalIdError(
+                        f"رقم البطاقة {changed['national_id']} مسجل مسبقاً لنزيل آخر"
+                    ) from e
+                raise
+        
+        self.changes.publish('guests', action='updated', guest_id=guest_id, columns=list(changed))
+        return row_version + 1
+    
+    def delete_guest(self, guest_id: int) -> int:
+        """حذف نزيل حذفاً مؤقتاً مع تحرير أسرّته
+        
+        الحجوزات التي لم تبدأ تُلغى، والإقامة الجارية تُغلق اليوم، والإقامات
+        المنتهية تبقى في السجل. يحذف صف النزيل وصورته نهائياً في مهمة الصيانة
+        بعد TOMBSTONE_RETENTION_DAYS. تُرجع عدد الحجوزات المعدلة.
+        """
+        today = date.today().isoformat()
+        with self.transaction() as conn:
+            deleted = conn.execute(
+                "UPDATE guests SET deleted_at = CURRENT_TIMESTAMP, row_version = row_version + 1 "
+                "WHERE id = ? AND deleted_at IS NULL",
+                (guest_id,)
+            ).rowcount
+            if not deleted:
+                return 0
+            
+            active = "guest_id = ? AND status != ? AND (check_out IS NULL OR DATE(check_out) > ?)"
+            booking_ids = [
+                row[0] for row in conn.execute(
+                    f"SELECT id FROM bookings WHERE {active}",
+                    (guest_id, self.BOOKING_CANCELLED, today)
+                )
+            ]
+            conn.execute(
+                f"UPDATE bookings SET status = ? WHERE {active} AND DATE(check_in) >= ?",
+                (self.BOOKING_CANCELLED, guest_id, self.BOOKING_CANCELLED, today, today)
+            )
+            conn.execute(
+                f"UPDATE bookings SET check_out = ? WHERE {active}",
+                (today, guest_id, self.BOOKING_CANCELLED, today)
+            )
+        
+        self.changes.publish('guests', action='deleted', guest_id=guest_id)
+        if booking_ids:
+            self.changes.publish(
+                'bookings', action='guest_deleted', guest_id=guest_id, booking_ids=booking_ids
+            )
+        return len(booking_ids)
+    
+    # مدة بقاء النزلاء المحذوفين قبل حذفهم نهائياً (بالأيام)
+    TOMBSTONE_RETENTION_DAYS = 30
+    
+    # شرط النزلاء المحذوفين منذ أكثر من مدة (المعامل: '-N days')
+    EXPIRED_TOMBSTONES = "deleted_at < DATETIME('now', ?)"
+    
+    def _purge_guests(self, conn, where: str, params=()) -> int:
+        """حذف نزلاء محذوفين مؤقتاً نهائياً (داخل معاملة قائمة)
+        
+        حجوزاتهم تبقى في السجل دون ربط بنزيل، فلا تتغير الإيرادات السابقة.
+        """
+        detach, delete = self._purge_queries(where)
+        conn.execute(detach, params)
+        return conn.execute(delete, params).rowcount
+    
+    @staticmethod
+    def _purge_queries(where: str) -> Tuple[str, str]:
+        """عبارتا فصل الحجوزات وحذف النزلاء المحذوفين المطابقين لـ where"""
+        condition = f"deleted_at IS NOT NULL AND {where}"
+        return (
+            f"UPDATE bookings SET guest_id = NULL "
+            f"WHERE guest_id IN (SELECT id FROM guests WHERE {condition})",
+            f"DELETE FROM guests WHERE {condition}",
+        )
+    
+    def purge_deleted_guests(self, older_than_days: Optional[int] = None) -> int:
+        """الحذف النهائي للنزلاء المحذوفين منذ أكثر من older_than_days يوماً"""
+        if older_than_days is None:
+            older_than_days = self.TOMBSTONE_RETENTION_DAYS
+        with self.transaction() as conn:
+            purged = self._purge_guests(
+                conn, self.EXPIRED_TOMBSTONES, (f'-{older_than_days} days',)
+            )
+        if purged:
+            self.changes.publish('guests', action='purged', count=purged)
+        return purged
+    
+    # عدد الصفحات المحررة في كل معاملة أثناء الضغط التدريجي
+    VACUUM_STEP_PAGES = 2000
+    
+    def needs_vacuum_conversion(self) -> bool:
+        """هل القاعدة أُنشئت قبل تفعيل auto_vacuum التدريجي؟"""
+        return self.execute('PRAGMA auto_vacuum').fetchone()[0] != 2
+    
+    def convert_auto_vacuum(self) -> bool:
+        """تحويل قاعدة قديمة إلى auto_vacuum التدريجي (مرة واحدة)
+        
+        يتطلب VACUUM كاملاً يحجز الكتابة طوال إعادة بناء الملف، لذا لا
+        يُستدعى من المهام المجدولة بل من سطر الأوامر. تُرجع True إذا حُوِّلت.
+        """
+        if not self.needs_vacuum_conversion():
+            return False
+        conn = self.connection
+        # تغيير نمط auto_vacuum لا يسري على قاعدة موجودة إلا بعد VACUUM
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        return True
+    
+    def maintenance(self, photo_store=None) -> Dict[str, int]:
+        """صيانة دورية: حذف النزلاء المنتهية مدة احتفاظهم، الصور اليتيمة،
+        وإعادة المساحة الحرة إلى نظام الملفات ثم PRAGMA optimize
+        
+        الضغط تدريجي (incremental_vacuum) على دفعات قصيرة فلا يحجب الكتابة.
+        قاعدة قديمة أُنشئت دون auto_vacuum لا تُضغط هنا، بل تُحوَّل مرة واحدة
+        عبر convert_auto_vacuum (--maintenance) لأن ذلك يتطلب VACUUM كاملاً.
+        """
+        result = {'purged': self.purge_deleted_guests()}
+        
+        photo_store = photo_store or PhotoStore()
+        referenced = [
+            row[0] for row in self.execute(
+                "SELECT DISTINCT photo_path FROM guests WHERE photo_path IS NOT NULL AND photo_path != ''"
+            )
+        ]
+        photos = photo_store.remove_orphans(referenced)
+        result['photos_removed'] = photos['removed']
+        result['photo_bytes'] = photos['bytes']
+        
+        conn = self.connection
+        result['freed_pages'] = 0
+        if self.needs_vacuum_conversion():
+            print("الضغط التدريجي غير مفعل لهذه القاعدة؛ شغّل البرنامج بـ --maintenance لتفعيله")
+        else:
+            result['freed_pages'] = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            # كل دفعة معاملة مستقلة قصيرة؛ executescript ينفذ الأمر حتى نهايته
+            # (execute يحرر صفحة واحدة فقط لكل خطوة)
+            for _ in range(0, result['freed_pages'], self.VACUUM_STEP_PAGES):
+                conn.executescript(f'PRAGMA incremental_vacuum({self.VACUUM_STEP_PAGES})')
+        
+        conn.execute('PRAGMA optimize')
+        # تقليص ملف WAL بعد نقل الصفحات
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        return result
+    
+    def count_guests(self) -> int:
+        """عدد النزلاء المسجلين (من جدول العدادات دون مسح جدول النزلاء)"""
+        row = self.execute(
+            "SELECT value FROM stats_counters WHERE name = 'total_guests' AND key = ''"
+        ).fetchone()
+        return int(row[0]) if row else 0
+    
+    def get_settings(self, keys: List[str]) -> Dict[str, str]:
+        """قراءة مجموعة من الإعدادات دفعة واحدة"""
+        placeholders = ', '.join('?' for _ in keys)
+        cursor = self.execute(
+            f"SELECT key, value FROM settings WHERE key IN ({placeholders})",
+            keys
+        )
+        return dict(cursor.fetchall())
+    
+    def save_settings(self, settings: Dict[str, str]):
+        """حفظ مجموعة من الإعدادات في معاملة واحدة"""
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                list(settings.items())
+            )
+        
+        self.changes.publish('settings', keys=list(settings))
+    
+    # ===== الحجوزات وإشغال الأسرة =====
+    
+    BOOKING_ACTIVE = 'نشط'
+    BOOKING_CANCELLED = 'ملغى'
+    
+    GUEST_BY_NATIONAL_ID_QUERY = "SELECT * FROM guests WHERE national_id = ? AND deleted_at IS NULL"
+    
+    def get_guest_by_national_id(self, national_id: str) -> Optional[Dict]:
+        """البحث عن نزيل برقم بطاقة التعريف"""
+        row = self.execute(self.GUEST_BY_NATIONAL_ID_QUERY, (national_id.strip(),)).fetchone()
+        return dict(row) if row else None
+    
+    def get_beds(self) -> List[Tuple[str, str]]:
+        """قائمة الأسرة (الغرفة، السرير) حسب إعدادَي عدد الغرف وعدد الأسرة
+        
+        تُوزع الأسرة على الغرف بالتساوي، والباقي على الغرف الأولى.
+        """
+        settings = self.get_settings(['room_count', 'bed_count'])
+        room_count = max(int(settings.get('room_count') or 1), 1)
+        bed_count = max(int(settings.get('bed_count') or 0), 0)
+        
+        beds = []
+        per_room, extra = divmod(bed_count, room_count)
+        for room in range(1, room_count + 1):
+            for bed in range(1, per_room + (1 if room <= extra else 0) + 1):
+                beds.append((str(room), str(bed)))
+        return beds
+    
+    def _overlapping_bookings(self, start: date, end: date):
+        """الحجوزات غير الملغاة التي تشغل ليلة واحدة على الأقل من [start, end)"""
+        return self.execute(*self._overlap_query(start, end)).fetchall()
+    
+    def _overlap_query(self, start: date, end: date) -> Tuple[str, tuple]:
+        """استعلام الحجوزات المتقاطعة مع [start, end) ومعاملاته"""
+        return f'''
+            SELECT b.id, b.guest_id, b.room_number, b.bed_number, b.check_in, b.check_out,
+                   s.first_night, s.last_night,
+                   g.first_name, g.last_name
+            FROM bookings_span s
+            JOIN bookings b ON b.id = s.id
+            LEFT JOIN guests g ON g.id = b.guest_id
+            WHERE s.first_night <= {self._DAY.format('?')} - 1
+              AND s.last_night >= {self._DAY.format('?')}
+        ''', (end.isoformat(), start.isoformat())
+    
+    def free_beds(self, start: date, end: date) -> List[Tuple[str, str]]:
+        """الأسرة الشاغرة طوال الفترة [start, end)"""
+        occupied = {
+            (row['room_number'], row['bed_number'])
+            for row in self._overlapping_bookings(start, end)
+        }
+        return [bed for bed in self.get_beds() if bed not in occupied]
+    
+    def booking_price(self, start: date, end: date,
+                      price_per_person: Optional[float] = None) -> Tuple[float, float]:
+        """سعر الليلة والمبلغ الإجمالي بعد خصم الأيام المجانية"""
+        settings = self.get_settings(['default_price', 'free_days'])
+        if price_per_person is None:
+            price_per_person = float(settings.get('default_price') or 0)
+        free_days = int(settings.get('free_days') or 0)
+        nights = max((end - start).days, 1)
+        return price_per_person, max(nights - free_days, 0) * price_per_person
+    
+    def book_bed(self, guest_id: int, room_number: str, bed_number: str,
+                 check_in: date, check_out: date, price_per_person: Optional[float] = None,
+                 payment_method: Optional[str] = None, notes: Optional[str] = None) -> int:
+        """حجز سرير للفترة [check_in, check_out)
+        
+        التحقق من التقاطع يتم داخل قاعدة البيانات (مشغل bookings_no_overlap)
+        في نفس معاملة الكتابة، فلا يمكن لتسجيلي دخول متزامنين حجز نفس السرير.
+        """
+        if check_out <= check_in:
+            raise ValueError("تاريخ الخروج يجب أن يكون بعد تاريخ الدخول")
+        
+        price_per_person, total_price = self.booking_price(check_in, check_out, price_per_person)
+        try:
+            with self.transaction() as conn:
+                booking_id = conn.execute('''
+                    INSERT INTO bookings (guest_id, room_number, bed_number, check_in, check_out,
+                                          price_per_person, total_price, status, payment_method, notes)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    guest_id, str(room_number), str(bed_number),
+                    check_in.isoformat(), check_out.isoformat(),
+                    price_per_person, total_price, self.BOOKING_ACTIVE, payment_method, notes
+                )).lastrowid
+        except sqlite3.IntegrityError as e:
+            if 'bed_conflict' in str(e):
+                raise BookingConflictError(
+                    f"السرير {bed_number} في الغرفة {room_number} محجوز خلال هذه الفترة"
+                ) from e
+            raise
+        
+        self.changes.publish('bookings', action='added', booking_id=booking_id)
+        return booking_id
+    
+    def cancel_booking(self, booking_id: int):
+        """إلغاء حجز (يُحرر السرير ويبقى الحجز في السجل)"""
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE bookings SET status = ? WHERE id = ?",
+                (self.BOOKING_CANCELLED, booking_id)
+            )
+        
+        self.changes.publish('bookings', action='cancelled', booking_id=booking_id)
+    
+    def get_occupancy(self, start: date, days: int) -> Dict[Tuple[str, str], List[Optional[Dict]]]:
+        """شبكة الإشغال: لكل سرير قائمة بطول days (الحجز الذي يشغل الليلة أو None)"""
+        end = start + timedelta(days=days)
+        grid = {bed: [None] * days for bed in self.get_beds()}
+        first_day = self.execute(f"SELECT {self._DAY.format('?')}", (start.isoformat(),)).fetchone()[0]
+        
+        for row in self._overlapping_bookings(start, end):
+            cells = grid.get((row['room_number'], row['bed_number']))
+            if cells is None:
+                # سرير خارج الإعدادات الحالية (بعد تقليل عدد الأسرة)
+                continue
+            booking = dict(row)
+            for offset in range(max(row['first_night'] - first_day, 0),
+                                min(row['last_night'] - first_day + 1, days)):
+                cells[offset] = booking
+        return grid
+
+class BookingAnalytics:
+    """تحليلات الإشغال والإيرادات على نسخة عمودية (NumPy) من جدول الحجوزات
+    
+    تُحمَّل الحجوزات مرة واحدة، ثم يُجلب فقط ما أضيف أو تغير بعدها
+    (حسب إشعارات 'bookings')، وكل المؤشرات عمليات متجهة بدون حلقات.
+    """
+    
+    # الفرق بين رقم اليوم (julianday) وdate.toordinal() وبداية حقبة يونكس
+    _ORDINAL_OFFSET = 1721424
+    _EPOCH_DAY = 2440587
+    
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._lock = threading.Lock()
+        self._columns = None
+        self._dirty_ids = set()
+        self._full_reload = True
+        
+        db_manager.changes.subscribe('bookings', self.on_bookings_changed)
+        db_manager.changes.subscribe('database', self.on_database_replaced)
+    
+    def on_bookings_changed(self, event):
+        """تسجيل الحجوزات المتغيرة لجلبها في التحديث التالي"""
+        booking_ids = list(event.get('booking_ids', []))
+        if 'booking_id' in event:
+            booking_ids.append(event['booking_id'])
+        with self._lock:
+            if event.get('full_reload') or not booking_ids:
+                self._full_reload = True
+            else:
+                self._dirty_ids.update(booking_ids)
+    
+    def on_database_replaced(self, event):
+        with self._lock:
+            self._full_reload = True
+    
+    def _query(self, where: str, params=()):
+        """جلب أعمدة الحجوزات كمصفوفات"""
+        import numpy as np
+        
+        db = self.db_manager
+        rows = db.execute(f'''
+            SELECT id,
+                   {db._DAY.format('check_in')},
+                   COALESCE({db._DAY.format('check_out')} - 1, {db.OPEN_END_DAY}),
+                   check_out IS NULL,
+                   price_per_person,
+                   COALESCE(total_price, 0),
+                   status != '{db.BOOKING_CANCELLED}'
+            FROM bookings {where} ORDER BY id
+        ''', params).fetchall()
+        
+        data = np.array([tuple(row) for row in rows], dtype=float).reshape(-1, 7)
+        first = data[:, 1].astype(np.int64)
+        return {
+            'id': data[:, 0].astype(np.int64),
+            'first_night': first,
+            # يوم الخروج نفسه ليس ليلة؛ إقامة اليوم الواحد تُحسب ليلة
+            'last_night': np.maximum(data[:, 2].astype(np.int64), first),
+            'open': data[:, 3].astype(bool),
+            'price_per_person': data[:, 4],
+            'total_price': data[:, 5],
+            'active': data[:, 6].astype(bool),
+        }
+    
+    def refresh(self):
+        """تحديث النسخة العمودية (كاملة عند أول استخدام أو بعد الاستعادة)"""
+        import numpy as np
+        
+        with self._lock:
+            full_reload, self._full_reload = self._full_reload or self._columns is None, False
+            dirty, self._dirty_ids = self._dirty_ids, set()
+        
+        if full_reload:
+            self._columns = self._query('')
+            return self._columns
+        
+        columns = self._columns
+        last_id = int(columns['id'][-1]) if len(columns['id']) else 0
+        
+        # الحجوزات المعدلة (إلغاء...) تُستبدل في مكانها
+        existing = sorted(i for i in dirty if i <= last_id)
+        if existing:
+            placeholders = ', '.join('?' for _ in existing)
+            changed = self._query(f"WHERE id IN ({placeholders})", existing)
+            if not np.isin(existing, columns['id']).all():
+                # حجز لم يُحمَّل من قبل (كتابة من اتصال آخر): إعادة تحميل كاملة
+                self._columns = self._query('')
+                return self._columns
+            positions = np.searchsorted(columns['id'], changed['id'])
+            for name, values in changed.items():
+                columns[name][positions] = values
+            # الحجوزات المحذوفة لم تعد تُحتسب
+            gone = np.setdiff1d(existing, changed['id'])
+            columns['active'][np.searchsorted(columns['id'], gone)] = False
+        
+        added = self._query("WHERE id > ?", (last_id,))
+        if len(added['id']):
+            columns = {name: np.concatenate([columns[name], added[name]]) for name in columns}
+        
+        self._columns = columns
+        return columns
+    
+    def summary(self, start: date, end: date) -> Dict:
+        """مؤشرات الفترة [start, end)
         
-        stats = {}
+        الإشغال اليومي يُحسب بمصفوفة فروق (بداية +1، نهاية -1) ثم مجموع
+        تراكمي، والإيرادات ومدة الإقامة للحجوزات التي بدأت في الفترة.
+        """
+        import numpy as np
         
-        # عدد النزلاء
-        cursor.execute('SELECT COUNT(*) FROM guests')
-        stats['total_guests'] = cursor.fetchone()[0]
+        columns = self.refresh()
+        bed_count = max(len(self.db_manager.get_beds()), 1)
+        first_day = start.toordinal() + self._ORDINAL_OFFSET
+        day_count = (end - start).days
+        today = date.today().toordinal() + self._ORDINAL_OFFSET
         
-        # عدد النزلاء حسب الجنس
-        cursor.execute('SELECT gender, COUNT(*) FROM guests GROUP BY gender')
-        stats['gender_distribution'] = dict(cursor.fetchall())
+        active = columns['active']
+        first = columns['first_night'][active]
+        # الإقامات المفتوحة تُحتسب حتى الليلة الحالية
+        last = np.where(columns['open'][active],
+                        np.maximum(first, today), columns['last_night'][active])
         
-        # عدد الحجوزات النشطة
-        cursor.execute("SELECT COUNT(*) FROM bookings WHERE status = 'نشط'")
-        stats['active_bookings'] = cursor.fetchone()[0]
+        # الإشغال اليومي
+        lo = np.maximum(first, first_day) - first_day
+        hi = np.minimum(last, first_day + day_count - 1) - first_day
+        overlap = lo <= hi
+        delta = np.zeros(day_count + 1, dtype=np.int64)
+        np.add.at(delta, lo[overlap], 1)
+        np.add.at(delta, hi[overlap] + 1, -1)
+        occupied = np.cumsum(delta[:-1])
         
-        # إيرادات اليوم
-        today = date.today().isoformat()
-        cursor.execute('''
-            SELECT SUM(total_price) FROM bookings 
-            WHERE DATE(check_in) = ? AND status = 'نشط'
-        ''', (today,))
-        stats['today_revenue'] = cursor.fetchone()[0] or 0
+        # الحجوزات التي بدأت في الفترة
+        started = (first >= first_day) & (first < first_day + day_count)
+        nights = (last - first + 1)[started]
+        price = columns['price_per_person'][active][started]
+        revenue = columns['total_price'][active][started]
+        months = (
+            (first[started] - self._EPOCH_DAY).astype('datetime64[D]')
+            .astype('datetime64[M]').astype(np.int64) % 12
+        )
+        # الفرق بين السعر الكامل والمبلغ المدفوع = خصم الأيام المجانية
+        discount = np.maximum(price * nights - revenue, 0)
         
-        # توزيع النزلاء حسب مكان الميلاد (أعلى 10)
-        cursor.execute('''
-            SELECT birth_place, COUNT(*) as count 
-            FROM guests 
-            GROUP BY birth_place 
-            ORDER BY count DESC 
-            LIMIT 10
-        ''')
-        stats['top_birth_places'] = dict(cursor.fetchall())
+        total_nights = int(nights.sum())
+        total_revenue = float(revenue.sum())
+        return {
+            'start': start,
+            'bed_count': bed_count,
+            'daily_occupied': occupied,
+            'daily_occupancy': occupied / bed_count,
+            'occupancy_rate': float(occupied.mean() / bed_count) if day_count else 0.0,
+            'bookings': int(started.sum()),
+            'average_stay': float(nights.mean()) if len(nights) else 0.0,
+            'revenue': total_revenue,
+            'revenue_per_night': total_revenue / total_nights if total_nights else 0.0,
+            'monthly_revenue': np.bincount(months, weights=revenue, minlength=12),
+            'monthly_nights': np.bincount(months, weights=nights, minlength=12),
+            'free_days_discount': float(discount.sum()),
+            'free_nights': float(np.divide(discount, price, out=np.zeros_like(discount),
+                                           where=price > 0).sum()),
+        }
+    
+    def year_summary(self, year: int) -> Dict:
+        """مؤشرات سنة كاملة"""
+        return self.summary(date(year, 1, 1), date(year + 1, 1, 1))
+
+class ChartRenderer:
+    """رسم المخططات البيانية بـ matplotlib (Agg) إلى صور PNG مخزنة
+    
+    اسم كل صورة يتضمن بصمة بياناتها، فلا يُعاد الرسم إلا عند تغير
+    العدادات، وتُستعمل نفس الصور في تبويب الإحصائيات وتقرير PDF.
+    """
+    
+    CHART_SIZE = (5, 3.2)
+    CHART_DPI = 100
+    
+    def __init__(self, charts_dir=None):
+        self.charts_dir = Path(charts_dir) if charts_dir else CHARTS_DIR
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def data_stamp(data) -> str:
+        """بصمة البيانات التي يُرسم منها المخطط"""
+        digest = hashlib.sha1()
+        for value in data:
+            if hasattr(value, 'tobytes'):
+                digest.update(value.round(4).tobytes())
+            else:
+                digest.update(json.dumps(value, ensure_ascii=False, sort_keys=True,
+                                         default=str).encode('utf-8'))
+        return digest.hexdigest()[:16]
+    
+    def render(self, name: str, data: tuple, draw) -> Path:
+        """صورة المخطط name لبيانات data (تُرسم بـ draw(ax, *data) عند الحاجة فقط)"""
+        chart_path = self.charts_dir / f"{name}_{self.data_stamp(data)}.png"
+        if chart_path.exists():
+            return chart_path
         
-        conn.close()
-        return stats
+        # Figure مباشرة بدل pyplot: آمن خارج خيط الواجهة ولا يحتاج Tk
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        
+        with self._lock:
+            figure = Figure(figsize=self.CHART_SIZE, dpi=self.CHART_DPI)
+            FigureCanvasAgg(figure)
+            draw(figure.add_subplot(), *data)
+            figure.tight_layout()
+            
+            temp_path = chart_path.with_suffix('.tmp')
+            figure.savefig(temp_path, format='png')
+            os.replace(temp_path, chart_path)
+            
+            # حذف الصور القديمة لنفس المخطط
+            for old_path in self.charts_dir.glob(f"{name}_*.png"):
+                if old_path != chart_path:
+                    old_path.unlink(missing_ok=True)
+        return chart_path
+    
+    def render_all(self, stats: Dict, summary: Dict) -> Dict[str, Path]:
+        """مخططات لوحة الإحصائيات: الجنس، أماكن الميلاد، الإشغال اليومي"""
+        gender = {
+            key or 'غير محدد': value
+            for key, value in stats.get('gender_distribution', {}).items()
+        }
+        places = stats.get('top_birth_places', {})
+        return {
+            'gender': self.render('gender', (gender,), self._draw_gender),
+            'birth_places': self.render('birth_places', (places,), self._draw_birth_places),
+            'occupancy': self.render(
+                'occupancy',
+                (summary['start'].isoformat(), summary['daily_occupancy']),
+                self._draw_occupancy
+            ),
+        }
+    
+    @staticmethod
+    def _draw_gender(ax, gender):
+        ax.set_title(ArabicText.reshape("توزيع النزلاء حسب الجنس"))
+        if not gender:
+            ax.axis('off')
+            return
+        ax.pie(
+            list(gender.values()),
+            labels=[ArabicText.reshape(label) for label in gender],
+            autopct='%1.0f%%',
+            colors=['#2d5b8a', '#c0506e', '#999999'][:len(gender)]
+        )
+    
+    @staticmethod
+    def _draw_birth_places(ax, places):
+        ax.set_title(ArabicText.reshape("أكثر أماكن الميلاد"))
+        labels = [ArabicText.reshape(place) for place in places]
+        ax.barh(labels[::-1], list(places.values())[::-1], color='#2d8a2d')
+    
+    @staticmethod
+    def _draw_occupancy(ax, start, daily_occupancy):
+        first_day = date.fromisoformat(start)
+        ax.set_title(ArabicText.reshape(f"نسبة الإشغال اليومية {first_day.year}"))
+        ax.plot(range(len(daily_occupancy)), daily_occupancy * 100, color='#2d5b8a', linewidth=1)
+        ax.set_ylim(0, max(100, float(daily_occupancy.max()) * 100 if len(daily_occupancy) else 100))
+        ax.set_xlim(0, max(len(daily_occupancy) - 1, 1))
+        ax.set_ylabel('%')
+        # علامة في بداية كل شهر
+        ticks = [(date(first_day.year, month, 1) - first_day).days for month in range(1, 13)]
+        ax.set_xticks([tick for tick in ticks if tick < len(daily_occupancy)])
+        ax.set_xticklabels([str(month) for month, tick in enumerate(ticks, 1)
+                            if tick < len(daily_occupancy)])
+
 
 class GuestRegistrationFrame(ctk.CTkFrame):
     """إطار تسجيل النزلاء"""
     
+    # حقول بيانات النزيل (تستخدمها أيضاً نافذة التعديل)
+    FIELD_DEFINITIONS = [
+        ("first_name", "الاسم", "text"),
+        ("last_name", "اللقب", "text"),
+        ("birth_date", "تاريخ الميلاد", "date"),
+        ("birth_place", "مكان الميلاد", "text"),
+        ("national_id", "رقم بطاقة التعريف الوطني", "text"),
+        ("father_name", "اسم الأب", "text"),
+        ("mother_name", "اسم الأم", "text"),
+        ("address", "العنوان", "text"),
+        ("gender", "الجنس", "combo", ["ذكر", "أنثى"])
+    ]
+    
     def __init__(self, master, db_manager):
         super().__init__(master)
         self.db_manager = db_manager
         self.current_photo_path = None
         self.phone_numbers = []
+        self.tasks = BackgroundTasks(self)
+        self.photo_store = PhotoStore()
         
         self.setup_ui()
     
@@ -251,19 +3176,8 @@ class GuestRegistrationFrame(ctk.CTkFrame):
         
         # إنشاء حقول الإدخال
         self.fields = {}
-        field_definitions = [
-            ("first_name", "الاسم", "text"),
-            ("last_name", "اللقب", "text"),
-            ("birth_date", "تاريخ الميلاد", "date"),
-            ("birth_place", "مكان الميلاد", "text"),
-            ("national_id", "رقم بطاقة التعريف الوطني", "text"),
-            ("father_name", "اسم الأب", "text"),
-            ("mother_name", "اسم الأم", "text"),
-            ("address", "العنوان", "text"),
-            ("gender", "الجنس", "combo", ["ذكر", "أنثى"])
-        ]
         
-        for i, field_def in enumerate(field_definitions):
+        for i, field_def in enumerate(self.FIELD_DEFINITIONS):
             row = i // 2
             col = i % 2
             
@@ -311,7 +3225,7 @@ class GuestRegistrationFrame(ctk.CTkFrame):
         self.photo_label.pack(side="left", padx=5)
         
         # زر الحفظ
-        save_btn = ctk.CTkButton(
+        self.save_btn = ctk.CTkButton(
             form_frame,
             text="حفظ بيانات النزيل",
             command=self.save_guest,
@@ -320,7 +3234,20 @@ class GuestRegistrationFrame(ctk.CTkFrame):
             height=40,
             font=("Arial", 14, "bold")
         )
-        save_btn.grid(row=7, column=0, columnspan=2, pady=20)
+        self.save_btn.grid(row=7, column=0, pady=20)
+        
+        # استيراد مجموعة (رحلات مدرسية، فرق رياضية...)
+        self.import_btn = ctk.CTkButton(
+            form_frame,
+            text="استيراد مجموعة من ملف",
+            command=self.import_guests,
+            fg_color="#2d5b8a",
+            height=40
+        )
+        self.import_btn.grid(row=7, column=1, pady=20)
+        
+        self.import_progress = ctk.CTkProgressBar(form_frame)
+        self.import_progress.set(0)
     
     def create_text_field(self, parent, field_def, row, col):
         """إنشاء حقل نصي"""
@@ -397,37 +3324,104 @@ class GuestRegistrationFrame(ctk.CTkFrame):
                     raise ValueError(f"حقل {field} مطلوب")
             
             # إضافة أرقام الهواتف
-            guest_data['phone_numbers'] = self.phone_numbers
-            
-            # حفظ الصورة إذا كانت موجودة
-            if self.current_photo_path:
-                # نسخ الصورة إلى مجلد الصور
-                ext = os.path.splitext(self.current_photo_path)[1]
-                new_filename = f"{guest_data['national_id']}{ext}"
-                dest_path = GUESTS_IMG_DIR / new_filename
-                shutil.copy(self.current_photo_path, dest_path)
-                guest_data['photo_path'] = str(dest_path)
-            
-            # إضافة النزيل إلى قاعدة البيانات
-            guest_id = self.db_manager.add_guest(guest_data)
-            
-            # عرض رسالة نجاح
-            message = f"تم تسجيل النزيل بنجاح! رقم التسجيل: {guest_id}"
-            ctk.CTkMessagebox(
-                title="نجاح",
-                message=ArabicText.reshape(message),
-                icon="check"
-            )
-            
-            # مسح الحقول
-            self.clear_fields()
+            guest_data['phone_numbers'] = list(self.phone_numbers)
             
         except Exception as e:
-            ctk.CTkMessagebox(
-                title="خطأ",
-                message=ArabicText.reshape(f"حدث خطأ: {str(e)}"),
-                icon="cancel"
+            self._on_save_error(e)
+            return
+        
+        # ضغط الصورة وحفظ النزيل في خيط عامل
+        self.save_btn.configure(state="disabled")
+        self.tasks.submit(
+            self._store_guest, guest_data, self.current_photo_path,
+            on_done=self._on_save_done,
+            on_error=self._on_save_error
+        )
+    
+    def _store_guest(self, guest_data, photo_source):
+        """(خيط عامل) حفظ الصورة في المخزن ثم إضافة النزيل"""
+        if photo_source:
+            guest_data['photo_path'] = str(self.photo_store.store(photo_source))
+        return self.db_manager.add_guest(guest_data)
+    
+    def _on_save_done(self, guest_id):
+        """عرض رسالة نجاح ومسح الحقول"""
+        self.save_btn.configure(state="normal")
+        message = f"تم تسجيل النزيل بنجاح! رقم التسجيل: {guest_id}"
+        ctk.CTkMessagebox(
+            title="نجاح",
+            message=ArabicText.reshape(message),
+            icon="check"
+        )
+        
+        # مسح الحقول
+        self.clear_fields()
+    
+    def _on_save_error(self, error):
+        """عرض خطأ الحفظ"""
+        self.save_btn.configure(state="normal")
+        ctk.CTkMessagebox(
+            title="خطأ",
+            message=ArabicText.reshape(f"حدث خطأ: {str(error)}"),
+            icon="cancel"
+        )
+    
+    def import_guests(self):
+        """استيراد مجموعة نزلاء من ملف CSV أو Excel في الخلفية"""
+        from tkinter import filedialog
+        file_path = filedialog.askopenfilename(
+            title="اختر ملف النزلاء",
+            filetypes=[("CSV / Excel", "*.csv *.xlsx"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        
+        def run_import(progress):
+            import_file = GuestImportFile(file_path)
+            return self.db_manager.import_guests(
+                import_file, total=import_file.count_rows(), progress=progress
             )
+        
+        self.import_btn.configure(state="disabled")
+        self.import_progress.set(0)
+        self.import_progress.grid(row=8, column=0, columnspan=2, sticky="ew", padx=5)
+        self.tasks.submit(
+            run_import,
+            on_done=self._on_import_done,
+            on_error=self._on_import_error,
+            on_progress=self.import_progress.set
+        )
+    
+    def _on_import_done(self, result):
+        """عرض نتيجة الاستيراد وحفظ تقرير الصفوف المرفوضة"""
+        self.import_btn.configure(state="normal")
+        self.import_progress.grid_forget()
+        
+        message = f"تم استيراد {result['imported']} نزيل"
+        if result['errors']:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            report_path = EXPORTS_DIR / f"أخطاء_الاستيراد_{timestamp}.csv"
+            with open(report_path, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f)
+                writer.writerow(['السطر', 'رقم البطاقة', 'السبب'])
+                writer.writerows(result['errors'])
+            message += f"\nصفوف مرفوضة: {len(result['errors'])} (التفاصيل في {report_path.name})"
+        
+        ctk.CTkMessagebox(
+            title="نجاح",
+            message=ArabicText.reshape(message),
+            icon="check"
+        )
+    
+    def _on_import_error(self, error):
+        """عرض خطأ الاستيراد"""
+        self.import_btn.configure(state="normal")
+        self.import_progress.grid_forget()
+        ctk.CTkMessagebox(
+            title="خطأ",
+            message=ArabicText.reshape(f"خطأ في الاستيراد: {str(error)}"),
+            icon="cancel"
+        )
     
     def clear_fields(self):
         """مسح جميع الحقول"""
@@ -445,12 +3439,34 @@ class GuestRegistrationFrame(ctk.CTkFrame):
 class StatisticsFrame(ctk.CTkFrame):
     """إطار عرض الإحصائيات"""
     
+    # تجميع إشعارات التغيير المتقاربة في تحديث واحد (ميلي ثانية)
+    REFRESH_DELAY = 100
+    # فترة التحديث في الوضع المباشر (ميلي ثانية)
+    LIVE_INTERVAL = 1000
+    
     def __init__(self, master, db_manager):
         super().__init__(master)
         self.db_manager = db_manager
+        self.tasks = BackgroundTasks(self)
+        self.analytics = BookingAnalytics(db_manager)
+        self.charts = ChartRenderer()
+        
+        # صور المخططات الحالية وصورها المحملة (تُعاد استعمالها ما لم تتغير)
+        self._chart_paths: Dict[str, Path] = {}
+        self._chart_images = {}
+        
+        # بطاقات الإحصائيات تُنشأ مرة واحدة: المفتاح -> [تسمية القيمة، النص المعروض]
+        self._stat_tiles = {}
+        self._refresh_after_id = None
+        self._live_after_id = None
         
         self.setup_ui()
         self.refresh_statistics()
+        self.refresh_analytics()
+        
+        # تحديث البطاقات فور تغير النزلاء أو الحجوزات
+        self.db_manager.changes.subscribe('guests', self.on_data_changed)
+        self.db_manager.changes.subscribe('bookings', self.on_data_changed)
     
     def setup_ui(self):
         """إعداد واجهة الإحصائيات"""
@@ -466,18 +3482,32 @@ class StatisticsFrame(ctk.CTkFrame):
         self.stats_frame = ctk.CTkFrame(self)
         self.stats_frame.pack(fill="both", expand=True, padx=20, pady=10)
         
+        # مؤشرات الإشغال والإيرادات للسنة الجارية
+        self.analytics_label = ctk.CTkLabel(self, text="", font=("Arial", 13))
+        self.analytics_label.pack(fill="x", padx=20)
+        
+        # المخططات البيانية
+        charts_frame = ctk.CTkFrame(self)
+        charts_frame.pack(fill="x", padx=20, pady=10)
+        self.chart_labels = {}
+        for i, name in enumerate(['gender', 'birth_places', 'occupancy']):
+            label = ctk.CTkLabel(charts_frame, text="")
+            label.grid(row=0, column=i, padx=5, pady=5)
+            charts_frame.columnconfigure(i, weight=1)
+            self.chart_labels[name] = label
+        
         # أزرار التصدير
         export_frame = ctk.CTkFrame(self)
         export_frame.pack(fill="x", padx=20, pady=10)
         
-        export_pdf_btn = ctk.CTkButton(
+        self.export_pdf_btn = ctk.CTkButton(
             export_frame,
             text="تصدير تقرير PDF",
             command=self.export_pdf,
             fg_color="#2d5b8a",
             width=150
         )
-        export_pdf_btn.pack(side="left", padx=10)
+        self.export_pdf_btn.pack(side="left", padx=10)
         
         export_excel_btn = ctk.CTkButton(
             export_frame,
@@ -496,22 +3526,154 @@ class StatisticsFrame(ctk.CTkFrame):
         )
         refresh_btn.pack(side="left", padx=10)
         
+        # الوضع المباشر: قراءة العدادات دورياً (تغييرات من أجهزة أخرى)
+        self.live_switch = ctk.CTkSwitch(
+            export_frame,
+            text=ArabicText.reshape("تحديث مباشر"),
+            command=self.toggle_live_refresh
+        )
+        self.live_switch.pack(side="left", padx=10)
+        
         # زر النسخ الاحتياطي
-        backup_btn = ctk.CTkButton(
+        self.backup_btn = ctk.CTkButton(
             export_frame,
             text="إنشاء نسخة احتياطية",
             command=self.create_backup,
             fg_color="#8a2d2d",
             width=150
         )
-        backup_btn.pack(side="left", padx=10)
+        self.backup_btn.pack(side="left", padx=10)
+        
+        # تصدير الجداول كاملة
+        data_export_frame = ctk.CTkFrame(self)
+        data_export_frame.pack(fill="x", padx=20, pady=(0, 10))
+        
+        self.export_format_combo = ctk.CTkComboBox(
+            data_export_frame,
+            values=["CSV", "Excel"],
+            width=100
+        )
+        self.export_format_combo.set("CSV")
+        self.export_format_combo.pack(side="left", padx=10)
+        
+        self.export_guests_btn = ctk.CTkButton(
+            data_export_frame,
+            text="تصدير جميع النزلاء",
+            command=lambda: self.export_table('guests'),
+            width=150
+        )
+        self.export_guests_btn.pack(side="left", padx=10)
+        
+        self.export_bookings_btn = ctk.CTkButton(
+            data_export_frame,
+            text="تصدير جميع الحجوزات",
+            command=lambda: self.export_table('bookings'),
+            width=150
+        )
+        self.export_bookings_btn.pack(side="left", padx=10)
+        
+        self.cancel_export_btn = ctk.CTkButton(
+            data_export_frame,
+            text="إلغاء التصدير",
+            command=self.cancel_export,
+            fg_color="gray",
+            state="disabled",
+            width=120
+        )
+        self.cancel_export_btn.pack(side="left", padx=10)
+        self._export_cancel = None
+        
+        # شريط تقدم المهام الخلفية (يظهر أثناء التنفيذ فقط)
+        self.progress_bar = ctk.CTkProgressBar(self)
+        self.progress_bar.set(0)
     
-    def refresh_statistics(self):
-        """تحديث عرض الإحصائيات"""
-        # مسح المحتوى القديم
-        for widget in self.stats_frame.winfo_children():
-            widget.destroy()
+    def show_progress(self, value):
+        """إظهار شريط التقدم وتحديث قيمته"""
+        if not self.progress_bar.winfo_ismapped():
+            self.progress_bar.pack(fill="x", padx=20, pady=(0, 10))
+        self.progress_bar.set(value)
+    
+    def hide_progress(self):
+        """إخفاء شريط التقدم"""
+        self.progress_bar.set(0)
+        self.progress_bar.pack_forget()
+    
+    def on_data_changed(self, event):
+        """إشعار تغيير في النزلاء أو الحجوزات (تُجمع الإشعارات المتتالية)"""
+        if self._refresh_after_id is None:
+            self._refresh_after_id = self.after(self.REFRESH_DELAY, self._refresh_changed)
+    
+    def _refresh_changed(self):
+        self._refresh_after_id = None
+        self.refresh_statistics()
+        self.refresh_analytics()
+    
+    def toggle_live_refresh(self):
+        """تشغيل/إيقاف التحديث المباشر للبطاقات"""
+        if self.live_switch.get():
+            if self._live_after_id is None:
+                self._live_tick()
+        elif self._live_after_id is not None:
+            self.after_cancel(self._live_after_id)
+            self._live_after_id = None
+    
+    def _live_tick(self):
+        """تحديث دوري رخيص: قراءة العدادات وتعديل القيم المتغيرة فقط"""
+        self.refresh_statistics()
+        self._live_after_id = self.after(self.LIVE_INTERVAL, self._live_tick)
+    
+    def refresh_analytics(self):
+        """حساب مؤشرات السنة الجارية ومخططاتها في الخلفية"""
+        self.tasks.submit(
+            self._build_dashboard, date.today().year, set(self._chart_images),
+            on_done=self.show_analytics,
+            on_error=lambda error: print(f"خطأ في حساب التحليلات: {error}")
+        )
+    
+    def _build_dashboard(self, year, loaded):
+        """(خيط عامل) المؤشرات وصور المخططات؛ لا يُرسم إلا ما تغيرت بياناته"""
+        from PIL import Image
+        
+        summary = self.analytics.year_summary(year)
+        chart_paths = self.charts.render_all(self.db_manager.get_statistics(), summary)
+        
+        images = {}
+        for name, path in chart_paths.items():
+            if path not in loaded:
+                with Image.open(path) as image:
+                    images[path] = image.copy()
+        return summary, chart_paths, images
+    
+    def show_analytics(self, result):
+        """عرض مؤشرات السنة ومخططاتها"""
+        summary, chart_paths, images = result
         
+        for path, image in images.items():
+            self._chart_images[path] = ctk.CTkImage(light_image=image, size=image.size)
+        for name, path in chart_paths.items():
+            if self._chart_paths.get(name) != path:
+                self.chart_labels[name].configure(image=self._chart_images[path])
+        # الصور غير المعروضة لم تعد لازمة
+        self._chart_images = {path: self._chart_images[path] for path in chart_paths.values()}
+        self._chart_paths = chart_paths
+        
+        months = ["جانفي", "فيفري", "مارس", "أفريل", "ماي", "جوان",
+                  "جويلية", "أوت", "سبتمبر", "أكتوبر", "نوفمبر", "ديسمبر"]
+        busiest = int(summary['monthly_nights'].argmax())
+        text = (
+            f"نسبة الإشغال: {summary['occupancy_rate']:.0%}"
+            f" | متوسط الإقامة: {summary['average_stay']:.1f} ليلة"
+            f" | الإيراد لكل ليلة: {summary['revenue_per_night']:,.2f} د.ج"
+            f" | خصم الأيام المجانية: {summary['free_days_discount']:,.2f} د.ج"
+        )
+        if summary['bookings']:
+            text += f" | أكثر الأشهر إشغالاً: {months[busiest]}"
+        text = ArabicText.reshape(text)
+        if self.analytics_label.cget("text") != text:
+            self.analytics_label.configure(text=text)
+    
+    def refresh_statistics(self):
+        """تحديث قيم البطاقات (تُنشأ البطاقات مرة واحدة ثم تُعدَّل قيمها فقط)"""
         # الحصول على الإحصائيات من قاعدة البيانات
         stats = self.db_manager.get_statistics()
         
@@ -524,14 +3686,26 @@ class StatisticsFrame(ctk.CTkFrame):
             ("إناث", stats.get('gender_distribution', {}).get('أنثى', 0))
         ]
         
-        for i, (label, value) in enumerate(stat_items):
+        if not self._stat_tiles:
+            self._create_stat_tiles([label for label, _ in stat_items])
+        
+        for label, value in stat_items:
+            tile = self._stat_tiles[label]
+            text = str(value)
+            if tile[1] != text:
+                tile[0].configure(text=ArabicText.reshape(text))
+                tile[1] = text
+    
+    def _create_stat_tiles(self, labels):
+        """إنشاء بطاقات الإحصائيات الثابتة"""
+        for i, label in enumerate(labels):
             stat_frame = ctk.CTkFrame(self.stats_frame, width=200, height=100)
             stat_frame.grid(row=i//3, column=i%3, padx=10, pady=10, sticky="nsew")
             
             # تسمية القيمة
             value_label = ctk.CTkLabel(
                 stat_frame,
-                text=str(value),
+                text="",
                 font=("Arial", 28, "bold"),
                 text_color="#2d5b8a"
             )
@@ -543,75 +3717,50 @@ class StatisticsFrame(ctk.CTkFrame):
                 label,
                 font=("Arial", 14)
             ).pack()
+            
+            self._stat_tiles[label] = [value_label, None]
         
         # إعداد توزيع الأعمدة
         for i in range(3):
             self.stats_frame.columnconfigure(i, weight=1)
     
     def export_pdf(self):
-        """تصدير تقرير PDF"""
-        try:
-            from reportlab.lib.pagesizes import A4
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.units import cm
-            from reportlab.pdfbase import pdfmetrics
-            from reportlab.pdfbase.ttfonts import TTFont
-            
-            # تسجيل خط عربي (يجب توفير ملف الخط)
-            try:
-                pdfmetrics.registerFont(TTFont('Arabic', 'arial.ttf'))
-            except:
-                pass
-            
-            # إنشاء ملف PDF
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            pdf_path = EXPORTS_DIR / f"تقرير_بيت_الشباب_{timestamp}.pdf"
-            
-            c = canvas.Canvas(str(pdf_path), pagesize=A4)
-            width, height = A4
-            
-            # العنوان
-            c.setFont("Helvetica-Bold", 16)
-            c.drawString(2*cm, height-2*cm, "تقرير بيت الشباب كريم جلول")
-            
-            # التاريخ
-            c.setFont("Helvetica", 10)
-            c.drawString(width-6*cm, height-2*cm, 
-                        datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            
-            # الحصول على الإحصائيات
-            stats = self.db_manager.get_statistics()
-            
-            # كتابة الإحصائيات
-            y_position = height - 4*cm
-            c.setFont("Helvetica-Bold", 12)
-            
-            stat_lines = [
-                f"إجمالي النزلاء: {stats.get('total_guests', 0)}",
-                f"الحجوزات النشطة: {stats.get('active_bookings', 0)}",
-                f"إيرادات اليوم: {stats.get('today_revenue', 0):,.2f} د.ج",
-                f"عدد الذكور: {stats.get('gender_distribution', {}).get('ذكر', 0)}",
-                f"عدد الإناث: {stats.get('gender_distribution', {}).get('أنثى', 0)}"
-            ]
-            
-            for line in stat_lines:
-                c.drawString(2*cm, y_position, line)
-                y_position -= 0.7*cm
-            
-            c.save()
-            
-            ctk.CTkMessagebox(
-                title="نجاح",
-                message=ArabicText.reshape(f"تم تصدير PDF إلى: {pdf_path.name}"),
-                icon="check"
-            )
-            
-        except Exception as e:
-            ctk.CTkMessagebox(
-                title="خطأ",
-                message=ArabicText.reshape(f"خطأ في تصدير PDF: {str(e)}"),
-                icon="cancel"
-            )
+        """تصدير تقرير PDF للشهر الجاري في الخلفية"""
+        today = date.today()
+        start = today.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        pdf_path = EXPORTS_DIR / f"تقرير_بيت_الشباب_{timestamp}.pdf"
+        
+        self.export_pdf_btn.configure(state="disabled")
+        self.show_progress(0)
+        self.tasks.submit(
+            ReportEngine(self.db_manager, self._chart_paths).generate, start, end, pdf_path,
+            on_done=self._on_pdf_done,
+            on_error=self._on_pdf_error,
+            on_progress=self.show_progress
+        )
+    
+    def _on_pdf_done(self, pdf_path):
+        """إنهاء تصدير التقرير بنجاح"""
+        self.export_pdf_btn.configure(state="normal")
+        self.hide_progress()
+        ctk.CTkMessagebox(
+            title="نجاح",
+            message=ArabicText.reshape(f"تم تصدير PDF إلى: {pdf_path.name}"),
+            icon="check"
+        )
+    
+    def _on_pdf_error(self, error):
+        """عرض خطأ تصدير التقرير"""
+        self.export_pdf_btn.configure(state="normal")
+        self.hide_progress()
+        ctk.CTkMessagebox(
+            title="خطأ",
+            message=ArabicText.reshape(f"خطأ في تصدير PDF: {str(error)}"),
+            icon="cancel"
+        )
     
     def export_excel(self):
         """تصدير إحصاءات إلى Excel"""
@@ -666,36 +3815,137 @@ class StatisticsFrame(ctk.CTkFrame):
                 icon="cancel"
             )
     
+    def export_table(self, table):
+        """تصدير جدول كامل في الخلفية مع إمكانية الإلغاء"""
+        extension = 'xlsx' if self.export_format_combo.get() == "Excel" else 'csv'
+        names = {'guests': 'النزلاء', 'bookings': 'الحجوزات'}
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        export_path = EXPORTS_DIR / f"{names[table]}_{timestamp}.{extension}"
+        
+        self._export_cancel = threading.Event()
+        self._set_export_running(True)
+        self.show_progress(0)
+        self.tasks.submit(
+            self.db_manager.export_table, table, export_path,
+            cancel=self._export_cancel,
+            on_done=self._on_export_done,
+            on_error=self._on_export_error,
+            on_progress=self.show_progress
+        )
+    
+    def cancel_export(self):
+        """طلب إيقاف التصدير الجاري"""
+        if self._export_cancel is not None:
+            self._export_cancel.set()
+    
+    def _set_export_running(self, running):
+        """تفعيل/تعطيل أزرار التصدير أثناء التنفيذ"""
+        state = "disabled" if running else "normal"
+        self.export_guests_btn.configure(state=state)
+        self.export_bookings_btn.configure(state=state)
+        self.cancel_export_btn.configure(state="normal" if running else "disabled")
+    
+    def _on_export_done(self, export_path):
+        """إنهاء التصدير بنجاح"""
+        self._set_export_running(False)
+        self.hide_progress()
+        ctk.CTkMessagebox(
+            title="نجاح",
+            message=ArabicText.reshape(f"تم التصدير إلى: {export_path.name}"),
+            icon="check"
+        )
+    
+    def _on_export_error(self, error):
+        """عرض خطأ التصدير (أو تأكيد الإلغاء)"""
+        self._set_export_running(False)
+        self.hide_progress()
+        if isinstance(error, OperationCancelled):
+            ctk.CTkMessagebox.show_info("معلومة", "تم إلغاء التصدير")
+            return
+        ctk.CTkMessagebox(
+            title="خطأ",
+            message=ArabicText.reshape(f"خطأ في التصدير: {str(error)}"),
+            icon="cancel"
+        )
+    
     def create_backup(self):
-        """إنشاء نسخة احتياطية"""
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = BACKUP_DIR / f"backup_{timestamp}.db"
-            
-            # نسخ قاعدة البيانات
-            shutil.copy(self.db_manager.db_path, backup_file)
-            
-            ctk.CTkMessagebox(
-                title="نجاح",
-                message=ArabicText.reshape(f"تم إنشاء نسخة احتياطية: {backup_file.name}"),
-                icon="check"
-            )
-            
-        except Exception as e:
-            ctk.CTkMessagebox(
-                title="خطأ",
-                message=ArabicText.reshape(f"خطأ في النسخ الاحتياطي: {str(e)}"),
-                icon="cancel"
-            )
+        """إنشاء نسخة احتياطية في الخلفية"""
+        self.backup_btn.configure(state="disabled")
+        self.show_progress(0)
+        self.tasks.submit(
+            self.db_manager.create_backup,
+            on_done=self._on_backup_done,
+            on_error=self._on_backup_error,
+            on_progress=self.show_progress
+        )
+    
+    def _on_backup_done(self, backup_file):
+        """إنهاء النسخ الاحتياطي بنجاح"""
+        self.backup_btn.configure(state="normal")
+        self.hide_progress()
+        ctk.CTkMessagebox(
+            title="نجاح",
+            message=ArabicText.reshape(f"تم إنشاء نسخة احتياطية: {backup_file.name}"),
+            icon="check"
+        )
+    
+    def _on_backup_error(self, error):
+        """عرض خطأ النسخ الاحتياطي"""
+        self.backup_btn.configure(state="normal")
+        self.hide_progress()
+        ctk.CTkMessagebox(
+            title="خطأ",
+            message=ArabicText.reshape(f"خطأ في النسخ الاحتياطي: {str(error)}"),
+            icon="cancel"
+        )
 
 class SearchFrame(ctk.CTkFrame):
     """إطار البحث عن النزلاء"""
     
+    # مهلة انتظار توقف الكتابة قبل تنفيذ البحث (ميلي ثانية)
+    SEARCH_DELAY = 250
+    # عدد الصفوف التي تُجلب في كل صفحة
+    PAGE_SIZE = 100
+    # أقصى عدد صفحات في الجدول؛ الصفحة الأبعد عن موضع العرض تُحذف وتُعاد عند الرجوع إليها
+    MAX_PAGES = 5
+    # تُجلب الصفحة التالية عندما يتجاوز أسفل العرض هذه النسبة من الصفوف المحملة
+    # (والسابقة عندما يقترب أعلى العرض من البداية بنفس القدر)
+    PREFETCH_THRESHOLD = 0.8
+    # عدد الصفوف المجاورة (قبل وبعد التحديد) التي تُجهز صورها مسبقاً
+    PREFETCH_NEIGHBOURS = 5
+    # حجم الصورة في نافذة التفاصيل
+    DETAILS_PHOTO_SIZE = 360
+    
     def __init__(self, master, db_manager):
         super().__init__(master)
         self.db_manager = db_manager
         
+        # معاينة صور البطاقات: مسار الصورة لكل صف معروض
+        self.thumbnails = ThumbnailCache(self, PhotoStore())
+        self._photo_paths = {}
+        
+        # البحث يعمل في خيط عامل حتى لا تتجمد الواجهة
+        self.tasks = BackgroundTasks(self)
+        self._search_after_id = None
+        self._search_future = None
+        self._search_generation = 0
+        
+        # نافذة الترقيم: آخر بحث، صفوف كل صفحة محملة، مفتاح كل صف،
+        # وهل تشمل النافذة بداية النتائج ونهايتها
+        self._search_args = ('', 'name')
+        self._pages = []
+        self._row_keys = {}
+        self._at_start = True
+        self._at_end = True
+        self._loading_page = False
+        
         self.setup_ui()
+        
+        # عرض قائمة النزلاء كاملة صفحة بصفحة عند فتح التبويب
+        self.search_guests('', 'الاسم')
+        
+        # إعادة تنفيذ البحث الحالي عند إضافة أو حذف نزلاء
+        self.db_manager.changes.subscribe('guests', self.on_guests_changed)
     
     def setup_ui(self):
         """إعداد واجهة البحث"""
@@ -715,21 +3965,24 @@ class SearchFrame(ctk.CTkFrame):
         
         self.search_entry = ctk.CTkEntry(search_frame, width=300)
         self.search_entry.pack(side="left", padx=5)
+        # البحث أثناء الكتابة
+        self.search_entry.bind("<KeyRelease>", lambda event: self.schedule_search())
         
-        search_type_combo = ctk.CTkComboBox(
+        self.search_type_combo = ctk.CTkComboBox(
             search_frame,
             values=["الاسم", "رقم البطاقة"],
+            command=lambda choice: self.schedule_search(),
             width=120
         )
-        search_type_combo.set("الاسم")
-        search_type_combo.pack(side="left", padx=5)
+        self.search_type_combo.set("الاسم")
+        self.search_type_combo.pack(side="left", padx=5)
         
         search_btn = ctk.CTkButton(
             search_frame,
             text="بحث",
             command=lambda: self.search_guests(
                 self.search_entry.get(),
-                search_type_combo.get()
+                self.search_type_combo.get()
             ),
             width=80
         )
@@ -746,16 +3999,25 @@ class SearchFrame(ctk.CTkFrame):
         # إنشاء Treeview مع تمرير الأفقي
         from tkinter import ttk
         
-        tree_scroll = ttk.Scrollbar(self.tree_frame)
-        tree_scroll.pack(side="right", fill="y")
+        self.tree_scroll = ttk.Scrollbar(self.tree_frame)
+        self.tree_scroll.pack(side="right", fill="y")
+        
+        # معاينة صورة بطاقة النزيل المحدد
+        self.preview_label = ctk.CTkLabel(
+            self.tree_frame,
+            text="",
+            width=PhotoStore.THUMB_SIZE,
+            height=PhotoStore.THUMB_SIZE
+        )
+        self.preview_label.pack(side="left", anchor="n", padx=(0, 5))
         
         self.tree = ttk.Treeview(
             self.tree_frame,
-            yscrollcommand=tree_scroll.set,
-            selectmode="browse",
+            yscrollcommand=self._on_tree_scroll,
+            selectmode="extended",
             height=15
         )
-        tree_scroll.config(command=self.tree.yview)
+        self.tree_scroll.config(command=self.tree.yview)
         
         # تعريف الأعمدة
         self.tree['columns'] = ('id', 'name', 'national_id', 'gender', 'birth_date', 'phone')
@@ -778,6 +4040,7 @@ class SearchFrame(ctk.CTkFrame):
         self.tree.heading("phone", text="الهاتف")
         
         self.tree.pack(fill="both", expand=True)
+        self.tree.bind("<<TreeviewSelect>>", lambda event: self.show_preview())
         
         # أزرار الإجراءات
         action_frame = ctk.CTkFrame(results_frame)
@@ -792,62 +4055,309 @@ class SearchFrame(ctk.CTkFrame):
         )
         edit_btn.pack(side="left", padx=5)
         
-        delete_btn = ctk.CTkButton(
-            action_frame,
-            text="حذف المحدد",
-            command=self.delete_selected,
-            fg_color="red",
-            width=120
-        )
-        delete_btn.pack(side="left", padx=5)
+        delete_btn = ctk.CTkButton(
+            action_frame,
+            text="حذف المحدد",
+            command=self.delete_selected,
+            fg_color="red",
+            width=120
+        )
+        delete_btn.pack(side="left", padx=5)
+        
+        view_btn = ctk.CTkButton(
+            action_frame,
+            text="عرض التفاصيل",
+            command=self.view_details,
+            width=120
+        )
+        view_btn.pack(side="left", padx=5)
+        
+        self.print_btn = ctk.CTkButton(
+            action_frame,
+            text="طباعة البطاقة",
+            command=self.print_card,
+            fg_color="#2d5b8a",
+            width=120
+        )
+        self.print_btn.pack(side="left", padx=5)
+    
+    def schedule_search(self):
+        """جدولة البحث بعد توقف الكتابة لفترة قصيرة"""
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(
+            self.SEARCH_DELAY,
+            lambda: self.search_guests(
+                self.search_entry.get(),
+                self.search_type_combo.get()
+            )
+        )
+    
+    def search_guests(self, search_term, search_type):
+        """بحث عن النزلاء في الخلفية (الصفحة الأولى فقط)"""
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+            self._search_after_id = None
+        
+        # البحث في قاعدة البيانات؛ نص فارغ يعرض جميع النزلاء
+        search_by = 'national_id' if search_type == 'رقم البطاقة' else 'name'
+        self._search_args = (search_term.strip(), search_by)
+        self._load_page()
+    
+    def on_guests_changed(self, event):
+        """إشعار تغيير النزلاء: تحديث الصفوف المعروضة في مكانها
+        
+        تُعاد قراءة النافذة الحالية من أول صف فيها بنفس عدد الصفوف، مع
+        الإبقاء على موضع التمرير والتحديد بدلاً من العودة إلى الصفحة الأولى.
+        """
+        if not self._pages:
+            self._load_page()
+            return
+        
+        self._search_generation += 1
+        if self._search_future is not None:
+            self._search_future.cancel()
+        generation = self._search_generation
+        
+        # النافذة تُعاد قراءتها من معرف أول نزيل فيها (شاملاً له)؛ المعرف ثابت
+        # بخلاف ترتيب الصلة في البحث النصي
+        after = None
+        if not self._at_start:
+            first_id = self.tree.item(self._pages[0][0])['values'][0]
+            after = (first_id - 1,)
+        count = max(sum(len(page) for page in self._pages), self.PAGE_SIZE)
+        
+        self._loading_page = True
+        search_term, search_by = self._search_args
+        self._search_future = self.tasks.submit(
+            self.db_manager.search_guests_page,
+            search_term, search_by, after, count,
+            on_done=lambda result: self._on_window_refreshed(generation, count, result),
+            on_error=lambda error: self._on_search_error(generation, error)
+        )
+    
+    def _on_window_refreshed(self, generation, count, result):
+        """استبدال صفوف النافذة بالقيم الحالية مع استعادة التمرير والتحديد"""
+        if generation != self._search_generation:
+            return
+        guests, keys = result
+        self._search_future = None
+        self._loading_page = False
+        if not guests and not self._at_start:
+            # حُذفت كل الصفوف المعروضة: العودة إلى بداية النتائج
+            self._load_page()
+            return
+        
+        selected = {self.tree.item(item)['values'][0] for item in self.tree.selection()}
+        children = self.tree.get_children()
+        top_row = round(self.tree.yview()[0] * len(children)) if children else 0
+        # النزيل الظاهر في أعلى العرض (يبقى في الأعلى حتى لو حُذفت صفوف قبله)
+        top_id = self.tree.item(children[top_row])['values'][0] if top_row < len(children) else None
+        
+        if children:
+            self.tree.delete(*children)
+        self._pages.clear()
+        self._row_keys.clear()
+        self._photo_paths.clear()
+        self._at_end = len(guests) < count
+        
+        for start in range(0, len(guests), self.PAGE_SIZE):
+            page = []
+            for guest, key in zip(guests[start:start + self.PAGE_SIZE], keys[start:start + self.PAGE_SIZE]):
+                item = self._insert_row(guest, "end")
+                self._row_keys[item] = key
+                page.append(item)
+            self._pages.append(page)
+        
+        items = self.tree.get_children()
+        ids = [self.tree.item(item)['values'][0] for item in items]
+        if items:
+            if top_id in ids:
+                top_row = ids.index(top_id)
+            self.tree.yview_moveto(min(top_row, len(items) - 1) / len(items))
+        reselect = [item for item, guest_id in zip(items, ids) if guest_id in selected]
+        self.tree.selection_set(reselect)
+        self.show_preview()
+    
+    def _load_page(self, after=None, before=None):
+        """جلب صفحة من النتائج في خيط عامل
+        
+        دون مفتاح: الصفحة الأولى لبحث جديد. after/before: الصفحة التالية
+        لآخر صف في النافذة أو السابقة لأول صف فيها.
+        """
+        # كل بحث جديد يلغي البحث السابق ويتجاهل نتائجه إن وصلت متأخرة
+        if after is None and before is None:
+            self._search_generation += 1
+            if self._search_future is not None:
+                self._search_future.cancel()
+        generation = self._search_generation
+        
+        self._loading_page = True
+        search_term, search_by = self._search_args
+        self._search_future = self.tasks.submit(
+            self.db_manager.search_guests_page,
+            search_term, search_by, after, self.PAGE_SIZE, before,
+            on_done=lambda result: self._on_page_loaded(generation, after, before, result),
+            on_error=lambda error: self._on_search_error(generation, error)
+        )
+    
+    def _on_page_loaded(self, generation, after, before, result):
+        """استقبال صفحة النتائج في خيط الواجهة"""
+        if generation != self._search_generation:
+            return
+        guests, keys = result
+        self._search_future = None
+        self._loading_page = False
+        complete = len(guests) < self.PAGE_SIZE
+        
+        if before is not None:
+            self._at_start = complete
+            self._insert_page(guests, keys, at_top=True)
+        else:
+            self._at_end = complete
+            if after is None:
+                self.show_results(guests, keys)
+            else:
+                self._insert_page(guests, keys, at_top=False)
+    
+    def _on_search_error(self, generation, error):
+        """تسجيل أخطاء البحث"""
+        if generation == self._search_generation:
+            self._loading_page = False
+        print(f"خطأ في البحث: {error}")
+    
+    def _on_tree_scroll(self, first, last):
+        """تحديث شريط التمرير وجلب الصفحة المجاورة عند الاقتراب من طرف النافذة"""
+        self.tree_scroll.set(first, last)
+        if self._loading_page or not self._pages:
+            return
+        if float(last) >= self.PREFETCH_THRESHOLD and not self._at_end:
+            self._load_page(after=self._row_keys[self._pages[-1][-1]])
+        elif float(first) <= 1 - self.PREFETCH_THRESHOLD and not self._at_start:
+            self._load_page(before=self._row_keys[self._pages[0][0]])
+    
+    def clear_results(self):
+        """مسح جميع النتائج باستدعاء واحد بدلاً من حذف كل صف على حدة"""
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self._pages.clear()
+        self._row_keys.clear()
+        self._photo_paths.clear()
+        self.show_preview()
+    
+    def show_results(self, guests, keys):
+        """عرض الصفحة الأولى من نتائج البحث"""
+        # مسح النتائج السابقة
+        self.clear_results()
+        self._at_start = True
+        self._insert_page(guests, keys, at_top=False)
+        if guests:
+            self.tree.yview_moveto(0)
+    
+    def _insert_page(self, guests, keys, at_top: bool):
+        """إضافة صفحة إلى أحد طرفي النافذة مع حذف الصفحة الأبعد عند تجاوز الحد
+        
+        موضع التمرير يُحفظ بعدد الصفوف فوق أول صف ظاهر، فلا يقفز العرض
+        عند إضافة صفوف في الأعلى أو حذفها.
+        """
+        if not guests:
+            return
+        
+        children = self.tree.get_children()
+        top_row = round(self.tree.yview()[0] * len(children)) if children else 0
+        
+        index = 0 if at_top else "end"
+        items = []
+        for position, (guest, key) in enumerate(zip(guests, keys)):
+            item = self._insert_row(guest, position if at_top else index)
+            self._row_keys[item] = key
+            items.append(item)
+        
+        if at_top:
+            self._pages.insert(0, items)
+            top_row += len(items)
+        else:
+            self._pages.append(items)
+        
+        while len(self._pages) > self.MAX_PAGES:
+            # الصفحة المقابلة للاتجاه الذي يتحرك نحوه المستخدم
+            if at_top:
+                dropped = self._pages.pop()
+                self._at_end = False
+            else:
+                dropped = self._pages.pop(0)
+                self._at_start = False
+                top_row -= len(dropped)
+            self.tree.delete(*dropped)
+            for item in dropped:
+                self._row_keys.pop(item, None)
+                self._photo_paths.pop(item, None)
         
-        view_btn = ctk.CTkButton(
-            action_frame,
-            text="عرض التفاصيل",
-            command=self.view_details,
-            width=120
-        )
-        view_btn.pack(side="left", padx=5)
+        total = len(self.tree.get_children())
+        if children and total:
+            self.tree.yview_moveto(max(top_row, 0) / total)
+    
+    def _forget_rows(self, items):
+        """حذف صفوف من الجدول ومن حالة النافذة"""
+        items = set(items)
+        self.tree.delete(*items)
+        self._pages = [[item for item in page if item not in items] for page in self._pages]
+        self._pages = [page for page in self._pages if page]
+        for item in items:
+            self._row_keys.pop(item, None)
+            self._photo_paths.pop(item, None)
+    
+    def _insert_row(self, guest, index):
+        """إدراج صف نزيل في الجدول"""
+        full_name = f"{guest.get('last_name', '')} {guest.get('first_name', '')}"
+        phone_numbers = guest.get('phone_numbers', [])
+        primary_phone = phone_numbers[0] if phone_numbers else ""
         
-        print_btn = ctk.CTkButton(
-            action_frame,
-            text="طباعة البطاقة",
-            command=self.print_card,
-            fg_color="#2d5b8a",
-            width=120
+        item = self.tree.insert(
+            "", index,
+            values=(
+                guest['id'],
+                full_name,
+                guest.get('national_id', ''),
+                guest.get('gender', ''),
+                guest.get('birth_date', ''),
+                primary_phone
+            )
         )
-        print_btn.pack(side="left", padx=5)
+        if guest.get('photo_path'):
+            self._photo_paths[item] = guest['photo_path']
+        return item
     
-    def search_guests(self, search_term, search_type):
-        """بحث عن النزلاء"""
-        # مسح النتائج السابقة
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+    def show_preview(self):
+        """عرض مصغرة النزيل المحدد وتجهيز مصغرات الصفوف المجاورة"""
+        selection = self.tree.selection()
+        photo_path = self._photo_paths.get(selection[0]) if selection else None
         
-        if not search_term:
+        image = self.thumbnails.get(photo_path) if photo_path else None
+        self.preview_label.configure(
+            image=image,
+            text="" if image or not photo_path else "..."
+        )
+        if not selection:
             return
         
-        # البحث في قاعدة البيانات
-        search_by = 'national_id' if search_type == 'رقم البطاقة' else 'name'
-        guests = self.db_manager.search_guests(search_term, search_by)
+        # المحدد أولاً ثم الجيران الأقرب فالأبعد
+        items = [selection[0]]
+        before = after = selection[0]
+        for _ in range(self.PREFETCH_NEIGHBOURS):
+            before = self.tree.prev(before) if before else ''
+            after = self.tree.next(after) if after else ''
+            items.extend(item for item in (after, before) if item)
         
-        # عرض النتائج
-        for guest in guests:
-            full_name = f"{guest.get('last_name', '')} {guest.get('first_name', '')}"
-            phone_numbers = guest.get('phone_numbers', [])
-            primary_phone = phone_numbers[0] if phone_numbers else ""
-            
-            self.tree.insert(
-                "", "end",
-                values=(
-                    guest['id'],
-                    full_name,
-                    guest.get('national_id', ''),
-                    guest.get('gender', ''),
-                    guest.get('birth_date', ''),
-                    primary_phone
-                )
-            )
+        def on_ready(path, ready_image):
+            current = self.tree.selection()
+            if current and self._photo_paths.get(current[0]) == path:
+                self.preview_label.configure(image=ready_image, text="")
+        
+        self.thumbnails.request(
+            [self._photo_paths.get(item) for item in items], on_ready, requester='preview'
+        )
     
     def edit_selected(self):
         """تعديل النزيل المحدد"""
@@ -859,12 +4369,11 @@ class SearchFrame(ctk.CTkFrame):
         item = self.tree.item(selection[0])
         guest_id = item['values'][0]
         
-        # هنا يمكنك فتح نافذة تعديل
-        # لأجل البساطة، سنعرض رسالة
-        ctk.CTkMessagebox.show_info(
-            "تعديل",
-            f"فتح نافذة تعديل للنزيل رقم {guest_id}"
-        )
+        guest = self.db_manager.get_guest(guest_id)
+        if guest is None:
+            ctk.CTkMessagebox.show_warning("تحذير", "النزيل لم يعد موجوداً")
+            return
+        GuestEditDialog(self, self.db_manager, guest)
     
     def delete_selected(self):
         """حذف النزيل المحدد"""
@@ -879,7 +4388,7 @@ class SearchFrame(ctk.CTkFrame):
         # تأكيد الحذف
         confirm = ctk.CTkMessagebox(
             title="تأكيد الحذف",
-            message="هل أنت متأكد من حذف هذا النزيل؟",
+            message="هل أنت متأكد من حذف هذا النزيل؟ ستُلغى حجوزاته القادمة وتُحرر أسرّته.",
             icon="warning",
             option_1="إلغاء",
             option_2="حذف"
@@ -888,16 +4397,15 @@ class SearchFrame(ctk.CTkFrame):
         if confirm.get() == "حذف":
             # حذف النزيل من قاعدة البيانات
             try:
-                conn = sqlite3.connect(self.db_manager.db_path)
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM guests WHERE id = ?", (guest_id,))
-                conn.commit()
-                conn.close()
+                released = self.db_manager.delete_guest(guest_id)
                 
                 # حذف من العرض
-                self.tree.delete(selection[0])
+                self._forget_rows([selection[0]])
                 
-                ctk.CTkMessagebox.show_info("نجاح", "تم حذف النزيل بنجاح")
+                message = "تم حذف النزيل بنجاح"
+                if released:
+                    message += f" وتحرير {released} من حجوزاته"
+                ctk.CTkMessagebox.show_info("نجاح", message)
                 
             except Exception as e:
                 ctk.CTkMessagebox.showerror("خطأ", f"حدث خطأ أثناء الحذف: {str(e)}")
@@ -913,15 +4421,9 @@ class SearchFrame(ctk.CTkFrame):
         guest_id = item['values'][0]
         
         # الحصول على تفاصيل النزيل من قاعدة البيانات
-        conn = sqlite3.connect(self.db_manager.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM guests WHERE id = ?", (guest_id,))
-        guest = cursor.fetchone()
-        conn.close()
+        guest_dict = self.db_manager.get_guest(guest_id)
         
-        if guest:
-            guest_dict = dict(guest)
+        if guest_dict:
             
             # إنشاء نافذة التفاصيل
             details_window = ctk.CTkToplevel(self)
@@ -949,29 +4451,417 @@ class SearchFrame(ctk.CTkFrame):
             تاريخ التسجيل: {guest_dict.get('registration_date', '')}
             """
             
+            # صورة بطاقة التعريف (تُفك في الخلفية)
+            photo_path = guest_dict.get('photo_path')
+            if photo_path:
+                details_window.geometry("600x900")
+                photo_label = ctk.CTkLabel(details_window, text="...")
+                photo_label.pack(padx=10, pady=(10, 0))
+                
+                def on_photo_ready(path, image):
+                    if photo_label.winfo_exists():
+                        photo_label.configure(image=image, text="")
+                
+                self.thumbnails.request(
+                    [photo_path], on_photo_ready,
+                    size=self.DETAILS_PHOTO_SIZE, requester=details_window
+                )
+            
             text_widget = ctk.CTkTextbox(details_window, width=580, height=400)
             text_widget.pack(padx=10, pady=10)
             text_widget.insert("1.0", ArabicText.reshape(details_text))
             text_widget.configure(state="disabled")
     
     def print_card(self):
-        """طباعة بطاقة النزيل"""
+        """طباعة بطاقات النزلاء المحددين (مجموعة كاملة دفعة واحدة)"""
         selection = self.tree.selection()
         if not selection:
             ctk.CTkMessagebox.show_warning("تحذير", "يرجى اختيار نزيل لطباعة بطاقته")
             return
         
-        ctk.CTkMessagebox.show_info(
-            "طباعة",
-            "جاري تحضير البطاقة للطباعة..."
+        guest_ids = [self.tree.item(item)['values'][0] for item in selection]
+        title = self.db_manager.get_settings(['institution_name']).get('institution_name', '')
+        captions = {
+            'title': ArabicText.reshape(title),
+            'name': ArabicText.reshape("الاسم الكامل"),
+            'national_id': ArabicText.reshape("رقم البطاقة"),
+            'stay': ArabicText.reshape("مدة الإقامة"),
+        }
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        cards_path = EXPORTS_DIR / f"بطاقات_النزلاء_{timestamp}.pdf"
+        
+        def prepare_and_render():
+            # تشكيل النصوص هنا (ذاكرة التشكيل)، والرسم في عملية منفصلة
+            cards = []
+            for guest in self.db_manager.get_card_data(guest_ids):
+                stay = ''
+                if guest['check_in']:
+                    stay = f"{guest['check_in'][:10]} - {(guest['check_out'] or '')[:10]}"
+                cards.append({
+                    'name': ArabicText.reshape(f"{guest['last_name']} {guest['first_name']}"),
+                    'national_id': guest['national_id'],
+                    'stay': stay,
+                    'photo_path': guest['photo_path'],
+                })
+            return card_process_pool().submit(
+                render_guest_cards, cards, captions, cards_path
+            ).result()
+        
+        self.print_btn.configure(state="disabled")
+        self.tasks.submit(
+            prepare_and_render,
+            on_done=self._on_cards_done,
+            on_error=self._on_cards_error
+        )
+    
+    def _on_cards_done(self, cards_path):
+        """فتح ملف البطاقات للطباعة"""
+        self.print_btn.configure(state="normal")
+        if hasattr(os, 'startfile'):
+            os.startfile(cards_path)
+        ctk.CTkMessagebox(
+            title="نجاح",
+            message=ArabicText.reshape(f"تم تحضير البطاقات للطباعة: {Path(cards_path).name}"),
+            icon="check"
+        )
+    
+    def _on_cards_error(self, error):
+        """عرض خطأ تحضير البطاقات"""
+        self.print_btn.configure(state="normal")
+        ctk.CTkMessagebox(
+            title="خطأ",
+            message=ArabicText.reshape(f"خطأ في تحضير البطاقات: {str(error)}"),
+            icon="cancel"
+        )
+
+class GuestEditDialog(ctk.CTkToplevel):
+    """نافذة تعديل بيانات نزيل (تُحفظ الحقول المتغيرة فقط)"""
+    
+    def __init__(self, master, db_manager, guest: Dict):
+        super().__init__(master)
+        self.db_manager = db_manager
+        self.guest_id = guest['id']
+        
+        self.title("تعديل بيانات النزيل")
+        self.geometry("600x560")
+        
+        form_frame = ctk.CTkFrame(self)
+        form_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        self.fields = {}
+        for row, field_def in enumerate(GuestRegistrationFrame.FIELD_DEFINITIONS):
+            field_name, label = field_def[0], field_def[1]
+            ArabicText.create_label(form_frame, label).grid(
+                row=row, column=0, sticky="w", padx=5, pady=4
+            )
+            if field_def[2] == 'combo':
+                widget = ctk.CTkComboBox(form_frame, values=field_def[3], width=300)
+            else:
+                widget = ctk.CTkEntry(form_frame, width=300)
+            widget.grid(row=row, column=1, padx=5, pady=4, sticky="w")
+            self.fields[field_name] = widget
+        
+        row = len(GuestRegistrationFrame.FIELD_DEFINITIONS)
+        ArabicText.create_label(form_frame, "أرقام الهواتف (مفصولة بفاصلة):").grid(
+            row=row, column=0, sticky="w", padx=5, pady=4
+        )
+        self.phone_entry = ctk.CTkEntry(form_frame, width=300)
+        self.phone_entry.grid(row=row, column=1, padx=5, pady=4, sticky="w")
+        
+        self.save_btn = ctk.CTkButton(
+            self,
+            text="حفظ التعديلات",
+            command=self.save,
+            fg_color="green",
+            hover_color="darkgreen",
+            height=36
+        )
+        self.save_btn.pack(pady=10)
+        
+        self.load(guest)
+    
+    def load(self, guest: Dict):
+        """ملء الحقول بالقيم المعروضة وتذكر رقم الإصدار"""
+        self.row_version = guest['row_version']
+        self.original = self._form_values(guest)
+        
+        for field_name, widget in self.fields.items():
+            value = self.original[field_name]
+            if isinstance(widget, ctk.CTkComboBox):
+                widget.set(value)
+            else:
+                widget.delete(0, "end")
+                widget.insert(0, value)
+        self.phone_entry.delete(0, "end")
+        self.phone_entry.insert(0, ', '.join(self.original['phone_numbers']))
+    
+    def _form_values(self, guest: Dict) -> Dict:
+        """قيم النزيل بالصيغة التي تعرضها الحقول"""
+        values = {name: guest.get(name) or '' for name in self.fields}
+        phone_numbers = guest.get('phone_numbers') or []
+        if isinstance(phone_numbers, str):
+            phone_numbers = json.loads(phone_numbers)
+        values['phone_numbers'] = phone_numbers
+        return values
+    
+    def save(self):
+        """حفظ الحقول التي غيرها المستخدم فقط"""
+        current = {name: widget.get().strip() for name, widget in self.fields.items()}
+        current['phone_numbers'] = [
+            phone.strip() for phone in self.phone_entry.get().split(',') if phone.strip()
+        ]
+        
+        changes = {
+            name: (value if value != '' else None)
+            for name, value in current.items()
+            if value != self.original[name]
+        }
+        labels = {field_def[0]: field_def[1] for field_def in GuestRegistrationFrame.FIELD_DEFINITIONS}
+        for field in DatabaseManager.REQUIRED_GUEST_FIELDS:
+            if field in changes and not changes[field]:
+                ctk.CTkMessagebox.show_warning("تحذير", f"حقل {labels.get(field, field)} مطلوب")
+                return
+        if not changes:
+            self.destroy()
+            return
+        
+        try:
+            self.db_manager.update_guest(self.guest_id, changes, self.row_version)
+        except ConcurrentModificationError as e:
+            ctk.CTkMessagebox.show_warning("تحذير", str(e))
+            if e.current is not None:
+                self.load(e.current)
+            return
+        except DuplicateNationalIdError as e:
+            ctk.CTkMessagebox.show_warning("تحذير", str(e))
+            return
+        except Exception as e:
+            ctk.CTkMessagebox.showerror("خطأ", f"حدث خطأ أثناء الحفظ: {str(e)}")
+            return
+        
+        ctk.CTkMessagebox.show_info("نجاح", "تم حفظ التعديلات بنجاح")
+        self.destroy()
+
+class BookingFrame(ctk.CTkFrame):
+    """إطار الحجوزات وشبكة إشغال الأسرة"""
+    
+    # عدد الأيام المعروضة في شبكة الإشغال
+    GRID_DAYS = 14
+    
+    def __init__(self, master, db_manager):
+        super().__init__(master)
+        self.db_manager = db_manager
+        self.tasks = BackgroundTasks(self)
+        
+        # الأسرة الشاغرة المعروضة في القائمة: النص -> (الغرفة، السرير)
+        self._free_beds = {}
+        
+        self.setup_ui()
+        self.refresh_grid()
+        
+        # تحديث الشبكة عند كل حجز أو إلغاء (ومن أي تبويب)
+        self.db_manager.changes.subscribe('bookings', self.on_bookings_changed)
+        self.db_manager.changes.subscribe('settings', self.on_bookings_changed)
+    
+    def setup_ui(self):
+        """إعداد واجهة الحجوزات"""
+        # العنوان
+        title = ArabicText.create_label(
+            self,
+            "حجز الأسرة وإشغال الغرف",
+            font=("Arial", 20, "bold")
+        )
+        title.pack(pady=20)
+        
+        # إطار الحجز
+        booking_frame = ctk.CTkFrame(self)
+        booking_frame.pack(fill="x", padx=20, pady=10)
+        
+        ArabicText.create_label(booking_frame, "رقم بطاقة النزيل:").grid(row=0, column=0, padx=5, pady=5)
+        self.national_id_entry = ctk.CTkEntry(booking_frame, width=150)
+        self.national_id_entry.grid(row=0, column=1, padx=5, pady=5)
+        
+        ArabicText.create_label(booking_frame, "تاريخ الدخول:").grid(row=0, column=2, padx=5, pady=5)
+        self.check_in_entry = ctk.CTkEntry(booking_frame, width=110)
+        self.check_in_entry.insert(0, date.today().isoformat())
+        self.check_in_entry.grid(row=0, column=3, padx=5, pady=5)
+        
+        ArabicText.create_label(booking_frame, "تاريخ الخروج:").grid(row=0, column=4, padx=5, pady=5)
+        self.check_out_entry = ctk.CTkEntry(booking_frame, width=110)
+        self.check_out_entry.insert(0, (date.today() + timedelta(days=1)).isoformat())
+        self.check_out_entry.grid(row=0, column=5, padx=5, pady=5)
+        
+        ctk.CTkButton(
+            booking_frame,
+            text="الأسرة المتاحة",
+            command=self.find_free_beds,
+            width=120
+        ).grid(row=0, column=6, padx=5, pady=5)
+        
+        ArabicText.create_label(booking_frame, "السرير:").grid(row=1, column=0, padx=5, pady=5)
+        self.bed_combo = ctk.CTkComboBox(booking_frame, values=[], width=200)
+        self.bed_combo.set("")
+        self.bed_combo.grid(row=1, column=1, columnspan=2, padx=5, pady=5, sticky="w")
+        
+        self.price_label = ArabicText.create_label(booking_frame, "")
+        self.price_label.grid(row=1, column=3, columnspan=2, padx=5, pady=5)
+        
+        self.book_btn = ctk.CTkButton(
+            booking_frame,
+            text="تأكيد الحجز",
+            command=self.book_bed,
+            fg_color="green",
+            width=120
+        )
+        self.book_btn.grid(row=1, column=6, padx=5, pady=5)
+        
+        # شبكة الإشغال
+        grid_header = ctk.CTkFrame(self)
+        grid_header.pack(fill="x", padx=20)
+        
+        ArabicText.create_label(grid_header, "الإشغال ابتداءً من:").pack(side="left", padx=5)
+        self.grid_start_entry = ctk.CTkEntry(grid_header, width=110)
+        self.grid_start_entry.insert(0, date.today().isoformat())
+        self.grid_start_entry.pack(side="left", padx=5)
+        
+        ctk.CTkButton(
+            grid_header,
+            text="عرض",
+            command=self.refresh_grid,
+            width=80
+        ).pack(side="left", padx=5)
+        
+        grid_frame = ctk.CTkFrame(self)
+        grid_frame.pack(fill="both", expand=True, padx=20, pady=10)
+        
+        from tkinter import ttk
+        
+        grid_scroll = ttk.Scrollbar(grid_frame)
+        grid_scroll.pack(side="right", fill="y")
+        
+        self.grid_tree = ttk.Treeview(
+            grid_frame,
+            yscrollcommand=grid_scroll.set,
+            selectmode="browse",
+            height=15
+        )
+        grid_scroll.config(command=self.grid_tree.yview)
+        
+        self.grid_tree['columns'] = ['bed'] + [f"d{i}" for i in range(self.GRID_DAYS)]
+        self.grid_tree.column("#0", width=0, stretch=False)
+        self.grid_tree.column("bed", width=120, minwidth=100)
+        self.grid_tree.heading("bed", text=ArabicText.reshape("الغرفة / السرير"))
+        for i in range(self.GRID_DAYS):
+            self.grid_tree.column(f"d{i}", width=70, minwidth=50, anchor="center")
+        
+        self.grid_tree.pack(fill="both", expand=True)
+    
+    def _read_dates(self):
+        """قراءة تاريخي الدخول والخروج من الحقول"""
+        try:
+            check_in = date.fromisoformat(self.check_in_entry.get().strip())
+            check_out = date.fromisoformat(self.check_out_entry.get().strip())
+        except ValueError:
+            raise ValueError("صيغة التاريخ يجب أن تكون YYYY-MM-DD")
+        if check_out <= check_in:
+            raise ValueError("تاريخ الخروج يجب أن يكون بعد تاريخ الدخول")
+        return check_in, check_out
+    
+    def find_free_beds(self):
+        """عرض الأسرة الشاغرة طوال الفترة المختارة"""
+        try:
+            check_in, check_out = self._read_dates()
+        except ValueError as e:
+            ctk.CTkMessagebox.show_warning("تحذير", str(e))
+            return
+        
+        beds = self.db_manager.free_beds(check_in, check_out)
+        self._free_beds = {
+            ArabicText.reshape(f"غرفة {room} - سرير {bed}"): (room, bed)
+            for room, bed in beds
+        }
+        values = list(self._free_beds)
+        self.bed_combo.configure(values=values)
+        self.bed_combo.set(values[0] if values else "")
+        
+        _, total = self.db_manager.booking_price(check_in, check_out)
+        self.price_label.configure(
+            text=ArabicText.reshape(f"شاغر: {len(values)} | المبلغ: {total:,.2f} د.ج")
+        )
+    
+    def book_bed(self):
+        """حجز السرير المختار للنزيل"""
+        try:
+            check_in, check_out = self._read_dates()
+        except ValueError as e:
+            ctk.CTkMessagebox.show_warning("تحذير", str(e))
+            return
+        
+        bed = self._free_beds.get(self.bed_combo.get())
+        if bed is None:
+            ctk.CTkMessagebox.show_warning("تحذير", "يرجى اختيار سرير من الأسرة المتاحة")
+            return
+        
+        guest = self.db_manager.get_guest_by_national_id(self.national_id_entry.get())
+        if guest is None:
+            ctk.CTkMessagebox.show_warning("تحذير", "لا يوجد نزيل بهذا الرقم")
+            return
+        
+        try:
+            self.db_manager.book_bed(guest['id'], bed[0], bed[1], check_in, check_out)
+        except BookingConflictError as e:
+            # حُجز السرير من مكان آخر منذ عرض القائمة
+            ctk.CTkMessagebox.show_warning("تحذير", str(e))
+            self.find_free_beds()
+            return
+        except Exception as e:
+            ctk.CTkMessagebox.showerror("خطأ", f"حدث خطأ أثناء الحجز: {str(e)}")
+            return
+        
+        ctk.CTkMessagebox.show_info("نجاح", "تم الحجز بنجاح")
+        self.find_free_beds()
+    
+    def on_bookings_changed(self, event):
+        """إشعار تغيير الحجوزات أو إعدادات الغرف"""
+        self.refresh_grid()
+    
+    def refresh_grid(self):
+        """تحميل شبكة الإشغال في الخلفية"""
+        try:
+            start = date.fromisoformat(self.grid_start_entry.get().strip())
+        except ValueError:
+            start = date.today()
+        
+        self.tasks.submit(
+            self.db_manager.get_occupancy, start, self.GRID_DAYS,
+            on_done=lambda grid: self.show_grid(start, grid),
+            on_error=lambda error: print(f"خطأ في تحميل الإشغال: {error}")
         )
+    
+    def show_grid(self, start, grid):
+        """عرض شبكة الإشغال (اسم النزيل في كل ليلة محجوزة)"""
+        for i in range(self.GRID_DAYS):
+            day = start + timedelta(days=i)
+            self.grid_tree.heading(f"d{i}", text=day.strftime("%m-%d"))
+        
+        self.grid_tree.delete(*self.grid_tree.get_children())
+        for (room, bed), cells in grid.items():
+            values = [ArabicText.reshape(f"غرفة {room} - سرير {bed}")]
+            for booking in cells:
+                values.append(
+                    ArabicText.reshape(booking['last_name'] or '■') if booking else ''
+                )
+            self.grid_tree.insert("", "end", values=values)
 
 class SettingsFrame(ctk.CTkFrame):
     """إطار الإعدادات"""
     
-    def __init__(self, master, db_manager):
+    def __init__(self, master, db_manager, scheduler=None):
         super().__init__(master)
         self.db_manager = db_manager
+        self.scheduler = scheduler
+        self.auto_backup_enabled = False
+        self.tasks = BackgroundTasks(self)
         
         self.setup_ui()
         self.load_settings()
@@ -1046,49 +4936,76 @@ class SettingsFrame(ctk.CTkFrame):
             font=("Arial", 14, "bold")
         ).pack(pady=10)
         
-        restore_btn = ctk.CTkButton(
+        self.restore_btn = ctk.CTkButton(
             backup_frame,
             text="استعادة نسخة احتياطية",
             command=self.restore_backup,
             width=180
         )
-        restore_btn.pack(pady=5)
+        self.restore_btn.pack(pady=5)
         
-        auto_backup_btn = ctk.CTkButton(
+        self.auto_backup_btn = ctk.CTkButton(
             backup_frame,
             text="تفعيل النسخ التلقائي",
             command=self.toggle_auto_backup,
             width=180
         )
-        auto_backup_btn.pack(pady=5)
+        self.auto_backup_btn.pack(pady=5)
+        
+        # إعدادات النسخ التلقائي
+        auto_frame = ctk.CTkFrame(backup_frame)
+        auto_frame.pack(pady=5)
+        
+        ArabicText.create_label(auto_frame, "فترة النسخ التلقائي (دقيقة):").grid(
+            row=0, column=0, sticky="w", padx=5, pady=5
+        )
+        
+        self.auto_backup_interval = ctk.CTkEntry(auto_frame, width=100)
+        self.auto_backup_interval.grid(row=0, column=1, padx=5, pady=5)
+        
+        ArabicText.create_label(auto_frame, "عدد السلاسل المحفوظة:").grid(
+            row=1, column=0, sticky="w", padx=5, pady=5
+        )
+        
+        self.auto_backup_retention = ctk.CTkEntry(auto_frame, width=100)
+        self.auto_backup_retention.grid(row=1, column=1, padx=5, pady=5)
+        
+        ArabicText.create_label(
+            auto_frame,
+            "كل نسخة تلقائية تقرأ القاعدة كاملة وتحفظ الصفحات المتغيرة فقط؛ مع قاعدة كبيرة اختر فترة أطول",
+            font=("Arial", 10),
+            text_color="gray"
+        ).grid(row=2, column=0, columnspan=2, sticky="w", padx=5, pady=(0, 5))
     
     def load_settings(self):
         """تحميل الإعدادات من قاعدة البيانات"""
         try:
-            conn = sqlite3.connect(self.db_manager.db_path)
-            cursor = conn.cursor()
-            
             settings_keys = ['room_count', 'bed_count', 'default_price', 'free_days']
-            for key in settings_keys:
-                cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
-                result = cursor.fetchone()
-                if result:
-                    value = result[0]
-                    # تعيين القيمة في الحقل المناسب
-                    if key == 'room_count':
-                        self.room_count.delete(0, "end")
-                        self.room_count.insert(0, value)
-                    elif key == 'bed_count':
-                        self.bed_count.delete(0, "end")
-                        self.bed_count.insert(0, value)
-                    elif key == 'default_price':
-                        self.default_price.delete(0, "end")
-                        self.default_price.insert(0, value)
-                    elif key == 'free_days':
-                        self.free_days.delete(0, "end")
-                        self.free_days.insert(0, value)
+            settings = self.db_manager.get_settings(settings_keys)
             
-            conn.close()
+            for key, value in settings.items():
+                # تعيين القيمة في الحقل المناسب
+                if key == 'room_count':
+                    self.room_count.delete(0, "end")
+                    self.room_count.insert(0, value)
+                elif key == 'bed_count':
+                    self.bed_count.delete(0, "end")
+                    self.bed_count.insert(0, value)
+                elif key == 'default_price':
+                    self.default_price.delete(0, "end")
+                    self.default_price.insert(0, value)
+                elif key == 'free_days':
+                    self.free_days.delete(0, "end")
+                    self.free_days.insert(0, value)
+            
+            # إعدادات النسخ التلقائي
+            auto = self.db_manager.get_auto_backup_settings()
+            self.auto_backup_interval.delete(0, "end")
+            self.auto_backup_interval.insert(0, str(auto['auto_backup_interval']))
+            self.auto_backup_retention.delete(0, "end")
+            self.auto_backup_retention.insert(0, str(auto['auto_backup_retention']))
+            self.auto_backup_enabled = bool(auto['auto_backup_enabled'])
+            self.update_auto_backup_button()
             
         except Exception as e:
             print(f"خطأ في تحميل الإعدادات: {e}")
@@ -1096,24 +5013,27 @@ class SettingsFrame(ctk.CTkFrame):
     def save_settings(self):
         """حفظ الإعدادات"""
         try:
-            conn = sqlite3.connect(self.db_manager.db_path)
-            cursor = conn.cursor()
-            
-            settings = [
-                ('room_count', self.room_count.get()),
-                ('bed_count', self.bed_count.get()),
-                ('default_price', self.default_price.get()),
-                ('free_days', self.free_days.get())
-            ]
-            
-            for key, value in settings:
-                cursor.execute(
-                    "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
-                    (key, value)
-                )
+            interval = int(self.auto_backup_interval.get())
+            retention = int(self.auto_backup_retention.get())
+        except ValueError:
+            ctk.CTkMessagebox.show_warning("تحذير", "فترة النسخ التلقائي وعدد النسخ يجب أن يكونا أعداداً صحيحة")
+            return
+        if interval < 1 or retention < 1:
+            ctk.CTkMessagebox.show_warning("تحذير", "فترة النسخ التلقائي وعدد النسخ يجب ألا يقلا عن 1")
+            return
+        
+        try:
+            settings = {
+                'room_count': self.room_count.get(),
+                'bed_count': self.bed_count.get(),
+                'default_price': self.default_price.get(),
+                'free_days': self.free_days.get(),
+                'auto_backup_interval': str(interval),
+                'auto_backup_retention': str(retention)
+            }
             
-            conn.commit()
-            conn.close()
+            self.db_manager.save_settings(settings)
+            self.apply_auto_backup()
             
             ctk.CTkMessagebox.show_info("نجاح", "تم حفظ الإعدادات بنجاح")
             
@@ -1126,7 +5046,11 @@ class SettingsFrame(ctk.CTkFrame):
         
         file_path = filedialog.askopenfilename(
             title="اختر ملف النسخة الاحتياطية",
-            filetypes=[("Database files", "*.db"), ("All files", "*.*")]
+            initialdir=str(BACKUP_DIR),
+            filetypes=[
+                ("Database files", "*.db *.db.gz *.pdiff.gz"),
+                ("All files", "*.*")
+            ]
         )
         
         if file_path:
@@ -1139,139 +5063,355 @@ class SettingsFrame(ctk.CTkFrame):
             )
             
             if confirm.get() == "استعادة":
-                try:
-                    # إغلاق اتصالات قاعدة البيانات أولاً
-                    import shutil
-                    shutil.copy(file_path, self.db_manager.db_path)
-                    
-                    ctk.CTkMessagebox.show_info(
-                        "نجاح",
-                        "تم استعادة النسخة الاحتياطية بنجاح. يرجى إعادة تشغيل البرنامج."
-                    )
-                    
-                except Exception as e:
-                    ctk.CTkMessagebox.showerror(
-                        "خطأ",
-                        f"حدث خطأ في الاستعادة: {str(e)}"
-                    )
+                # التحقق والاستعادة في الخلفية دون إغلاق البرنامج
+                self.restore_btn.configure(state="disabled")
+                self.tasks.submit(
+                    self.db_manager.restore, file_path,
+                    on_done=self._on_restore_done,
+                    on_error=self._on_restore_error
+                )
+    
+    def _on_restore_done(self, result):
+        """إعادة تحميل الواجهة بعد الاستعادة"""
+        self.restore_btn.configure(state="normal")
+        ctk.CTkMessagebox.show_info(
+            "نجاح",
+            "تم استعادة النسخة الاحتياطية بنجاح."
+        )
+    
+    def _on_restore_error(self, error):
+        """عرض خطأ الاستعادة"""
+        self.restore_btn.configure(state="normal")
+        ctk.CTkMessagebox.showerror(
+            "خطأ",
+            f"حدث خطأ في الاستعادة: {str(error)}"
+        )
     
     def toggle_auto_backup(self):
         """تفعيل/تعطيل النسخ التلقائي"""
-        # هنا يمكنك إضافة منطق النسخ التلقائي
-        ctk.CTkMessagebox.show_info(
-            "معلومة",
-            "ميزة النسخ التلقائي تحت التطوير. قم يدوياً بالنسخ الاحتياطي بانتظام."
+        try:
+            self.auto_backup_enabled = not self.auto_backup_enabled
+            self.db_manager.save_settings({
+                'auto_backup_enabled': '1' if self.auto_backup_enabled else '0'
+            })
+            self.apply_auto_backup()
+            self.update_auto_backup_button()
+            
+            if self.auto_backup_enabled:
+                message = "تم تفعيل النسخ التلقائي"
+            else:
+                message = "تم إيقاف النسخ التلقائي"
+            ctk.CTkMessagebox.show_info("معلومة", message)
+            
+        except Exception as e:
+            ctk.CTkMessagebox.showerror("خطأ", f"حدث خطأ في إعداد النسخ التلقائي: {str(e)}")
+    
+    def update_auto_backup_button(self):
+        """تحديث نص زر النسخ التلقائي حسب حالته"""
+        text = "إيقاف النسخ التلقائي" if self.auto_backup_enabled else "تفعيل النسخ التلقائي"
+        self.auto_backup_btn.configure(text=text)
+    
+    def apply_auto_backup(self):
+        """تطبيق إعدادات النسخ التلقائي على المجدول"""
+        if self.scheduler is None:
+            return
+        auto = self.db_manager.get_auto_backup_settings()
+        self.scheduler.configure_job(
+            'auto_backup',
+            interval=auto['auto_backup_interval'] * 60,
+            enabled=bool(auto['auto_backup_enabled'])
         )
 
 class MainApplication(ctk.CTk):
     """التطبيق الرئيسي"""
     
-    def __init__(self):
+    # التبويبات بالترتيب: (العنوان، اسم خاصية الإطار)
+    TABS = [
+        ("تسجيل النزلاء", 'registration_frame'),
+        ("البحث والتعديل", 'search_frame'),
+        ("الحجوزات", 'booking_frame'),
+        ("الإحصائيات", 'statistics_frame'),
+        ("الإعدادات", 'settings_frame'),
+    ]
+    
+    # فترة مهمة الصيانة (حذف النزلاء المنتهية مدة احتفاظهم وضغط القاعدة)
+    MAINTENANCE_INTERVAL = 24 * 3600
+    
+    def __init__(self, measure_startup: bool = False):
         super().__init__()
         
+        self.measure_startup = measure_startup
+        self.startup_times: Dict[str, float] = {}
+        
         # إعداد النافذة الرئيسية
         self.title("بيت الشباب كريم جلول قلعة الشيخ بوعمامة")
         self.geometry("1200x700")
         ctk.set_appearance_mode("light")
         ctk.set_default_color_theme("blue")
         
-        # تهيئة مدير قاعدة البيانات
-        self.db_manager = DatabaseManager()
+        # تُهيأ بعد ظهور النافذة (انظر finish_startup)
+        self.db_manager = None
+        self.scheduler = None
+        for _, attribute in self.TABS:
+            setattr(self, attribute, None)
         
         # إعداد الواجهة
         self.setup_ui()
+        
+        # أول عمل على قاعدة البيانات يتم بعد رسم النافذة
+        self.after(0, self.finish_startup)
     
     def setup_ui(self):
-        """إعداد واجهة التطبيق"""
+        """إعداد هيكل الواجهة (الإطارات تُبنى عند أول اختيار لتبويبها)"""
         # شريط العنوان
         title_frame = ctk.CTkFrame(self, height=80)
         title_frame.pack(fill="x", padx=10, pady=5)
         
-        title_label = ArabicText.create_label(
+        # نصوص الهيكل تُشكَّل في finish_startup بعد تحميل مكتبات التشكيل،
+        # فلا يتأخر أول رسم للنافذة باستيرادها
+        self.title_label = ctk.CTkLabel(
             title_frame,
-            "🏠 بيت الشباب كريم جلول - قلعة الشيخ بوعمامة",
+            text="",
             font=("Arial", 24, "bold"),
             text_color="#2d5b8a"
         )
-        title_label.pack(pady=20)
+        self.title_label.pack(pady=20)
         
-        ArabicText.create_label(
-            title_frame,
-            "نظام إدارة النزلاء والإحصائيات المتكامل",
-            font=("Arial", 14)
-        ).pack()
+        self.subtitle_label = ctk.CTkLabel(title_frame, text="", font=("Arial", 14))
+        self.subtitle_label.pack()
         
         # تبويبات التنقل
-        self.tabview = ctk.CTkTabview(self)
+        self.tabview = ctk.CTkTabview(self, command=self.on_tab_changed)
         self.tabview.pack(fill="both", expand=True, padx=10, pady=10)
         
         # إضافة التبويبات
-        self.tabview.add("تسجيل النزلاء")
-        self.tabview.add("البحث والتعديل")
-        self.tabview.add("الإحصائيات")
-        self.tabview.add("الإعدادات")
+        for tab_name, _ in self.TABS:
+            self.tabview.add(tab_name)
         
-        # إطارات المحتوى لكل تبويب
-        self.registration_frame = GuestRegistrationFrame(
-            self.tabview.tab("تسجيل النزلاء"),
-            self.db_manager
-        )
-        self.registration_frame.pack(fill="both", expand=True)
+        # شريط الحالة
+        self.status_bar = ctk.CTkFrame(self, height=30)
+        self.status_bar.pack(fill="x", side="bottom")
         
-        self.search_frame = SearchFrame(
-            self.tabview.tab("البحث والتعديل"),
-            self.db_manager
-        )
-        self.search_frame.pack(fill="both", expand=True)
+        self.status_label = ctk.CTkLabel(self.status_bar, text="", font=("Arial", 10))
+        self.status_label.pack(side="left", padx=10)
+    
+    def finish_startup(self):
+        """تهيئة قاعدة البيانات والمهام وأول تبويب بعد ظهور النافذة"""
+        # إتمام رسم الهيكل قبل أي عمل ثقيل
+        self.update_idletasks()
+        self.startup_times['first_paint'] = time.perf_counter() - MODULE_START
         
-        self.statistics_frame = StatisticsFrame(
-            self.tabview.tab("الإحصائيات"),
-            self.db_manager
+        # تشكيل النصوص الثابتة مرة واحدة
+        ArabicText.preload(UI_CAPTIONS)
+        self.title_label.configure(
+            text=ArabicText.reshape("🏠 بيت الشباب كريم جلول - قلعة الشيخ بوعمامة")
         )
-        self.statistics_frame.pack(fill="both", expand=True)
-        
-        self.settings_frame = SettingsFrame(
-            self.tabview.tab("الإعدادات"),
-            self.db_manager
+        self.subtitle_label.configure(
+            text=ArabicText.reshape("نظام إدارة النزلاء والإحصائيات المتكامل")
         )
-        self.settings_frame.pack(fill="both", expand=True)
+        self.status_label.configure(text=ArabicText.reshape("جاري التحميل..."))
         
-        # شريط الحالة
-        self.status_bar = ctk.CTkFrame(self, height=30)
-        self.status_bar.pack(fill="x", side="bottom")
+        # تهيئة مدير قاعدة البيانات
+        self.db_manager = DatabaseManager()
         
-        self.status_label = ArabicText.create_label(
-            self.status_bar,
-            "جاهز - نظام إدارة بيت الشباب كريم جلول",
-            font=("Arial", 10)
+        # المهام الدورية في الخلفية (النسخ الاحتياطي التلقائي والصيانة اليومية)
+        self.scheduler = JobScheduler(self, self.db_manager)
+        auto = self.db_manager.get_auto_backup_settings()
+        self.scheduler.add_job(
+            'auto_backup',
+            self.db_manager.auto_backup,
+            auto['auto_backup_interval'] * 60,
+            enabled=bool(auto['auto_backup_enabled'])
         )
-        self.status_label.pack(side="left", padx=10)
+        self.scheduler.add_job(
+            'maintenance',
+            self.db_manager.maintenance,
+            self.MAINTENANCE_INTERVAL
+        )
+        self.scheduler.start()
+        
+        self.on_tab_changed()
+        
+        # شريط الحالة يُحدَّث عند كل تغيير بدلاً من الاستعلام الدوري
+        self.db_manager.changes.bind(self)
+        self.db_manager.changes.subscribe('guests', self.on_guests_changed)
+        self.db_manager.changes.subscribe('database', self.on_database_replaced)
+        self.refresh_status()
+        self.startup_times['ready'] = time.perf_counter() - MODULE_START
+        
+        if self.measure_startup:
+            self.after(0, self.report_startup)
+    
+    def report_startup(self):
+        """طباعة أزمنة الإقلاع وإغلاق النافذة (وضع --startup-time)"""
+        self.update_idletasks()
+        self.startup_times['first_tab'] = time.perf_counter() - MODULE_START
         
-        # تحديث حالة قاعدة البيانات
-        self.update_status()
+        print(f"أول رسم للنافذة: {self.startup_times['first_paint'] * 1000:.0f} ms")
+        print(f"قاعدة البيانات جاهزة: {self.startup_times['ready'] * 1000:.0f} ms")
+        print(f"رسم أول تبويب: {self.startup_times['first_tab'] * 1000:.0f} ms")
+        self.destroy()
+    
+    def on_tab_changed(self):
+        """بناء إطار التبويب المختار عند أول اختيار له"""
+        if self.db_manager is None:
+            return
+        self.build_frame(self.tabview.get())
+    
+    def build_frame(self, tab_name: str):
+        """إنشاء إطار تبويب (مرة واحدة) وإرجاعه"""
+        attribute = dict(self.TABS)[tab_name]
+        frame = getattr(self, attribute)
+        if frame is not None:
+            return frame
+        
+        master = self.tabview.tab(tab_name)
+        if attribute == 'registration_frame':
+            frame = GuestRegistrationFrame(master, self.db_manager)
+        elif attribute == 'search_frame':
+            frame = SearchFrame(master, self.db_manager)
+        elif attribute == 'booking_frame':
+            frame = BookingFrame(master, self.db_manager)
+        elif attribute == 'statistics_frame':
+            frame = StatisticsFrame(master, self.db_manager)
+        else:
+            frame = SettingsFrame(master, self.db_manager, self.scheduler)
+        frame.pack(fill="both", expand=True)
+        
+        setattr(self, attribute, frame)
+        return frame
+    
+    def on_guests_changed(self, event):
+        """إشعار تغيير النزلاء"""
+        self.refresh_status()
+    
+    def on_database_replaced(self, event):
+        """إشعار استبدال قاعدة البيانات (استعادة نسخة احتياطية)"""
+        self.reload_frames()
     
-    def update_status(self):
-        """تحديث شريط الحالة"""
+    def reload_frames(self):
+        """إعادة تحميل بيانات الإطارات المبنية (بعد استعادة نسخة احتياطية)"""
+        if self.search_frame is not None:
+            self.search_frame.search_guests(
+                self.search_frame.search_entry.get(),
+                self.search_frame.search_type_combo.get()
+            )
+        if self.booking_frame is not None:
+            self.booking_frame.refresh_grid()
+        if self.statistics_frame is not None:
+            self.statistics_frame.refresh_statistics()
+            self.statistics_frame.refresh_analytics()
+        if self.settings_frame is not None:
+            self.settings_frame.load_settings()
+        self.refresh_status()
+    
+    def refresh_status(self):
+        """تحديث نص شريط الحالة مرة واحدة"""
         try:
-            conn = sqlite3.connect(self.db_manager.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM guests")
-            guest_count = cursor.fetchone()[0]
-            conn.close()
+            guest_count = self.db_manager.count_guests()
             
             status_text = f"عدد النزلاء المسجلين: {guest_count} | نظام التشغيل: {sys.platform}"
             self.status_label.configure(text=ArabicText.reshape(status_text))
             
         except Exception as e:
             self.status_label.configure(text=f"خطأ في الاتصال بقاعدة البيانات: {str(e)}")
+
+def check_query_plans():
+    """التحقق من أن الاستعلامات المتكررة لا تعود إلى مسح الجداول الكاملة"""
+    db_manager = DatabaseManager()
+    full_scans = db_manager.check_query_plans()
+    db_manager.close_all()
+    
+    for name, detail in full_scans:
+        print(f"مسح كامل في {name}: {detail}")
+    if full_scans:
+        return 1
+    print("جميع الاستعلامات المتكررة تستخدم الفهارس")
+    return 0
+
+def benchmark_import(count: int):
+    """قياس سرعة الاستيراد الجماعي مقارنة بالإضافة صفاً صفاً"""
+    import tempfile
+    
+    rows = [
+        {
+            'first_name': f'اسم{i}', 'last_name': f'لقب{i % 500}',
+            'birth_date': '2000-01-01', 'birth_place': 'البيض',
+            'national_id': f'B{i:09d}', 'gender': 'ذكر' if i % 2 else 'أنثى',
+            'phone_numbers': ['0550000000'],
+        }
+        for i in range(count)
+    ]
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_manager = DatabaseManager(Path(temp_dir) / "bench.db")
         
-        # تحديث كل 30 ثانية
-        self.after(30000, self.update_status)
+        single_count = min(count, 1000)
+        start = time.perf_counter()
+        for guest_data in rows[:single_count]:
+            db_manager.add_guest(dict(guest_data, national_id='S' + guest_data['national_id']))
+        single_rate = single_count / (time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        result = db_manager.import_guests(enumerate(rows, start=1), total=count)
+        bulk_rate = count / (time.perf_counter() - start)
+        
+        db_manager.close_all()
+    
+    print(f"add_guest: {single_rate:,.0f} صف/ثانية ({single_count} صف)")
+    print(f"import_guests: {bulk_rate:,.0f} صف/ثانية ({result['imported']} صف)")
+
+def migrate_photos():
+    """ترحيل صور بطاقات التعريف القديمة إلى المخزن المضغوط"""
+    db_manager = DatabaseManager()
+    try:
+        result = PhotoStore().migrate(db_manager)
+    finally:
+        db_manager.close_all()
+    
+    print(f"صور مرحلة: {result['migrated']} | تعذر ترحيلها: {result['failed']}")
+    print(f"الحجم: {result['bytes_before'] / 1e6:.1f} MB -> {result['bytes_after'] / 1e6:.1f} MB")
+    return 1 if result['failed'] else 0
+
+def run_maintenance():
+    """تشغيل الصيانة مرة واحدة من سطر الأوامر (مع تحويل القاعدة القديمة إلى الضغط التدريجي)"""
+    db_manager = DatabaseManager()
+    try:
+        if db_manager.convert_auto_vacuum():
+            print("تم تفعيل الضغط التدريجي لقاعدة البيانات")
+        result = db_manager.maintenance()
+    finally:
+        db_manager.close_all()
+    
+    print(f"نزلاء محذوفون نهائياً: {result['purged']}")
+    print(f"صور يتيمة محذوفة: {result['photos_removed']} ({result['photo_bytes'] / 1e6:.1f} MB)")
+    print(f"صفحات محررة من قاعدة البيانات: {result['freed_pages']}")
+    return 0
 
 def main():
     """الدالة الرئيسية لتشغيل التطبيق"""
-    app = MainApplication()
-    app.mainloop()
+    if '--check-plans' in sys.argv:
+        sys.exit(check_query_plans())
+    if '--migrate-photos' in sys.argv:
+        sys.exit(migrate_photos())
+    if '--maintenance' in sys.argv:
+        sys.exit(run_maintenance())
+    if '--bench-import' in sys.argv:
+        position = sys.argv.index('--bench-import') + 1
+        count = int(sys.argv[position]) if position < len(sys.argv) else 10000
+        benchmark_import(count)
+        return
+    
+    app = MainApplication(measure_startup='--startup-time' in sys.argv)
+    try:
+        app.mainloop()
+    finally:
+        if app.scheduler is not None:
+            app.scheduler.stop()
+        if app.db_manager is not None:
+            app.db_manager.close_all()
 
 if __name__ == "__main__":
+    # ضروري لعمليات توليد البطاقات في ملف exe المبني بـ PyInstaller
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file